@@ -0,0 +1,452 @@
+#!/usr/bin/env python3
+"""
+Demonio AMI para Zabbix: una sola conexion autenticada a Asterisk Manager
+Interface en vez de un "sudo asterisk -rx ..." por item y por minuto.
+
+  - Al conectar (y cada AMI_RESYNC_S segundos) siembra el estado con las
+    acciones de listado: PJSIPShowContacts, SIPpeers y CoreShowChannels.
+  - Entre resincronizaciones lo mantiene al dia con los eventos
+    ContactStatus, PeerStatus, Newchannel y Hangup.
+  - Sirve los valores por un socket UNIX local con las MISMAS keys que los
+    UserParameters generados por los bulk_*_scripts.sh:
+        asterisk.<peer>                 RTT chan_sip (ms, 0 si no responde)
+        asterisk.pjsip.<endpoint>       RTT minimo de los contacts (ms)
+        asterisk.calls.<peer>           llamadas activas chan_sip
+        asterisk.calls.pjsip.<endpoint> llamadas activas PJSIP
+
+Uso:
+  ami_daemon.py serve                  # demonio (systemd: zabbix-asterisk-ami.service)
+  ami_daemon.py get <key>              # cliente para UserParameter
+  ami_daemon.py dump                   # todas las keys conocidas (JSON)
+
+Probar sin Asterisk: fake_ami_server.py reproduce un flujo de eventos grabado.
+"""
+import json, os, re, socket, socketserver, sys, threading, time
+
+# Carga .env desde la raíz del proyecto (sin dependencias externas)
+import pathlib as _pl, os as _os
+_ef = next((p / ".env" for p in _pl.Path(__file__).resolve().parents if (p / ".env").is_file()), None)
+if _ef:
+    for _l in open(_ef):
+        _l = _l.strip()
+        if _l and not _l.startswith('#') and '=' in _l:
+            _k, _, _v = _l.partition('=')
+            _k, _v = _k.strip(), _v.strip().strip('"').strip("'")
+            if _k and _k not in _os.environ:
+                _os.environ[_k] = _v
+del _pl, _os, _ef
+
+# ========= CONFIG =========
+AMI_HOST    = os.environ.get("AMI_HOST",    "127.0.0.1")
+AMI_PORT    = int(os.environ.get("AMI_PORT", "5038"))
+AMI_USER    = os.environ.get("AMI_USER",    "zabbix")
+AMI_SECRET  = os.environ.get("AMI_SECRET",  "CHANGE_ME")
+AMI_SOCKET  = os.environ.get("AMI_SOCKET",  "/tmp/zbx_asterisk_ami.sock")
+AMI_RESYNC_S = int(os.environ.get("AMI_RESYNC_S", "600"))  # resincronizacion completa
+DEBUG = os.environ.get("DEBUG", "false").lower() == "true"
+
+RECONNECT_MAX_S = 60       # tope del backoff de reconexion
+KEEPALIVE_S = 30           # sin eventos en este tiempo -> Ping a AMI
+CLIENT_TIMEOUT_S = 3       # el agente Zabbix corta a los 3 s por defecto
+
+# Acciones de listado usadas para sembrar el estado: accion -> evento de fin
+LIST_ACTIONS = {
+    "PJSIPShowContacts": "ContactListComplete",
+    "SIPpeers":          "PeerlistComplete",
+    "CoreShowChannels":  "CoreShowChannelsComplete",
+}
+
+SIP_STATUS_MS_RE = re.compile(r'\((\d+)\s*ms\)')
+SAFE_NAME_RE = re.compile(r'[^a-zA-Z0-9._-]')
+
+def log(msg):
+    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] {msg}", flush=True)
+
+def safe_name(name):
+    # Igual que bulk_pjsipcountcalls_scripts.sh: sed 's#[^a-zA-Z0-9._-]#_#g'
+    return SAFE_NAME_RE.sub("_", name)
+
+def channel_owner(channel):
+    """'SIP/Telmex-0000001a' -> ('SIP', 'Telmex'); None si no es SIP/PJSIP."""
+    tech, _, rest = channel.partition("/")
+    if tech not in ("SIP", "PJSIP") or not rest:
+        return None
+    return tech, rest.rsplit("-", 1)[0]
+
+def sip_status_ms(status):
+    """'OK (25 ms)' / 'LAGGED (2500 ms)' -> 25 / 2500; cualquier otra cosa -> 0."""
+    m = SIP_STATUS_MS_RE.search(status or "")
+    return int(m.group(1)) if m else 0
+
+# ================== ESTADO ==================
+class AsteriskState:
+    """Estado incremental alimentado por eventos AMI (thread-safe)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # Indexado por endpoint: get("asterisk.pjsip.<ep>") mira solo sus contacts
+        self.contacts = {}   # endpoint -> {uri: rtt ms (float) o None si no disponible}
+        self.sip_peers = {}  # peer -> rtt ms (int, 0 = no responde)
+        self.channels = {}   # channel -> key de llamadas ("asterisk.calls[.pjsip].<peer>")
+        self.calls = {}      # key de llamadas -> canales activos
+        self.connected = False
+        self.last_event = 0.0
+        # Resincronizacion en curso: accion -> claves vistas en el listado
+        self._seen = {}
+
+    # --- contacts ---
+    def _set_contact(self, endpoint, uri, rtt):
+        self.contacts.setdefault(endpoint, {})[uri] = rtt
+
+    def _del_contact(self, endpoint, uri):
+        uris = self.contacts.get(endpoint)
+        if uris is None:
+            return
+        uris.pop(uri, None)
+        if not uris:
+            del self.contacts[endpoint]
+
+    # --- canales ---
+    @staticmethod
+    def _calls_key(owner):
+        tech, peer = owner
+        if tech == "SIP":
+            return f"asterisk.calls.{peer}"
+        return f"asterisk.calls.pjsip.{safe_name(peer)}"
+
+    def _add_channel(self, channel):
+        owner = channel_owner(channel)
+        if owner is None or channel in self.channels:
+            return
+        key = self._calls_key(owner)
+        self.channels[channel] = key
+        self.calls[key] = self.calls.get(key, 0) + 1
+
+    def _del_channel(self, channel):
+        key = self.channels.pop(channel, None)
+        if key is None:
+            return
+        n = self.calls.get(key, 0) - 1
+        if n > 0:
+            self.calls[key] = n
+        else:
+            self.calls.pop(key, None)
+
+    # --- listados (siembra / resincronizacion) ---
+    def begin_list(self, action):
+        with self.lock:
+            self._seen[action] = set()
+
+    def end_list(self, action):
+        """Barre lo que ya no aparecio en el listado completo."""
+        with self.lock:
+            seen = self._seen.pop(action, None)
+            if seen is None:
+                return
+            if action == "PJSIPShowContacts":
+                for ep, uri in [(ep, uri) for ep, uris in self.contacts.items()
+                                for uri in uris if (ep, uri) not in seen]:
+                    self._del_contact(ep, uri)
+            elif action == "SIPpeers":
+                for k in [k for k in self.sip_peers if k not in seen]:
+                    del self.sip_peers[k]
+            elif action == "CoreShowChannels":
+                for ch in [ch for ch in self.channels if ch not in seen]:
+                    self._del_channel(ch)
+
+    def _mark(self, action, key):
+        if action in self._seen:
+            self._seen[action].add(key)
+
+    # --- eventos ---
+    def apply(self, ev):
+        name = ev.get("Event", "")
+        with self.lock:
+            self.last_event = time.time()
+            if name == "ContactList":
+                endpoint = ev.get("Endpoint", "")
+                uri = ev.get("Uri", "") or ev.get("URI", "")
+                if endpoint:
+                    usec = ev.get("RoundtripUsec", "")
+                    reachable = ev.get("Status", "").lower() in ("reachable", "avail")
+                    rtt = int(usec) / 1000.0 if reachable and usec.isdigit() and int(usec) > 0 else None
+                    self._set_contact(endpoint, uri, rtt)
+                    self._mark("PJSIPShowContacts", (endpoint, uri))
+            elif name == "ContactStatus":
+                endpoint = ev.get("EndpointName", "")
+                uri = ev.get("URI", "")
+                status = ev.get("ContactStatus", "")
+                if not endpoint:
+                    return
+                key = (endpoint, uri)
+                # Un cambio en vivo durante un listado en curso tambien es estado actual
+                self._mark("PJSIPShowContacts", key)
+                if status == "Removed":
+                    self._del_contact(endpoint, uri)
+                elif status == "Reachable":
+                    usec = ev.get("RoundtripUsec", "")
+                    self._set_contact(endpoint, uri, int(usec) / 1000.0 if usec.isdigit() and int(usec) > 0 else None)
+                elif status in ("Unreachable", "Unknown", "NonQualified"):
+                    self._set_contact(endpoint, uri, None)
+                else:  # Created / Updated: conserva el ultimo RTT conocido
+                    self.contacts.setdefault(endpoint, {}).setdefault(uri, None)
+            elif name == "PeerEntry":
+                if ev.get("Channeltype", ev.get("ChannelType", "SIP")) == "SIP":
+                    peer = ev.get("ObjectName", "")
+                    if peer:
+                        self.sip_peers[peer] = sip_status_ms(ev.get("Status", ""))
+                        self._mark("SIPpeers", peer)
+            elif name == "PeerStatus":
+                if ev.get("ChannelType", "SIP") != "SIP":
+                    return
+                peer = ev.get("Peer", "").partition("/")[2]
+                status = ev.get("PeerStatus", "")
+                if not peer:
+                    return
+                self._mark("SIPpeers", peer)
+                if status in ("Reachable", "Lagged"):
+                    t = ev.get("Time", "")
+                    self.sip_peers[peer] = int(t) if t.isdigit() else self.sip_peers.get(peer, 0)
+                elif status in ("Unreachable", "Unregistered", "Rejected"):
+                    self.sip_peers[peer] = 0
+                else:  # Registered: conserva el ultimo valor
+                    self.sip_peers.setdefault(peer, 0)
+            elif name in ("Newchannel", "CoreShowChannel"):
+                ch = ev.get("Channel", "")
+                self._add_channel(ch)
+                self._mark("CoreShowChannels", ch)
+            elif name == "Hangup":
+                self._del_channel(ev.get("Channel", ""))
+
+    # --- consultas ---
+    def _pjsip_rtt(self, endpoint):
+        """RTT minimo de los contacts disponibles de <endpoint> (solo los suyos)."""
+        vals = [rtt for rtt in self.contacts.get(endpoint, {}).values() if rtt]
+        return round(min(vals), 3) if vals else 0
+
+    @staticmethod
+    def _calls(channels):
+        return (channels + 1) // 2   # 2 canales ~ 1 llamada, igual que countcalls_*
+
+    def snapshot(self):
+        """Todas las keys conocidas -> valor (mismo formato que los UserParameters)."""
+        with self.lock:
+            out = {}
+            for peer, ms in self.sip_peers.items():
+                out[f"asterisk.{peer}"] = ms
+            for ep in self.contacts:
+                out[f"asterisk.pjsip.{ep}"] = self._pjsip_rtt(ep)
+            for key, n in self.calls.items():
+                out[key] = self._calls(n)
+            return out
+
+    def get(self, key):
+        """
+        Valor de UNA key, sin armar el snapshot: lookup en el indice que le
+        toca (mismo orden de precedencia que snapshot()). Keys sin datos (peer
+        sin canales, endpoint sin contacts) -> 0, como los scripts.
+        """
+        with self.lock:
+            if key in self.calls:
+                return self._calls(self.calls[key])
+            if key.startswith("asterisk.pjsip.") and key[len("asterisk.pjsip."):] in self.contacts:
+                return self._pjsip_rtt(key[len("asterisk.pjsip."):])
+            if key.startswith("asterisk."):
+                return self.sip_peers.get(key[len("asterisk."):], 0)
+            return 0
+
+# ================== CONEXION AMI ==================
+class AMIConnection:
+    """Lectura/escritura de bloques 'Clave: valor' separados por linea en blanco."""
+
+    def __init__(self, host, port, timeout=30):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.buf = b""
+        self.banner = self._readline()
+        self.action_seq = 0
+
+    def _readline(self):
+        while b"\r\n" not in self.buf:
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                raise ConnectionError("AMI cerro la conexion")
+            self.buf += chunk
+        line, self.buf = self.buf.split(b"\r\n", 1)
+        return line.decode("utf-8", errors="ignore")
+
+    def read_block(self):
+        while b"\r\n\r\n" not in self.buf:
+            chunk = self.sock.recv(65536)
+            if not chunk:
+                raise ConnectionError("AMI cerro la conexion")
+            self.buf += chunk
+        raw, self.buf = self.buf.split(b"\r\n\r\n", 1)
+        block = {}
+        for line in raw.decode("utf-8", errors="ignore").split("\r\n"):
+            k, sep, v = line.partition(":")
+            if sep:
+                block[k.strip()] = v.strip()
+        return block
+
+    def send_action(self, action, **fields):
+        self.action_seq += 1
+        action_id = f"zbx-{self.action_seq}"
+        lines = [f"Action: {action}", f"ActionID: {action_id}"]
+        lines += [f"{k}: {v}" for k, v in fields.items()]
+        self.sock.sendall(("\r\n".join(lines) + "\r\n\r\n").encode("utf-8"))
+        return action_id
+
+    def close(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+def ami_loop(state, stop):
+    """Conecta, siembra y consume eventos; reconecta con backoff si se cae."""
+    backoff = 1
+    while not stop.is_set():
+        conn = None
+        try:
+            conn = AMIConnection(AMI_HOST, AMI_PORT)
+            log(f"Conectado a AMI {AMI_HOST}:{AMI_PORT} ({conn.banner})")
+            login_id = conn.send_action("Login", Username=AMI_USER, Secret=AMI_SECRET, Events="system,call")
+            while True:
+                blk = conn.read_block()
+                if blk.get("ActionID") == login_id:
+                    break
+            if blk.get("Response") != "Success":
+                raise PermissionError(f"Login AMI rechazado: {blk.get('Message', '')}")
+            conn.sock.settimeout(KEEPALIVE_S)
+            state.connected = True
+            backoff = 1
+
+            pending = {}  # ActionID -> accion de listado en curso
+            def resync():
+                for action in LIST_ACTIONS:
+                    state.begin_list(action)
+                    pending[conn.send_action(action)] = action
+            resync()
+            next_resync = time.time() + AMI_RESYNC_S
+
+            while not stop.is_set():
+                try:
+                    blk = conn.read_block()
+                except socket.timeout:
+                    # Sin trafico: Ping para detectar una conexion muerta
+                    conn.send_action("Ping")
+                    blk = {}
+                aid = blk.get("ActionID")
+                if aid in pending:
+                    action = pending[aid]
+                    if blk.get("Response") == "Error":
+                        # p.ej. chan_sip o res_pjsip no cargado: no es fatal
+                        if DEBUG:
+                            log(f"[DEBUG] {action}: {blk.get('Message', '')}")
+                        state.end_list(action)
+                        del pending[aid]
+                        continue
+                    if blk.get("Event") == LIST_ACTIONS[action]:
+                        state.end_list(action)
+                        del pending[aid]
+                        continue
+                if "Event" in blk:
+                    state.apply(blk)
+                if time.time() >= next_resync and not pending:
+                    resync()
+                    next_resync = time.time() + AMI_RESYNC_S
+        except (OSError, ConnectionError, PermissionError) as e:
+            log(f"[WARN] AMI: {e}; reintento en {backoff}s")
+        finally:
+            state.connected = False
+            if conn:
+                conn.close()
+        stop.wait(backoff)
+        backoff = min(backoff * 2, RECONNECT_MAX_S)
+
+# ================== SOCKET LOCAL ==================
+class QueryHandler(socketserver.StreamRequestHandler):
+    """Una linea por consulta: '<key>' -> valor | 'dump' -> JSON de todas las keys."""
+
+    def handle(self):
+        self.request.settimeout(CLIENT_TIMEOUT_S)
+        try:
+            line = self.rfile.readline().decode("utf-8", errors="ignore").strip()
+        except OSError:
+            return
+        state = self.server.state
+        if not state.connected:
+            reply = "ERR AMI desconectado"
+        elif line == "dump":
+            reply = json.dumps(state.snapshot(), sort_keys=True)
+        elif line:
+            reply = str(state.get(line))
+        else:
+            reply = "ERR key vacia"
+        self.wfile.write((reply + "\n").encode("utf-8"))
+
+class QueryServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def serve():
+    state = AsteriskState()
+    stop = threading.Event()
+    threading.Thread(target=ami_loop, args=(state, stop), daemon=True).start()
+
+    if os.path.exists(AMI_SOCKET):
+        os.unlink(AMI_SOCKET)
+    server = QueryServer(AMI_SOCKET, QueryHandler)
+    server.state = state
+    os.chmod(AMI_SOCKET, 0o666)   # el agente Zabbix corre como otro usuario
+    log(f"Sirviendo keys en {AMI_SOCKET}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+        if os.path.exists(AMI_SOCKET):
+            os.unlink(AMI_SOCKET)
+
+def query(line):
+    """Cliente: manda una consulta al demonio y devuelve la respuesta."""
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    s.settimeout(CLIENT_TIMEOUT_S)
+    try:
+        s.connect(AMI_SOCKET)
+        s.sendall((line + "\n").encode("utf-8"))
+        data = b""
+        while not data.endswith(b"\n"):
+            chunk = s.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+    finally:
+        s.close()
+    return data.decode("utf-8", errors="ignore").strip()
+
+def main():
+    if len(sys.argv) < 2 or sys.argv[1] not in ("serve", "get", "dump"):
+        print(__doc__.strip())
+        sys.exit(1)
+    cmd = sys.argv[1]
+    if cmd == "serve":
+        serve()
+        return
+    if cmd == "get" and len(sys.argv) != 3:
+        print("Uso: ami_daemon.py get <key>", file=sys.stderr)
+        sys.exit(1)
+    try:
+        reply = query(sys.argv[2] if cmd == "get" else "dump")
+    except OSError as e:
+        # Sin valor -> el item queda "unsupported" en vez de reportar un 0 falso
+        print(f"ERROR: demonio AMI no disponible en {AMI_SOCKET}: {e}", file=sys.stderr)
+        sys.exit(2)
+    if reply.startswith("ERR"):
+        print(f"ERROR: {reply[4:]}", file=sys.stderr)
+        sys.exit(2)
+    print(reply)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Servidor AMI falso para probar ami_daemon.py sin Asterisk.
+
+Acepta cualquier Login, responde las acciones de listado con una lista vacia
+(el estado inicial viene en la propia grabacion) y despues reproduce, en
+orden, los bloques de un archivo de eventos grabado (formato AMI: lineas
+"Clave: valor", bloques separados por linea en blanco). Las lineas que
+empiezan con "#" se ignoran, salvo "# sleep <segundos>" que pausa la
+reproduccion.
+
+Uso:
+  fake_ami_server.py samples/events_sample.ami [--port 5038] [--delay 0.0] [--loop]
+
+Ejemplo de prueba de punta a punta:
+  python3 fake_ami_server.py samples/events_sample.ami --port 15038 &
+  AMI_PORT=15038 AMI_SOCKET=/tmp/ami_test.sock python3 ami_daemon.py serve &
+  AMI_SOCKET=/tmp/ami_test.sock python3 ami_daemon.py dump
+"""
+import argparse, socket, socketserver, sys, threading, time
+
+BANNER = "Asterisk Call Manager/5.0.1"
+
+def load_recording(path):
+    """Devuelve una lista de bloques: dict (evento) o float (pausa en segundos)."""
+    blocks, cur = [], []
+    with open(path, encoding="utf-8") as f:
+        for raw in f:
+            line = raw.rstrip("\r\n")
+            if line.startswith("#"):
+                parts = line[1:].split()
+                if len(parts) == 2 and parts[0] == "sleep":
+                    if cur:
+                        blocks.append(cur); cur = []
+                    blocks.append(float(parts[1]))
+                continue
+            if not line.strip():
+                if cur:
+                    blocks.append(cur); cur = []
+                continue
+            cur.append(line)
+    if cur:
+        blocks.append(cur)
+    return blocks
+
+def encode(lines):
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("utf-8")
+
+class FakeAMIHandler(socketserver.StreamRequestHandler):
+
+    def read_action(self):
+        fields = {}
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return None
+            line = line.decode("utf-8", errors="ignore").rstrip("\r\n")
+            if not line:
+                if fields:
+                    return fields
+                continue
+            k, _, v = line.partition(":")
+            fields[k.strip()] = v.strip()
+
+    def reply(self, action):
+        name = action.get("Action", "")
+        aid = action.get("ActionID", "")
+        if name == "Login":
+            return [encode(["Response: Success", f"ActionID: {aid}", "Message: Authentication accepted"])]
+        complete = self.server.list_actions.get(name)
+        if complete:
+            return [encode(["Response: Success", f"ActionID: {aid}", "EventList: start", "Message: Following"]),
+                    encode([f"Event: {complete}", f"ActionID: {aid}", "EventList: Complete", "ListItems: 0"])]
+        if name == "Logoff":
+            return [encode(["Response: Goodbye", f"ActionID: {aid}"])]
+        return [encode(["Response: Success", f"ActionID: {aid}"])]
+
+    def handle(self):
+        send_lock = threading.Lock()
+        self.wfile.write((BANNER + "\r\n").encode("utf-8"))
+        logged_in = threading.Event()
+
+        def replay():
+            logged_in.wait()
+            while True:
+                for blk in self.server.recording:
+                    if isinstance(blk, float):
+                        time.sleep(blk)
+                        continue
+                    try:
+                        with send_lock:
+                            self.wfile.write(encode(blk))
+                    except OSError:
+                        return
+                    if self.server.delay:
+                        time.sleep(self.server.delay)
+                if not self.server.loop:
+                    return
+
+        threading.Thread(target=replay, daemon=True).start()
+        while True:
+            action = self.read_action()
+            if action is None:
+                return
+            try:
+                with send_lock:
+                    for chunk in self.reply(action):
+                        self.wfile.write(chunk)
+            except OSError:
+                return
+            if action.get("Action") == "Login":
+                logged_in.set()
+            elif action.get("Action") == "Logoff":
+                return
+
+class FakeAMIServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    list_actions = {
+        "PJSIPShowContacts": "ContactListComplete",
+        "SIPpeers":          "PeerlistComplete",
+        "CoreShowChannels":  "CoreShowChannelsComplete",
+    }
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("recording", help="Archivo de eventos AMI grabado")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5038)
+    parser.add_argument("--delay", type=float, default=0.0, help="Pausa entre eventos (s)")
+    parser.add_argument("--loop", action="store_true", help="Repetir la grabacion indefinidamente")
+    args = parser.parse_args()
+
+    server = FakeAMIServer((args.host, args.port), FakeAMIHandler)
+    server.recording = load_recording(args.recording)
+    server.delay = args.delay
+    server.loop = args.loop
+    print(f"AMI falso en {args.host}:{args.port} ({len(server.recording)} bloques)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    sys.exit(main())
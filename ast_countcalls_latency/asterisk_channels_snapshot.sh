@@ -0,0 +1,73 @@
+#!/usr/bin/env bash
+# Snapshot compartido de "core show channels concise" para los scripts
+# countcalls_tsip_<peer> / countcalls_tpjsip_<endpoint>.
+#
+# En vez de que CADA peer corra su propio "core show channels concise" y lo
+# greppee entero, el primero que llega (con flock) refresca un índice
+# "<TECH>/<peer> <canales>" en /dev/shm y el resto lo lee mientras tenga
+# menos de TTL segundos. Los bulk_*countcalls_scripts.sh copian este archivo
+# a SCRIPTS_DIR e inyectan usuario/TTL.
+#
+# Uso: asterisk_channels_snapshot.sh <TECH/peer>   (ej. SIP/Telmex_New)
+#      -> imprime el número de canales activos de ese peer (0 si no hay)
+set -uo pipefail
+export LC_ALL=C
+
+ASTERISK_BIN="/usr/sbin/asterisk"
+SUDO_BIN="/usr/bin/sudo"
+ASTERISK_USER="__ASTERISK_USER__"
+TTL="__TTL__"
+
+CACHE_DIR="/dev/shm"
+[[ -d "$CACHE_DIR" && -w "$CACHE_DIR" ]] || CACHE_DIR="/tmp"
+INDEX="${CACHE_DIR}/zbx_asterisk_channels.idx"
+LOCK="${INDEX}.lock"
+
+KEY="${1:-}"
+if [[ -z "$KEY" ]]; then
+  echo "Uso: $0 <TECH/peer>" >&2
+  exit 1
+fi
+
+fresh() {
+  [[ -f "$INDEX" ]] || return 1
+  local now mtime
+  now="$(date +%s)"
+  mtime="$(stat -c %Y "$INDEX" 2>/dev/null || echo 0)"
+  (( now - mtime < TTL ))
+}
+
+refresh() {
+  local raw tmp
+  # 1) Intentar con sudo (sin TTY/clave). Silenciar stderr.
+  raw="$("$SUDO_BIN" -n -u "$ASTERISK_USER" "$ASTERISK_BIN" -rx "core show channels concise" 2>/dev/null || true)"
+  # 2) Fallback directo (si el agente puede ejecutar Asterisk sin sudo)
+  if [[ -z "$raw" ]]; then
+    raw="$("$ASTERISK_BIN" -rx "core show channels concise" 2>/dev/null || true)"
+  fi
+
+  # 3) Indexar: canal "SIP/<peer>-0000001a!ctx!..." -> "SIP/<peer>" y contar
+  tmp="$(mktemp "${INDEX}.XXXXXX")" || return 1
+  printf '%s\n' "$raw" | awk -F'!' '
+    NF > 1 { ch = $1; sub(/-[^-]*$/, "", ch); n[ch]++ }
+    END    { for (c in n) print c, n[c] }
+  ' > "$tmp"
+  chmod 644 "$tmp"
+  # Reemplazo atómico: los lectores ven el índice viejo o el nuevo, nunca uno a medias
+  mv -f "$tmp" "$INDEX"
+}
+
+if ! fresh; then
+  if exec 9>>"$LOCK" 2>/dev/null; then
+    # Solo uno refresca; los demás esperan y reutilizan lo que dejó
+    if flock -w 10 9; then
+      fresh || refresh
+      flock -u 9
+    fi
+    exec 9>&-
+  else
+    refresh
+  fi
+fi
+
+awk -v k="$KEY" '$1 == k { print $2; found = 1; exit } END { if (!found) print 0 }' "$INDEX" 2>/dev/null || echo 0
@@ -18,18 +18,34 @@ SCRIPTS_DIR="${SCRIPTS_DIR:-/etc/zabbix/scripts}"            # carpeta para scri
 # (déjalo en root si Asterisk corre como root)
 ASTERISK_USER_DEFAULT="${ASTERISK_USER_DEFAULT:-root}"
 
+# Segundos que vive el snapshot compartido de "core show channels concise"
+# (todos los peers leen el mismo; solo uno refresca por TTL)
+CHANNELS_CACHE_TTL="${CHANNELS_CACHE_TTL:-30}"
+
 # Prefijos y llaves de UserParameter
 UP_PREFIX="asterisk.calls"    # quedará: asterisk.calls.<peer>
 SCRIPT_PREFIX="countcalls_tsip_"  # nombre de archivo base
+SNAPSHOT_SCRIPT="${SCRIPTS_DIR}/asterisk_channels_snapshot.sh"
 
 # ======= Preparación =======
 mkdir -p "$SCRIPTS_DIR"
 chmod 755 "$SCRIPTS_DIR"
-cp -a "$ZABBIX_CONF" "${ZABBIX_CONF}.bak.$(date +%Y%m%d%H%M%S)"
+# UserParameters en un include propio de zabbix_agentd.d/ (ver zbx_common/agent_conf.sh)
+source "$(dirname "${BASH_SOURCE[0]}")/../zbx_common/agent_conf.sh"
+AGENT_CONF_NAME="asterisk_calls_sip.conf"
+# ASTERISK_PROBE=true: la misma key la contesta ast_lld/asterisk_lld.py desde un
+# listado compartido (stale-while-revalidate), sin generar un script por peer
+ASTERISK_PROBE="${ASTERISK_PROBE:-false}"
+PROBE_SCRIPT="$(cd "$(dirname "${BASH_SOURCE[0]}")/../ast_lld" && pwd)/asterisk_lld.py"
+
+# Snapshot compartido de canales (lo usan todos los countcalls_* generados)
+install -m 755 "$(dirname "${BASH_SOURCE[0]}")/asterisk_channels_snapshot.sh" "$SNAPSHOT_SCRIPT"
+sed -i "s/__ASTERISK_USER__/${ASTERISK_USER_DEFAULT}/g; s/__TTL__/${CHANNELS_CACHE_TTL}/g" "$SNAPSHOT_SCRIPT"
 
 # ======= Obtener peers (columna 1 antes de "/"), evitando cabeceras y resúmenes =======
 TMP_PEERS="$(mktemp)"
-trap 'rm -f "$TMP_PEERS"' EXIT
+TMP_CONF="$(mktemp)"
+trap 'rm -f "$TMP_PEERS" "$TMP_CONF"' EXIT
 
 "$ASTERISK_BIN" -rx "sip show peers" 2>/dev/null | awk '
   BEGIN{IGNORECASE=1}
@@ -45,6 +61,12 @@ trap 'rm -f "$TMP_PEERS"' EXIT
   }
 ' | sort -u > "$TMP_PEERS"
 
+# Sin peers (Asterisk caido o sin permisos) NO se vacia el include del agente
+if [[ ! -s "$TMP_PEERS" ]]; then
+  echo "ERROR: 'sip show peers' no devolvió peers; no se modifica la configuración del agente." >&2
+  exit 1
+fi
+
 # ======= Generar script por peer y registrar UserParameter =======
 while IFS= read -r PEER; do
   [[ -z "$PEER" ]] && continue
@@ -52,29 +74,26 @@ while IFS= read -r PEER; do
   SCRIPT_PATH="${SCRIPTS_DIR}/${SCRIPT_PREFIX}${PEER}"   # SIN extensión, como pediste
   USERPARAM_KEY="${UP_PREFIX}.${PEER}"
 
-  # Script por peer: corre "core show channels concise", filtra sus canales y estima llamadas (canales/2 redondeando hacia arriba)
+  if [[ "$ASTERISK_PROBE" == "true" ]]; then
+    printf "UserParameter=%s, /usr/bin/python3 %s calls sip '%s'\n" "$USERPARAM_KEY" "$PROBE_SCRIPT" "$PEER" >> "$TMP_CONF"
+    continue
+  fi
+
+  # Script por peer: lee sus canales del snapshot compartido y estima llamadas (canales/2 redondeando hacia arriba)
   cat > "$SCRIPT_PATH" <<'EOS'
 #!/usr/bin/env bash
 set -euo pipefail
 export LC_ALL=C
 
 PEER="__PEER__"
-ASTERISK_BIN="/usr/sbin/asterisk"
-SUDO_BIN="/usr/bin/sudo"
-ASTERISK_USER="__ASTERISK_USER__"
+SNAPSHOT_SCRIPT="__SNAPSHOT_SCRIPT__"
 
-# 1) Intentar con sudo (sin TTY/clave). Silenciar stderr.
-RAW="$("$SUDO_BIN" -n -u "$ASTERISK_USER" "$ASTERISK_BIN" -rx "core show channels concise" 2>/dev/null || true)"
+# 1) Canales del peer (formato chan_sip: SIP/<peer>-XXXXXXXX) desde el snapshot
+#    compartido: un solo "core show channels concise" por TTL para todos los peers
+CHANNEL_COUNT="$("$SNAPSHOT_SCRIPT" "SIP/${PEER}" 2>/dev/null || true)"
+[[ "$CHANNEL_COUNT" =~ ^[0-9]+$ ]] || CHANNEL_COUNT=0
 
-# 2) Fallback directo (si el agente puede ejecutar Asterisk sin sudo)
-if [[ -z "$RAW" ]]; then
-  RAW="$("$ASTERISK_BIN" -rx "core show channels concise" 2>/dev/null || true)"
-fi
-
-# 3) Contar canales del peer (formato típico en chan_sip: SIP/<peer>-XXXXXXXX)
-CHANNEL_COUNT=$(printf '%s\n' "$RAW" | grep -E "SIP/${PEER}-" | wc -l || true)
-
-# 4) Aproximar número de llamadas (2 canales ~ 1 llamada)
+# 2) Aproximar número de llamadas (2 canales ~ 1 llamada)
 CALL_COUNT=$(( (CHANNEL_COUNT + 1) / 2 ))
 
 echo "${CALL_COUNT}"
@@ -82,31 +101,18 @@ EOS
 
   # Inyectar valores
   sed -i "s/__PEER__/${PEER//\//\\/}/g" "$SCRIPT_PATH"
-  sed -i "s/__ASTERISK_USER__/${ASTERISK_USER_DEFAULT}/g" "$SCRIPT_PATH"
+  sed -i "s|__SNAPSHOT_SCRIPT__|${SNAPSHOT_SCRIPT}|g" "$SCRIPT_PATH"
   chmod 755 "$SCRIPT_PATH"
 
-  # Registrar UserParameter si no existe (formato: UserParameter=asterisk.calls.<peer>, /etc/zabbix/scripts/countcalls_tsip_<peer>)
-  USERPARAM_LINE="UserParameter=${USERPARAM_KEY}, ${SCRIPT_PATH}"
-  if ! grep -Fq "UserParameter=${USERPARAM_KEY}," "$ZABBIX_CONF"; then
-    printf "\n%s\n" "$USERPARAM_LINE" >> "$ZABBIX_CONF"
-    echo "Añadido UserParameter para ${PEER} -> ${USERPARAM_KEY}"
-  else
-    echo "UserParameter para ${PEER} ya existe, se omite."
-  fi
+  # UserParameter al include (formato: UserParameter=asterisk.calls.<peer>, /etc/zabbix/scripts/countcalls_tsip_<peer>)
+  printf "UserParameter=%s, %s\n" "$USERPARAM_KEY" "$SCRIPT_PATH" >> "$TMP_CONF"
 done < "$TMP_PEERS"
 
-# ======= Reiniciar Zabbix Agent =======
-if command -v systemctl >/dev/null 2>&1; then
-  if systemctl list-unit-files | grep -q '^zabbix-agent2\.service'; then
-    systemctl restart zabbix-agent2 || true
-  elif systemctl list-unit-files | grep -q '^zabbix-agent\.service'; then
-    systemctl restart zabbix-agent || true
-  else
-    service zabbix-agent restart || service zabbix-agent2 restart || true
-  fi
-else
-  service zabbix-agent restart || service zabbix-agent2 restart || true
-fi
+# ======= Include atómico + recarga del agente =======
+agent_conf_ensure_include
+agent_conf_write "$AGENT_CONF_NAME" "$TMP_CONF"
+agent_conf_adopt "$TMP_CONF"
+agent_reload
 
 echo "Proceso completado."
 
@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-import os, sys, re, subprocess, requests
+import os, sys, re, subprocess
 
 # Carga .env desde la raíz del proyecto (sin dependencias externas)
 import pathlib as _pl, os as _os
@@ -14,6 +14,15 @@ if _ef:
                 _os.environ[_k] = _v
 del _pl, _os, _ef
 
+# Modulos compartidos (zbx_common/) buscando hacia arriba, igual que el .env
+import pathlib as _pl, sys as _sys
+_lib = next((p / "zbx_common" for p in _pl.Path(__file__).resolve().parents if (p / "zbx_common").is_dir()), None)
+if _lib and str(_lib) not in _sys.path:
+    _sys.path.insert(0, str(_lib))
+del _pl, _sys, _lib
+from zbx_api import ZabbixAPI
+import ast_cli
+
 # ========= CONFIG =========
 ZBX_URL   = os.environ.get("ZBX_URL",   "http://---IP----/zabbix/api_jsonrpc.php")
 ZBX_USER  = os.environ.get("ZBX_USER",  "Admin")
@@ -25,6 +34,9 @@ PEER_SOURCE = os.environ.get("PEER_SOURCE", "agent_conf").lower()
 
 # Ruta del agente para Opción A
 ZABBIX_CONF = os.environ.get("ZABBIX_CONF", "/etc/zabbix/zabbix_agentd.conf")
+# bulk_sipcountcalls_scripts.sh escribe sus UserParameters en este include
+AGENT_INCLUDE = os.path.join(os.environ.get("ZABBIX_AGENTD_DIR", "/etc/zabbix/zabbix_agentd.d"),
+                             "asterisk_calls_sip.conf")
 
 # Binario Asterisk para Opción B
 ASTERISK_BIN = os.environ.get("ASTERISK_BIN", "/usr/sbin/asterisk")
@@ -46,21 +58,17 @@ ITEM_UNITS      = "calls"
 # Key prefix (debe existir como UserParameter=asterisk.calls.<peer>)
 KEY_PREFIX = "asterisk.calls"
 
-session = requests.Session()
+# Cliente compartido (zbx_common/zbx_api.py): una conexion keep-alive, sesion
+# reutilizada entre corridas (o ZBX_API_TOKEN) y reintentos con backoff
+zapi = ZabbixAPI(ZBX_URL, user=ZBX_USER, password=ZBX_PASS,
+                 token=os.environ.get("ZBX_API_TOKEN", ""), verify=VERIFY_TLS)
 
 def api(method, params, auth=None):
-    payload = {"jsonrpc":"2.0","method":method,"params":params,"id":1}
-    if auth:
-        payload["auth"] = auth
-    r = session.post(ZBX_URL, json=payload, verify=VERIFY_TLS, timeout=30)
-    r.raise_for_status()
-    data = r.json()
-    if "error" in data:
-        raise RuntimeError(f"API error: {data['error']}")
-    return data["result"]
+    # <auth> queda por compatibilidad con los llamadores: la sesion vive en zapi
+    return zapi.call(method, params)
 
 def login():
-    return api("user.login", {"user": ZBX_USER, "password": ZBX_PASS})
+    return zapi.login()
 
 def get_hostid(auth):
     res = api("host.get", {"filter":{"host":[HOST_NAME]}, "output":["hostid","host","name"]}, auth)
@@ -81,47 +89,29 @@ def get_agent_interfaceid(auth, hostid):
 
 # ---------- Opción A: leer peers desde zabbix_agentd.conf ----------
 def get_peers_from_agent_conf():
-    if not os.path.isfile(ZABBIX_CONF):
-        raise RuntimeError(f"No existe ZABBIX_CONF: {ZABBIX_CONF}")
+    # El include del generador y, por compatibilidad, las líneas que versiones
+    # anteriores dejaban en zabbix_agentd.conf
+    confs = [p for p in (AGENT_INCLUDE, ZABBIX_CONF) if os.path.isfile(p)]
+    if not confs:
+        raise RuntimeError(f"No existe {AGENT_INCLUDE} ni ZABBIX_CONF: {ZABBIX_CONF}")
     peers = []
     # Busca líneas tipo: UserParameter=asterisk.calls.Telmex_New, /etc/zabbix/scripts/countcalls_tsip_Telmex_New
     pat = re.compile(r'^\s*UserParameter\s*=\s*asterisk\.calls\.([A-Za-z0-9_.\-]+)\s*,', re.ASCII)
-    with open(ZABBIX_CONF, "r", encoding="utf-8", errors="ignore") as f:
-        for line in f:
-            m = pat.search(line)
-            if m:
-                peers.append(m.group(1))
+    for conf in confs:
+        with open(conf, "r", encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                m = pat.search(line)
+                if m:
+                    peers.append(m.group(1))
     peers = sorted(set(peers + EXTRA_PEERS))
     if not peers:
-        raise RuntimeError("No se encontraron peers en zabbix_agentd.conf (UserParameter=asterisk.calls.<peer>, ...)")
+        raise RuntimeError(f"No se encontraron peers en {' ni '.join(confs)} (UserParameter=asterisk.calls.<peer>, ...)")
     return peers
 
-# ---------- Opción B: leer peers desde 'sip show peers' (parsing robusto) ----------
-def strip_ansi(s):
-    # quita escape codes ANSI si los hubiera
-    return re.sub(r'\x1B\[[0-?]*[ -/]*[@-~]', '', s)
-
+# ---------- Opción B: leer peers desde 'sip show peers' (zbx_common/ast_cli.py) ----------
 def get_peers_from_sip_show_peers():
-    out = subprocess.check_output([ASTERISK_BIN, "-rx", "sip show peers"], stderr=subprocess.STDOUT)
-    if not isinstance(out, str):
-        out = out.decode("utf-8", errors="ignore")
-    out = strip_ansi(out)
-    peers = set()
-    for line in out.splitlines():
-        s = line.strip()
-        if not s:
-            continue
-        low = s.lower()
-        if low.startswith("name/username"):  # cabecera
-            continue
-        if ("monitored:" in s) or ("objects found" in low) or ("sip peers" in low) or ("sip devices" in low):
-            continue
-        # Extrae el primer token (columna 1) y toma lo que esté antes de la primera "/"
-        # Permitimos letras, números, _, -, . en el nombre del peer.
-        m = re.match(r'^\s*([A-Za-z0-9_.\-]+)\/', s)
-        if m:
-            peers.add(m.group(1))
-    peers = sorted(peers.union(EXTRA_PEERS))
+    lines = ast_cli.asterisk_lines("sip show peers", ASTERISK_BIN)
+    peers = sorted({p.name for p in ast_cli.sip_peers(lines)}.union(EXTRA_PEERS))
     if not peers:
         raise RuntimeError("No se detectaron peers desde 'sip show peers'.")
     return peers
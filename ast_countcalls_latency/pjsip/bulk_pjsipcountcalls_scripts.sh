@@ -15,23 +15,44 @@ SCRIPTS_DIR="${SCRIPTS_DIR:-/etc/zabbix/scripts}"            # carpeta para scri
 
 ASTERISK_USER_DEFAULT="${ASTERISK_USER_DEFAULT:-root}"       # usuario para ejecutar Asterisk
 
+# Segundos que vive el snapshot compartido de "core show channels concise"
+CHANNELS_CACHE_TTL="${CHANNELS_CACHE_TTL:-30}"
+
 # Prefijo para claves y scripts
 UP_PREFIX="asterisk.calls.pjsip"
 SCRIPT_PREFIX="countcalls_tpjsip_"
+SNAPSHOT_SCRIPT="${SCRIPTS_DIR}/asterisk_channels_snapshot.sh"
 
 # ======= Preparación =======
 mkdir -p "$SCRIPTS_DIR"
 chmod 755 "$SCRIPTS_DIR"
-cp -a "$ZABBIX_CONF" "${ZABBIX_CONF}.bak.$(date +%Y%m%d%H%M%S)"
+# UserParameters en un include propio de zabbix_agentd.d/ (ver zbx_common/agent_conf.sh)
+source "$(dirname "${BASH_SOURCE[0]}")/../../zbx_common/agent_conf.sh"
+AGENT_CONF_NAME="asterisk_calls_pjsip.conf"
+# ASTERISK_PROBE=true: la misma key la contesta ast_lld/asterisk_lld.py desde un
+# listado compartido (stale-while-revalidate), sin generar un script por peer
+ASTERISK_PROBE="${ASTERISK_PROBE:-false}"
+PROBE_SCRIPT="$(cd "$(dirname "${BASH_SOURCE[0]}")/../../ast_lld" && pwd)/asterisk_lld.py"
+
+# Snapshot compartido de canales (mismo archivo que usa el generador SIP)
+install -m 755 "$(dirname "${BASH_SOURCE[0]}")/../asterisk_channels_snapshot.sh" "$SNAPSHOT_SCRIPT"
+sed -i "s/__ASTERISK_USER__/${ASTERISK_USER_DEFAULT}/g; s/__TTL__/${CHANNELS_CACHE_TTL}/g" "$SNAPSHOT_SCRIPT"
 
 # ======= Obtener endpoints PJSIP =======
 TMP_PEERS="$(mktemp)"
-trap 'rm -f "$TMP_PEERS"' EXIT
+TMP_CONF="$(mktemp)"
+trap 'rm -f "$TMP_PEERS" "$TMP_CONF"' EXIT
 
 "$ASTERISK_BIN" -rx "pjsip show endpoints" 2>/dev/null \
   | awk '/^ Endpoint:/ { print $2 }' \
   | sort -u > "$TMP_PEERS"
 
+# Sin endpoints (Asterisk caido o sin permisos) NO se vacia el include del agente
+if [[ ! -s "$TMP_PEERS" ]]; then
+  echo "ERROR: 'pjsip show endpoints' no devolvió endpoints; no se modifica la configuración del agente." >&2
+  exit 1
+fi
+
 # ======= Generar script por endpoint y registrar UserParameter =======
 while IFS= read -r ENDPOINT; do
   [[ -z "$ENDPOINT" ]] && continue
@@ -40,24 +61,23 @@ while IFS= read -r ENDPOINT; do
   SCRIPT_PATH="${SCRIPTS_DIR}/${SCRIPT_PREFIX}${SAFE_ENDPOINT}"
   USERPARAM_KEY="${UP_PREFIX}.${SAFE_ENDPOINT}"
 
-  # Script por endpoint: cuenta canales que contienen "PJSIP/<endpoint>-" y divide por 2
+  if [[ "$ASTERISK_PROBE" == "true" ]]; then
+    printf "UserParameter=%s,/usr/bin/python3 %s calls pjsip '%s'\n" "$USERPARAM_KEY" "$PROBE_SCRIPT" "$ENDPOINT" >> "$TMP_CONF"
+    continue
+  fi
+
+  # Script por endpoint: lee sus canales "PJSIP/<endpoint>-" del snapshot compartido y divide por 2
   cat > "$SCRIPT_PATH" <<'EOS'
 #!/usr/bin/env bash
 set -euo pipefail
 export LC_ALL=C
 
 ENDPOINT="__ENDPOINT__"
-ASTERISK_BIN="/usr/sbin/asterisk"
-SUDO_BIN="/usr/bin/sudo"
-ASTERISK_USER="__ASTERISK_USER__"
+SNAPSHOT_SCRIPT="__SNAPSHOT_SCRIPT__"
 
-RAW="$("$SUDO_BIN" -n -u "$ASTERISK_USER" "$ASTERISK_BIN" -rx "core show channels concise" 2>/dev/null || true)"
-if [[ -z "$RAW" ]]; then
-  RAW="$("$ASTERISK_BIN" -rx "core show channels concise" 2>/dev/null || true)"
-fi
-
-# Contar canales PJSIP/<endpoint>- activos
-CHANNEL_COUNT=$(printf '%s\n' "$RAW" | grep -E "PJSIP/${ENDPOINT}-" | wc -l || true)
+# Canales PJSIP/<endpoint>- activos (un solo "core show channels concise" por TTL para todos)
+CHANNEL_COUNT="$("$SNAPSHOT_SCRIPT" "PJSIP/${ENDPOINT}" 2>/dev/null || true)"
+[[ "$CHANNEL_COUNT" =~ ^[0-9]+$ ]] || CHANNEL_COUNT=0
 
 # Aproximar llamadas: 2 canales ≈ 1 llamada
 CALL_COUNT=$(( (CHANNEL_COUNT + 1) / 2 ))
@@ -67,18 +87,17 @@ EOS
 
   # Inyectar valores
   sed -i "s/__ENDPOINT__/${ENDPOINT//\//\\/}/g" "$SCRIPT_PATH"
-  sed -i "s/__ASTERISK_USER__/${ASTERISK_USER_DEFAULT}/g" "$SCRIPT_PATH"
+  sed -i "s|__SNAPSHOT_SCRIPT__|${SNAPSHOT_SCRIPT}|g" "$SCRIPT_PATH"
   chmod 755 "$SCRIPT_PATH"
 
-  # Agregar UserParameter si no existe
-  USERPARAM_LINE="UserParameter=${USERPARAM_KEY},${SCRIPT_PATH}"
-  if ! grep -Fq "UserParameter=${USERPARAM_KEY}," "$ZABBIX_CONF"; then
-    printf "\n%s\n" "$USERPARAM_LINE" >> "$ZABBIX_CONF"
-    echo "Añadido UserParameter para ${ENDPOINT} -> ${USERPARAM_KEY}"
-  else
-    echo "UserParameter para ${ENDPOINT} ya existe, se omite."
-  fi
+  # UserParameter al include (se escribe entero al final)
+  printf "UserParameter=%s,%s\n" "$USERPARAM_KEY" "$SCRIPT_PATH" >> "$TMP_CONF"
 done < "$TMP_PEERS"
 
-# ======= Reiniciar Zabbix Agent =======
-echo "Reiniciando agente Zabbix para
+# ======= Include atómico + recarga del agente =======
+agent_conf_ensure_include
+agent_conf_write "$AGENT_CONF_NAME" "$TMP_CONF"
+agent_conf_adopt "$TMP_CONF"
+agent_reload
+
+echo "Proceso PJSIP completado."
@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-import os, sys, re, subprocess, requests
+import os, sys, re, subprocess
 
 # Carga .env desde la raíz del proyecto (sin dependencias externas)
 import pathlib as _pl, os as _os
@@ -14,6 +14,14 @@ if _ef:
                 _os.environ[_k] = _v
 del _pl, _os, _ef
 
+# Modulos compartidos (zbx_common/) buscando hacia arriba, igual que el .env
+import pathlib as _pl, sys as _sys
+_lib = next((p / "zbx_common" for p in _pl.Path(__file__).resolve().parents if (p / "zbx_common").is_dir()), None)
+if _lib and str(_lib) not in _sys.path:
+    _sys.path.insert(0, str(_lib))
+del _pl, _sys, _lib
+from zbx_api import ZabbixAPI
+
 # ========= CONFIG =========
 ZBX_URL   = os.environ.get("ZBX_URL",   "http://68.183.116.34/zabbix/api_jsonrpc.php")
 ZBX_USER  = os.environ.get("ZBX_USER",  "Admin")
@@ -21,6 +29,9 @@ ZBX_PASS  = os.environ.get("ZBX_PASS",  "CHANGE_ME")
 HOST_NAME = os.environ.get("ZBX_HOST",  "nueveonce")  # nombre EXACTO del host en Zabbix
 
 ZABBIX_CONF = os.environ.get("ZABBIX_CONF", "/etc/zabbix/zabbix_agentd.conf")
+# bulk_pjsipcountcalls_scripts.sh escribe sus UserParameters en este include
+AGENT_INCLUDE = os.path.join(os.environ.get("ZABBIX_AGENTD_DIR", "/etc/zabbix/zabbix_agentd.d"),
+                             "asterisk_calls_pjsip.conf")
 VERIFY_TLS = os.environ.get("ZBX_VERIFY_TLS", "false").lower() == "true"
 
 # Configuración del ítem
@@ -34,22 +45,18 @@ ITEM_UNITS      = "calls"
 # Prefijo de clave en UserParameter
 KEY_PREFIX = "asterisk.calls.pjsip"
 
-session = requests.Session()
+# Cliente compartido (zbx_common/zbx_api.py): una conexion keep-alive, sesion
+# reutilizada entre corridas (o ZBX_API_TOKEN) y reintentos con backoff
+zapi = ZabbixAPI(ZBX_URL, user=ZBX_USER, password=ZBX_PASS,
+                 token=os.environ.get("ZBX_API_TOKEN", ""), verify=VERIFY_TLS)
 
 # ========== FUNCIONES API ZABBIX ==========
 def api(method, params, auth=None):
-    payload = {"jsonrpc": "2.0", "method": method, "params": params, "id": 1}
-    if auth:
-        payload["auth"] = auth
-    r = session.post(ZBX_URL, json=payload, verify=VERIFY_TLS, timeout=30)
-    r.raise_for_status()
-    data = r.json()
-    if "error" in data:
-        raise RuntimeError(f"API error: {data['error']}")
-    return data["result"]
+    # <auth> queda por compatibilidad con los llamadores: la sesion vive en zapi
+    return zapi.call(method, params)
 
 def login():
-    return api("user.login", {"user": ZBX_USER, "password": ZBX_PASS})
+    return zapi.login()
 
 def get_hostid(auth):
     res = api("host.get", {"filter": {"host": [HOST_NAME]}, "output": ["hostid"]}, auth)
@@ -66,21 +73,24 @@ def get_agent_interfaceid(auth, hostid):
         return ifs[0]["interfaceid"]
     raise RuntimeError("El host no tiene interfaz de agente Zabbix.")
 
-# ========== EXTRAER ENDPOINTS PJSIP DESDE ZABBIX_CONF ==========
+# ========== EXTRAER ENDPOINTS PJSIP DESDE EL INCLUDE / ZABBIX_CONF ==========
 def get_pjsip_endpoints_from_conf():
-    if not os.path.isfile(ZABBIX_CONF):
-        raise RuntimeError(f"No existe archivo Zabbix Agent: {ZABBIX_CONF}")
+    # Include del generador + líneas que versiones anteriores dejaban en zabbix_agentd.conf
+    confs = [p for p in (AGENT_INCLUDE, ZABBIX_CONF) if os.path.isfile(p)]
+    if not confs:
+        raise RuntimeError(f"No existe {AGENT_INCLUDE} ni archivo Zabbix Agent: {ZABBIX_CONF}")
     endpoints = []
     # Buscar líneas: UserParameter=asterisk.calls.pjsip.<endpoint>, ...
     pat = re.compile(r'^\s*UserParameter\s*=\s*asterisk\.calls\.pjsip\.([A-Za-z0-9_.\-]+)\s*,', re.ASCII)
-    with open(ZABBIX_CONF, "r", encoding="utf-8", errors="ignore") as f:
-        for line in f:
-            m = pat.search(line)
-            if m:
-                endpoints.append(m.group(1))
+    for conf in confs:
+        with open(conf, "r", encoding="utf-8", errors="ignore") as f:
+            for line in f:
+                m = pat.search(line)
+                if m:
+                    endpoints.append(m.group(1))
     endpoints = sorted(set(endpoints))
     if not endpoints:
-        raise RuntimeError("No se encontraron endpoints PJSIP en zabbix_agentd.conf.")
+        raise RuntimeError(f"No se encontraron endpoints PJSIP en {' ni '.join(confs)}.")
     return endpoints
 
 def item_exists(auth, hostid, key_):
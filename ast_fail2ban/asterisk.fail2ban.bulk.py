@@ -2,10 +2,7 @@
 # create_fail2ban_items.py
 # Crea automáticamente los items de fail2ban en Zabbix via API
 
-import json
 import os
-import urllib.request
-import urllib.error
 
 # Carga .env desde la raíz del proyecto (sin dependencias externas)
 import pathlib as _pl, os as _os
@@ -20,6 +17,14 @@ if _ef:
                 _os.environ[_k] = _v
 del _pl, _os, _ef
 
+# Modulos compartidos (zbx_common/) buscando hacia arriba, igual que el .env
+import pathlib as _pl, sys as _sys
+_lib = next((p / "zbx_common" for p in _pl.Path(__file__).resolve().parents if (p / "zbx_common").is_dir()), None)
+if _lib and str(_lib) not in _sys.path:
+    _sys.path.insert(0, str(_lib))
+del _pl, _sys, _lib
+from zbx_api import ZabbixAPI
+
 # ─── CONFIGURACIÓN ───────────────────────────────────────────────
 ZABBIX_URL  = os.environ.get("ZBX_URL",          "http://localhost/zabbix/api_jsonrpc.php")
 ZABBIX_USER = os.environ.get("ZBX_USER",         "Admin")
@@ -58,45 +63,20 @@ ITEMS = [
     },
 ]
 
+# Cliente compartido (zbx_common/zbx_api.py): una conexion keep-alive, sesion
+# reutilizada entre corridas (o ZBX_API_TOKEN) y reintentos con backoff.
+# Funciona sin python3-requests (cae a urllib).
+zapi = ZabbixAPI(ZABBIX_URL, user=ZABBIX_USER, password=ZABBIX_PASS,
+                 token=os.environ.get("ZBX_API_TOKEN", ""),
+                 verify=os.environ.get("ZBX_VERIFY_TLS", "false").lower() == "true", timeout=10)
+
 def zabbix_api(token, method, params):
-    payload = json.dumps({
-        "jsonrpc": "2.0",
-        "method":  method,
-        "params":  params,
-        "id":      1,
-        "auth":    token,
-    }).encode("utf-8")
-
-    req = urllib.request.Request(
-        ZABBIX_URL,
-        data=payload,
-        headers={"Content-Type": "application/json"},
-    )
-    with urllib.request.urlopen(req, timeout=10) as resp:
-        result = json.loads(resp.read().decode("utf-8"))
-
-    if "error" in result:
-        raise Exception(f"API error: {result['error']}")
-    return result["result"]
+    # <token> queda por compatibilidad con los llamadores: la sesion vive en zapi
+    return zapi.call(method, params)
 
 
 def login():
-    payload = json.dumps({
-        "jsonrpc": "2.0",
-        "method":  "user.login",
-        "params":  {"username": ZABBIX_USER, "password": ZABBIX_PASS},
-        "id":      1,
-    }).encode("utf-8")
-    req = urllib.request.Request(
-        ZABBIX_URL,
-        data=payload,
-        headers={"Content-Type": "application/json"},
-    )
-    with urllib.request.urlopen(req, timeout=10) as resp:
-        result = json.loads(resp.read().decode("utf-8"))
-    if "error" in result:
-        raise Exception(f"Login error: {result['error']}")
-    return result["result"]
+    return zapi.login()
 
 
 def get_host_id(token):
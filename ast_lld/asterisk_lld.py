@@ -0,0 +1,263 @@
+#!/usr/bin/env python3
+"""
+Low-level discovery (LLD) de peers SIP / endpoints PJSIP para el agente Zabbix.
+
+Reemplaza a los bulk_*_scripts.sh, que generaban UN script y UNA linea
+UserParameter por peer y reiniciaban el agente: con miles de peers el
+zabbix_agentd.conf crecia sin limite, el agente tardaba en arrancar y un
+trunk nuevo no se monitoreaba hasta volver a correr generador + API. Aca
+alcanzan tres UserParameters fijos (asterisk_lld.conf) y las reglas de
+descubrimiento / prototipos que crea lld_serverzabbix.py:
+
+    asterisk.lld.discovery[<tech>]        JSON [{"{#PEER}": ..., "{#TECH}": ...}]
+    asterisk.lld.rtt[<tech>,<peer>]       RTT en ms (0 si no responde)
+    asterisk.lld.calls[<tech>,<peer>]     llamadas activas (2 canales ~ 1 llamada)
+
+<tech> es "sip" o "pjsip". Los valores salen de UN listado compartido por
+comando ("sip show peers", "pjsip show endpoints", "core show channels
+concise"): el refresco lo parsea una vez y guarda en /dev/shm el indice ya
+armado (JSON peer -> rtt / "<TECH>/<peer>" -> canales, igual que el indice de
+asterisk_channels_snapshot.sh), y cada consulta es una busqueda en ese mapa.
+Mismas reglas de parseo que los scripts por peer, asi que los valores no
+cambian al migrar.
+
+El indice se sirve con stale-while-revalidate: si vencio (LLD_CACHE_TTL) se
+lanza UN refresco desacoplado del agente (doble fork + flock no bloqueante) y
+se contesta al instante con el ultimo indice bueno. Asi ninguna consulta
+espera a "asterisk -rx" y un pico de latencia del CLI no deja items
+"unsupported" por pasar el Timeout= del agente. Solo el primer uso (sin
+indice) espera, como mucho PROBE_DEADLINE. Si Asterisk no contesta, se sigue
+sirviendo el ultimo indice bueno hasta LLD_MAX_AGE; despues cuenta como
+Asterisk caido (rtt/calls 0, discovery sin valor).
+
+Tambien es el despachador de asterisk.probe[<metric>,<tech>,<peer>] ("probe"):
+una sola key para cualquier peer/metrica. Sus parametros vienen del server,
+asi que solo se aceptan con los caracteres de las keys que arman los
+generadores ([A-Za-z0-9._-]). Los bulk_*_scripts.sh con ASTERISK_PROBE=true
+llaman directo a rtt/calls con el nombre real del peer.
+
+Uso (lo llama el agente; a mano sirve para probar):
+    asterisk_lld.py discovery pjsip
+    asterisk_lld.py rtt sip Telmex_New
+    asterisk_lld.py calls pjsip 1001
+    asterisk_lld.py probe rtt pjsip 1001
+"""
+import fcntl, json, os, re, subprocess, sys, time
+
+# Carga .env desde la raíz del proyecto (sin dependencias externas)
+import pathlib as _pl, os as _os
+_ef = next((p / ".env" for p in _pl.Path(__file__).resolve().parents if (p / ".env").is_file()), None)
+if _ef:
+    for _l in open(_ef):
+        _l = _l.strip()
+        if _l and not _l.startswith('#') and '=' in _l:
+            _k, _, _v = _l.partition('=')
+            _k, _v = _k.strip(), _v.strip().strip('"').strip("'")
+            if _k and _k not in _os.environ:
+                _os.environ[_k] = _v
+del _pl, _os, _ef
+
+# Modulos compartidos (zbx_common/) buscando hacia arriba, igual que el .env
+import pathlib as _pl, sys as _sys
+_lib = next((p / "zbx_common" for p in _pl.Path(__file__).resolve().parents if (p / "zbx_common").is_dir()), None)
+if _lib and str(_lib) not in _sys.path:
+    _sys.path.insert(0, str(_lib))
+del _pl, _sys, _lib
+import ast_cli
+
+# ========= CONFIG =========
+ASTERISK_BIN  = os.environ.get("ASTERISK_BIN", "/usr/sbin/asterisk")
+SUDO_BIN      = os.environ.get("SUDO_BIN", "/usr/bin/sudo")
+ASTERISK_USER = os.environ.get("ASTERISK_USER_DEFAULT", "asterisk")
+CACHE_TTL     = int(os.environ.get("LLD_CACHE_TTL", "30"))   # segundos que vive cada listado
+MAX_AGE       = int(os.environ.get("LLD_MAX_AGE", "300"))    # listado mas viejo = Asterisk caido
+# Espera maxima del primer uso (sin listado); debe quedar bajo Timeout= del agente (3 s por defecto)
+PROBE_DEADLINE = float(os.environ.get("PROBE_DEADLINE", "2.5"))
+ASTERISK_TIMEOUT = 10   # el refresco corre desacoplado del agente: puede tardar mas que Timeout=
+
+CACHE_DIR = "/dev/shm" if os.access("/dev/shm", os.W_OK) else "/tmp"
+CACHE_DIR = os.environ.get("LLD_CACHE_DIR", CACHE_DIR)
+
+# tech -> comando de listado de peers
+PEER_LISTS = {"sip": "sip show peers", "pjsip": "pjsip show endpoints"}
+CHANNELS_CMD = "core show channels concise"
+# Parametros de asterisk.probe[*]: mismos caracteres que las keys de los
+# generadores (bulk_pjsipcountcalls_scripts.sh: sed 's#[^a-zA-Z0-9._-]#_#g')
+PROBE_PARAM_RE = re.compile(r"^[A-Za-z0-9._-]+$")
+
+# ================== LISTADOS COMPARTIDOS ==================
+def run_asterisk(command):
+    """'asterisk -rx <command>' via sudo (sin TTY) y, si no sale nada, directo."""
+    for cmd in ([SUDO_BIN, "-n", "-u", ASTERISK_USER, ASTERISK_BIN, "-rx", command],
+                [ASTERISK_BIN, "-rx", command]):
+        try:
+            out = subprocess.check_output(cmd, stderr=subprocess.DEVNULL, timeout=ASTERISK_TIMEOUT)
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError):
+            continue
+        if out.strip():
+            return out.decode("utf-8", errors="ignore")
+    return ""
+
+def _cache_path(command):
+    return os.path.join(CACHE_DIR, "zbx_asterisk_lld." + command.replace(" ", "_") + ".json")
+
+def _age(path):
+    """Segundos desde la ultima escritura de <path> (None si no existe)."""
+    try:
+        return time.time() - os.path.getmtime(path)
+    except OSError:
+        return None
+
+def refresh(command, path):
+    """
+    Refresca <path> con el indice de la salida de <command> (INDEXERS) si este
+    proceso toma el lock. No bloquea: si otro proceso ya esta refrescando, sale
+    sin hacer nada. Una salida vacia (Asterisk caido / sin permisos) NO pisa el
+    ultimo indice bueno.
+    """
+    with open(path + ".lock", "a") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return
+        age = _age(path)
+        if age is not None and age < CACHE_TTL:
+            return
+        text = run_asterisk(command)
+        if not text.strip():
+            return
+        tmp = f"{path}.{os.getpid()}"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(INDEXERS[command](text), f, separators=(",", ":"))
+        os.chmod(tmp, 0o644)
+        # Reemplazo atomico: los lectores ven el indice viejo o el nuevo, nunca uno a medias
+        os.replace(tmp, path)
+
+def _refreshing(path):
+    """True si otro proceso tiene el lock (refresco en curso)."""
+    with open(path + ".lock", "a") as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return True
+        fcntl.flock(lock, fcntl.LOCK_UN)
+    return False
+
+def refresh_in_background(command, path):
+    """
+    Lanza refresh() en un nieto en su propia sesion, con stdio a /dev/null: el
+    agente no lo espera (lee nuestro stdout hasta EOF) ni lo mata al cortar por
+    Timeout= (mata el grupo de procesos del hijo).
+    """
+    if _refreshing(path):
+        return
+    pid = os.fork()
+    if pid:
+        os.waitpid(pid, 0)
+        return
+    try:
+        os.setsid()
+        if os.fork():
+            os._exit(0)
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+        refresh(command, path)
+    finally:
+        os._exit(0)
+
+def cached_index(command):
+    """
+    Ultimo indice bueno de <command>, sin esperar a Asterisk salvo el primer
+    uso (ver docstring del modulo). None si el indice tiene mas de MAX_AGE
+    segundos; RuntimeError si en el primer uso no llega antes de PROBE_DEADLINE.
+    """
+    path = _cache_path(command)
+    age = _age(path)
+    if age is None or age >= CACHE_TTL:
+        refresh_in_background(command, path)
+    if age is None:
+        deadline = time.monotonic() + PROBE_DEADLINE
+        while age is None and time.monotonic() < deadline:
+            time.sleep(0.05)
+            age = _age(path)
+        if age is None:
+            raise RuntimeError(f"'{command}' sin respuesta en {PROBE_DEADLINE:g}s (primer uso)")
+    if age > MAX_AGE:
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+# ================== PARSEO ==================
+# zbx_common/ast_cli.py: mismas reglas que bulk_sipdevice_scripts.sh /
+# bulk_pjsipdevice_scripts.sh, en un solo lugar para todos los scripts
+def parse_sip_peers(text):
+    """'sip show peers' -> {peer: rtt_ms} (0 si no esta OK/LAGGED)."""
+    return {p.name: p.rtt or 0 for p in ast_cli.sip_peers(text)}
+
+def parse_pjsip_endpoints(text):
+    """'pjsip show endpoints' -> {endpoint: rtt} con el MINIMO RTT de sus Contact ("0" si ninguno)."""
+    return {ep.name: (ep.rtt if ep.rtt is not None else "0") for ep in ast_cli.pjsip_endpoints(text)}
+
+def count_channels(text):
+    """'core show channels concise' -> {"SIP/<peer>": canales, "PJSIP/<ep>": canales}."""
+    counts = {}
+    for owner in ast_cli.channel_owners(text):
+        counts[owner] = counts.get(owner, 0) + 1
+    return counts
+
+# comando -> indice que guarda refresh() (se parsea una vez por refresco, no por consulta)
+INDEXERS = {PEER_LISTS["sip"]: parse_sip_peers, PEER_LISTS["pjsip"]: parse_pjsip_endpoints,
+            CHANNELS_CMD: count_channels}
+
+# ================== KEYS ==================
+def discovery(tech):
+    peers = cached_index(PEER_LISTS[tech])
+    if peers is None:
+        # Sin salida de Asterisk NO es "cero peers": devolver [] haria que Zabbix
+        # diera por perdidos todos los items descubiertos
+        raise RuntimeError(f"sin salida de '{PEER_LISTS[tech]}'")
+    return json.dumps([{"{#PEER}": p, "{#TECH}": tech} for p in sorted(peers)])
+
+def rtt(tech, peer):
+    # Peer que ya no aparece en el listado -> 0, igual que los scripts por peer
+    return (cached_index(PEER_LISTS[tech]) or {}).get(peer, 0)
+
+def calls(tech, peer):
+    n = (cached_index(CHANNELS_CMD) or {}).get(f"{tech.upper()}/{peer}", 0)
+    return (n + 1) // 2   # 2 canales ~ 1 llamada, igual que countcalls_*
+
+def main():
+    args = sys.argv[1:]
+    if args[:1] == ["probe"]:
+        # asterisk.probe[<metric>,<tech>,<peer>]: "$1" "$2" "$3" llegan siempre,
+        # vacios si la key no los trae (discovery no lleva peer)
+        args = args[1:]
+        if args[:1] == ["discovery"] and args[2:] == [""]:
+            args = args[:2]
+        bad = [a for a in args if not PROBE_PARAM_RE.match(a)]
+        if bad:
+            print(f"ERROR: parametro invalido para asterisk.probe: {bad[0]!r}", file=sys.stderr)
+            sys.exit(1)
+    if len(args) < 2 or args[0] not in ("discovery", "rtt", "calls") or args[1] not in PEER_LISTS \
+            or (args[0] != "discovery" and len(args) != 3):
+        print(__doc__.strip(), file=sys.stderr)
+        sys.exit(1)
+    try:
+        if args[0] == "discovery":
+            print(discovery(args[1]))
+        elif args[0] == "rtt":
+            print(rtt(args[1], args[2]))
+        else:
+            print(calls(args[1], args[2]))
+    except RuntimeError as e:
+        # Sin valor -> el item queda "unsupported" en vez de vaciar el
+        # descubrimiento o reportar un 0 que no se midio
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env bash
+# Instala los UserParameters de LLD de Asterisk (asterisk_lld.conf) en el agente Zabbix.
+# Ejecutar como root en el servidor Asterisk. Reemplaza a bulk_sipdevice_scripts.sh,
+# bulk_pjsipdevice_scripts.sh y los bulk_*countcalls_scripts.sh: no genera un script
+# por peer y solo recarga el agente si el archivo cambió (la primera vez).
+#
+# Uso: install_lld_agent.sh [--purge-legacy]
+#   --purge-legacy  quita los UserParameter=asterisk.* por peer que dejaron los
+#                   generadores: sus includes de zabbix_agentd.d/ y las líneas que
+#                   versiones anteriores escribían en zabbix_agentd.conf (con backup)
+
+set -euo pipefail
+
+# Carga .env del proyecto si existe (retrocompatible: si no existe, usa los defaults)
+_ENV_ROOT="$(cd "$(dirname "${BASH_SOURCE[0]}")/.." && pwd)"
+[[ -f "${_ENV_ROOT}/.env" ]] && { set -a; source "${_ENV_ROOT}/.env"; set +a; }
+unset _ENV_ROOT
+
+# ======= Variables ajustables (solo aquí) =======
+ZABBIX_CONF="${ZABBIX_CONF:-/etc/zabbix/zabbix_agentd.conf}"         # conf del agente
+ZABBIX_AGENTD_DIR="${ZABBIX_AGENTD_DIR:-/etc/zabbix/zabbix_agentd.d}" # directorio Include=
+
+LLD_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
+LLD_SCRIPT="${LLD_DIR}/asterisk_lld.py"
+
+PURGE_LEGACY=0
+[[ "${1:-}" == "--purge-legacy" ]] && PURGE_LEGACY=1
+
+# Include del agente, escritura atómica y recarga (ver zbx_common/agent_conf.sh)
+source "${LLD_DIR}/../zbx_common/agent_conf.sh"
+
+chmod 755 "$LLD_SCRIPT"
+
+# El agente tiene que leer el directorio (los paquetes oficiales ya traen el Include)
+agent_conf_ensure_include
+
+TMP="$(mktemp)"
+trap 'rm -f "$TMP"' EXIT
+sed "s|__SCRIPT__|${LLD_SCRIPT}|g" "${LLD_DIR}/asterisk_lld.conf" > "$TMP"
+agent_conf_write "asterisk_lld.conf" "$TMP"
+
+if [[ $PURGE_LEGACY -eq 1 ]]; then
+  # Includes de los bulk_*_scripts.sh
+  for f in asterisk_sip.conf asterisk_pjsip.conf asterisk_calls_sip.conf asterisk_calls_pjsip.conf; do
+    if [[ -f "${ZABBIX_AGENTD_DIR}/${f}" ]]; then
+      rm -f "${ZABBIX_AGENTD_DIR}/${f}"
+      AGENT_CONF_CHANGED=1
+      echo "Quitado ${ZABBIX_AGENTD_DIR}/${f}"
+    fi
+  done
+  # Líneas sueltas en zabbix_agentd.conf (generadores anteriores al include)
+  LEGACY="$(grep -Ec '^[[:space:]]*UserParameter[[:space:]]*=[[:space:]]*asterisk\.' "$ZABBIX_CONF" || true)"
+  if [[ "$LEGACY" -gt 0 ]]; then
+    cp -a "$ZABBIX_CONF" "${ZABBIX_CONF}.bak.$(date +%Y%m%d%H%M%S)"
+    sed -i -E '/^[[:space:]]*UserParameter[[:space:]]*=[[:space:]]*asterisk\./d' "$ZABBIX_CONF"
+    AGENT_CONF_MAIN_CHANGED=1
+    echo "Quitados ${LEGACY} UserParameters por peer de ${ZABBIX_CONF}"
+  fi
+fi
+
+# ======= Recargar Zabbix Agent (solo si cambió algo) =======
+agent_reload
+
+echo "Proceso LLD completado."
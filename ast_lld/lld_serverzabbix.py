@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+# Crea en Zabbix las reglas de descubrimiento (LLD) de peers SIP / endpoints
+# PJSIP con sus prototipos de item (RTT + llamadas) y de trigger. Va junto con
+# asterisk_lld.py / install_lld_agent.sh en el servidor Asterisk.
+#
+# Se corre UNA vez por host: desde ahi Zabbix descubre cada LLD_DELAY los peers
+# y crea/borra solo los items, sin volver a pasar por la API ni tocar el agente
+# (a diferencia de bulk_sipdevice_serverzabbix.py y compania, que crean un item
+# por peer y hay que repetir con cada trunk nuevo). Idempotente: lo que ya
+# existe (por key_ / nombre) no se toca.
+#
+# Uso: lld_serverzabbix.py [--techs sip,pjsip] [--no-calls]
+#      lld_serverzabbix.py --inventory inventario/ [--workers N]   (modo flota, ver zbx_common/fleet.py)
+import argparse, os, sys
+
+# Carga .env desde la raíz del proyecto (sin dependencias externas)
+import pathlib as _pl, os as _os
+_ef = next((p / ".env" for p in _pl.Path(__file__).resolve().parents if (p / ".env").is_file()), None)
+if _ef:
+    for _l in open(_ef):
+        _l = _l.strip()
+        if _l and not _l.startswith('#') and '=' in _l:
+            _k, _, _v = _l.partition('=')
+            _k, _v = _k.strip(), _v.strip().strip('"').strip("'")
+            if _k and _k not in _os.environ:
+                _os.environ[_k] = _v
+del _pl, _os, _ef
+
+# Modulos compartidos (zbx_common/) buscando hacia arriba, igual que el .env
+import pathlib as _pl, sys as _sys
+_lib = next((p / "zbx_common" for p in _pl.Path(__file__).resolve().parents if (p / "zbx_common").is_dir()), None)
+if _lib and str(_lib) not in _sys.path:
+    _sys.path.insert(0, str(_lib))
+del _pl, _sys, _lib
+from zbx_api import ZabbixAPI
+import fleet
+
+# ========= CONFIG =========
+ZBX_URL   = os.environ.get("ZBX_URL",   "http://<IP>/zabbix/api_jsonrpc.php")
+ZBX_USER  = os.environ.get("ZBX_USER",  "admin")
+ZBX_PASS  = os.environ.get("ZBX_PASS",  "admin")
+HOST_NAME = os.environ.get("ZBX_HOST_LLD", os.environ.get("ZBX_HOST", "gatewayd"))  # nombre EXACTO del host
+VERIFY_TLS = os.environ.get("ZBX_VERIFY_TLS", "false").lower() == "true"
+
+LLD_TECHS    = [t.strip() for t in os.environ.get("LLD_TECHS", "sip,pjsip").split(",") if t.strip()]
+LLD_DELAY    = os.environ.get("LLD_DELAY", "1h")      # cada cuanto se re-descubren los peers
+LLD_LIFETIME = os.environ.get("LLD_LIFETIME", "7d")   # cuanto sobrevive el item de un peer que desaparecio
+LLD_CALLS    = os.environ.get("LLD_CALLS", "true").lower() == "true"  # prototipos de llamadas activas
+
+# Mismas expresiones que bulk_*_trigger_serverzabbix.py
+TRIGGER_EXPR_MODE = os.environ.get("TRIGGER_EXPR_MODE", "last").lower()
+
+# Ítems (Zabbix 6.x: history/trends en segundos), iguales a los de los scripts por peer
+ITEM_DELAY     = "1m"
+ITEM_SCHEDULE  = "50s/1-7,00:00-24:00"
+ITEM_HISTORY_S = 7776000    # 90d
+ITEM_TRENDS_S  = 31536000   # 365d
+
+# tech -> nombres/tipos, con los mismos prefijos que los items y triggers por peer
+TECHS = {
+    "sip": {
+        "rule_name": "Asterisk SIP peers",
+        "rtt_name": "sip_status_{#PEER}", "rtt_value_type": 3,          # Numeric (unsigned)
+        "calls_name": "countcalls_tsip_{#PEER}",
+        "trigger_prefix": os.environ.get("LLD_TRIGGER_PREFIX_SIP", "status_tsip_asterisk."),
+    },
+    "pjsip": {
+        "rule_name": "Asterisk PJSIP endpoints",
+        "rtt_name": "pjsip_status_{#PEER}", "rtt_value_type": 0,        # Numeric (float)
+        "calls_name": "countcalls_tpjsip_{#PEER}",
+        "trigger_prefix": os.environ.get("LLD_TRIGGER_PREFIX_PJSIP", "status_tpjsip_asterisk."),
+    },
+}
+
+# Cliente compartido (zbx_common/zbx_api.py): una conexion keep-alive, sesion
+# reutilizada entre corridas (o ZBX_API_TOKEN) y reintentos con backoff
+zapi = ZabbixAPI(ZBX_URL, user=ZBX_USER, password=ZBX_PASS,
+                 token=os.environ.get("ZBX_API_TOKEN", ""), verify=VERIFY_TLS)
+
+def api(method, params, auth=None):
+    # <auth> queda por compatibilidad con los llamadores: la sesion vive en zapi
+    return zapi.call(method, params)
+
+def login():
+    return zapi.login()
+
+def get_host(auth, host_name=HOST_NAME):
+    res = api("host.get", {"filter":{"host":[host_name]}, "output":["hostid","host","name"]}, auth)
+    if not res:
+        res = api("host.get", {"filter":{"name":[host_name]}, "output":["hostid","host","name"]}, auth)
+    if not res:
+        raise RuntimeError(f"No se encontró el host '{host_name}' en Zabbix")
+    return res[0]  # {hostid, host, name}
+
+def get_agent_interfaceid(auth, hostid):
+    ifs = api("hostinterface.get", {"hostids": hostid, "output":["interfaceid","type"]}, auth)
+    for i in ifs:
+        if str(i.get("type")) == "1":  # 1 = Zabbix agent
+            return i["interfaceid"]
+    if ifs:
+        return ifs[0]["interfaceid"]
+    raise RuntimeError("El host no tiene interfaces. Agrega una interfaz de agente en Zabbix.")
+
+def rule_key(tech):
+    return f"asterisk.lld.discovery[{tech}]"
+
+def rtt_key(tech):
+    return f"asterisk.lld.rtt[{tech},{{#PEER}}]"
+
+def calls_key(tech):
+    return f"asterisk.lld.calls[{tech},{{#PEER}}]"
+
+def trigger_expression(host_tech_name, item_key):
+    if TRIGGER_EXPR_MODE == "count3":
+        return f"count(/{host_tech_name}/{item_key},#3,\"eq\",\"0\")=3"
+    return f"last(/{host_tech_name}/{item_key})=0"
+
+def item_prototypes(hostid, interfaceid, ruleid, tech):
+    t = TECHS[tech]
+    base = {"hostid": hostid, "ruleid": ruleid, "interfaceid": interfaceid, "type": 0,  # Zabbix agent
+            "delay": ITEM_DELAY, "history": ITEM_HISTORY_S, "trends": ITEM_TRENDS_S, "status": 0}
+    protos = [dict(base, name=t["rtt_name"], key_=rtt_key(tech), value_type=t["rtt_value_type"],
+                   units="ms", schedule=ITEM_SCHEDULE,
+                   tags=[{"tag": "service", "value": "asterisk"}, {"tag": "peer", "value": "{#PEER}"}])]
+    if LLD_CALLS:
+        protos.append(dict(base, name=t["calls_name"], key_=calls_key(tech), value_type=3, units="calls",
+                           tags=[{"tag": "service", "value": "asterisk"}, {"tag": "peer", "value": "{#PEER}"}]))
+    return protos
+
+def trigger_prototype(host_tech_name, tech):
+    t = TECHS[tech]
+    return {
+        "description": f"{t['trigger_prefix']}{{#PEER}}",
+        "expression": trigger_expression(host_tech_name, rtt_key(tech)),
+        "priority": 5,          # Disaster, igual que los triggers por peer
+        "manual_close": 0,
+        "status": 0,
+        "tags": [{"tag": "service", "value": "asterisk"}, {"tag": "peer", "value": "{#PEER}"}],
+    }
+
+def provision(auth, host_name, techs):
+    """
+    Regla de descubrimiento + prototipos de <techs> en <host_name>. Un paso que
+    falla se reporta y el resto sigue. Lo usan main() y el modo flota.
+    Devuelve contadores.
+    """
+    host = get_host(auth, host_name)
+    hostid = host["hostid"]
+    ifaceid = get_agent_interfaceid(auth, hostid)
+    counts = {"rules": 0, "prototypes": 0, "triggers": 0, "existing": 0, "failed": 0}
+
+    rules = api("discoveryrule.get", {
+        "hostids": hostid,
+        "filter": {"key_": [rule_key(t) for t in techs]},
+        "output": ["itemid", "key_"],
+    }, auth)
+    ruleids = {r["key_"]: r["itemid"] for r in rules}
+
+    for tech in techs:
+        key_ = rule_key(tech)
+        try:
+            if key_ in ruleids:
+                counts["existing"] += 1
+            else:
+                res = api("discoveryrule.create", {
+                    "hostid": hostid, "interfaceid": ifaceid, "name": TECHS[tech]["rule_name"],
+                    "key_": key_, "type": 0, "delay": LLD_DELAY, "lifetime": LLD_LIFETIME,
+                    "description": "Peers descubiertos por ast_lld/asterisk_lld.py",
+                }, auth)
+                ruleids[key_] = res["itemids"][0]
+                counts["rules"] += 1
+                print(f"[OK] regla creada: {key_} -> itemid={ruleids[key_]}")
+            ruleid = ruleids[key_]
+
+            have = {p["key_"] for p in api("itemprototype.get", {
+                "discoveryids": ruleid, "output": ["itemid", "key_"]}, auth)}
+            missing = [p for p in item_prototypes(hostid, ifaceid, ruleid, tech) if p["key_"] not in have]
+            counts["existing"] += len(have)
+            if missing:
+                api("itemprototype.create", missing, auth)
+                counts["prototypes"] += len(missing)
+                for p in missing:
+                    print(f"[OK] prototipo creado: {p['key_']}")
+
+            # La sintaxis de expresiones usa el nombre TECNICO del host
+            wanted = trigger_prototype(host["host"], tech)
+            have = {t["description"] for t in api("triggerprototype.get", {
+                "discoveryids": ruleid, "output": ["triggerid", "description"]}, auth)}
+            if wanted["description"] in have:
+                counts["existing"] += 1
+            else:
+                api("triggerprototype.create", [wanted], auth)
+                counts["triggers"] += 1
+                print(f"[OK] trigger prototipo creado: {wanted['description']}")
+        except RuntimeError as e:  # ZabbixAPIError (API, HTTP o red)
+            counts["failed"] += 1
+            print(f"[ERR] {tech}: {e}")
+
+    print(f"\nResumen: reglas={counts['rules']}, prototipos={counts['prototypes']}, "
+          f"triggers={counts['triggers']}, existentes={counts['existing']}, fallidos={counts['failed']}")
+    return counts
+
+def run_fleet(args, techs):
+    """--inventory: provision() en cada host del inventario, en paralelo (las entradas con "tech" usan solo esa)."""
+    global zapi
+    hosts = fleet.load_inventory(args.inventory)
+    if not hosts:
+        print("El inventario no tiene hosts.")
+        return 1
+    zapi = ZabbixAPI(ZBX_URL, user=ZBX_USER, password=ZBX_PASS,
+                     token=os.environ.get("ZBX_API_TOKEN", ""), verify=VERIFY_TLS,
+                     pool_size=args.workers + 1)
+    print(f"Flota LLD: {len(hosts)} hosts, {args.workers} hilos")
+    auth = login()
+    results = fleet.run_fleet(
+        hosts, lambda entry: provision(auth, entry["host"], [entry["tech"]] if entry["tech"] else techs),
+        args.workers)
+    fleet.print_summary(results, ["rules", "prototypes", "triggers", "existing", "failed"])
+    print(f"API: {zapi.summary()}")
+    return fleet.exit_code(results)
+
+def main():
+    global LLD_CALLS
+    parser = argparse.ArgumentParser(description="Reglas LLD + prototipos de peers SIP/PJSIP en Zabbix")
+    parser.add_argument("--techs", default=",".join(LLD_TECHS), help="sip, pjsip o ambos (sip,pjsip)")
+    parser.add_argument("--no-calls", action="store_true", help="Sin prototipos de llamadas activas")
+    parser.add_argument("--inventory", nargs="+", metavar="RUTA",
+                        help="Modo flota: archivos JSON o directorios de inventario (ver zbx_common/fleet.py)")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("FLEET_WORKERS", "8")),
+                        help="Hosts en paralelo en modo flota")
+    args = parser.parse_args()
+
+    techs = [t.strip() for t in args.techs.split(",") if t.strip()]
+    unknown = [t for t in techs if t not in TECHS]
+    if unknown or not techs:
+        print(f"ERROR: tech desconocida: {', '.join(unknown) or '(vacio)'} (usar sip y/o pjsip)")
+        sys.exit(1)
+    if args.no_calls:
+        LLD_CALLS = False
+
+    try:
+        if args.inventory:
+            sys.exit(run_fleet(args, techs))
+
+        auth = login()
+        if provision(auth, HOST_NAME, techs)["failed"]:
+            sys.exit(3)
+
+    except Exception as e:
+        print(f"ERROR: {e}")
+        sys.exit(2)
+
+if __name__ == "__main__":
+    main()
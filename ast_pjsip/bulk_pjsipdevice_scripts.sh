@@ -24,11 +24,18 @@ SCRIPT_PREFIX="pjsip-"
 # ======= Preparación =======
 mkdir -p "$SCRIPTS_DIR"
 chmod 755 "$SCRIPTS_DIR"
-cp -a "$ZABBIX_CONF" "${ZABBIX_CONF}.bak.$(date +%Y%m%d%H%M%S)"
+# UserParameters en un include propio de zabbix_agentd.d/ (ver zbx_common/agent_conf.sh)
+source "$(dirname "${BASH_SOURCE[0]}")/../zbx_common/agent_conf.sh"
+AGENT_CONF_NAME="asterisk_pjsip.conf"
+# ASTERISK_PROBE=true: la misma key la contesta ast_lld/asterisk_lld.py desde un
+# listado compartido (stale-while-revalidate), sin generar un script por peer
+ASTERISK_PROBE="${ASTERISK_PROBE:-false}"
+PROBE_SCRIPT="$(cd "$(dirname "${BASH_SOURCE[0]}")/../ast_lld" && pwd)/asterisk_lld.py"
 
 # ======= Obtener endpoints PJSIP (nombre antes de "/"), evitar cabeceras y resúmenes =======
 TMP_EPS="$(mktemp)"
-trap 'rm -f "$TMP_EPS"' EXIT
+TMP_CONF="$(mktemp)"
+trap 'rm -f "$TMP_EPS" "$TMP_CONF"' EXIT
 
 "$ASTERISK_BIN" -rx "pjsip show endpoints" 2>/dev/null | \
 awk '
@@ -46,12 +53,23 @@ awk '
   }
 ' | sort -u > "$TMP_EPS"
 
+# Sin endpoints (Asterisk caido o sin permisos) NO se vacia el include del agente
+if [[ ! -s "$TMP_EPS" ]]; then
+  echo "ERROR: 'pjsip show endpoints' no devolvió endpoints; no se modifica la configuración del agente." >&2
+  exit 1
+fi
+
 
 # ======= Generar script por endpoint y registrar UserParameter =======
 while IFS= read -r EP; do
   [[ -z "$EP" ]] && continue
   SCRIPT_PATH="${SCRIPTS_DIR}/${SCRIPT_PREFIX}${EP}.sh"
 
+  if [[ "$ASTERISK_PROBE" == "true" ]]; then
+    printf "UserParameter=asterisk.pjsip.%s, /usr/bin/python3 %s rtt pjsip '%s'\n" "$EP" "$PROBE_SCRIPT" "$EP" >> "$TMP_CONF"
+    continue
+  fi
+
   # Script por endpoint: intenta con sudo y fallback directo; imprime solo número (float o 0)
   cat > "$SCRIPT_PATH" <<'EOS'
 #!/usr/bin/env bash
@@ -154,27 +172,14 @@ EOS
   sed -i "s/__ASTERISK_USER__/${ASTERISK_USER_DEFAULT}/g" "$SCRIPT_PATH"
   chmod 755 "$SCRIPT_PATH"
 
-  # Registrar UserParameter si no existe (namespace separado pjsip)
-  USERPARAM="UserParameter=asterisk.pjsip.${EP}, ${SCRIPT_PATH}"
-  if ! grep -Fq "UserParameter=asterisk.pjsip.${EP}," "$ZABBIX_CONF"; then
-    printf "\n%s\n" "$USERPARAM" >> "$ZABBIX_CONF"
-    echo "Añadido UserParameter PJSIP para ${EP}"
-  else
-    echo "UserParameter PJSIP para ${EP} ya existe, se omite."
-  fi
+  # UserParameter al include (namespace separado pjsip; se escribe entero al final)
+  printf "UserParameter=asterisk.pjsip.%s, %s\n" "$EP" "$SCRIPT_PATH" >> "$TMP_CONF"
 done < "$TMP_EPS"
 
-# ======= Reiniciar Zabbix Agent =======
-if command -v systemctl >/dev/null 2>&1; then
-  if systemctl list-unit-files | grep -q '^zabbix-agent2\.service'; then
-    systemctl restart zabbix-agent2 || true
-  elif systemctl list-unit-files | grep -q '^zabbix-agent\.service'; then
-    systemctl restart zabbix-agent || true
-  else
-    service zabbix-agent restart || service zabbix-agent2 restart || true
-  fi
-else
-  service zabbix-agent restart || service zabbix-agent2 restart || true
-fi
+# ======= Include atómico + recarga del agente =======
+agent_conf_ensure_include
+agent_conf_write "$AGENT_CONF_NAME" "$TMP_CONF"
+agent_conf_adopt "$TMP_CONF"
+agent_reload
 
 echo "Proceso PJSIP completado."
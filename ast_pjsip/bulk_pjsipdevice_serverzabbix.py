@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-import os, re, sys, subprocess, requests
+import argparse, os, sys, subprocess
 
 # Carga .env desde la raíz del proyecto (sin dependencias externas)
 import pathlib as _pl, os as _os
@@ -14,6 +14,15 @@ if _ef:
                 _os.environ[_k] = _v
 del _pl, _os, _ef
 
+# Modulos compartidos (zbx_common/) buscando hacia arriba, igual que el .env
+import pathlib as _pl, sys as _sys
+_lib = next((p / "zbx_common" for p in _pl.Path(__file__).resolve().parents if (p / "zbx_common").is_dir()), None)
+if _lib and str(_lib) not in _sys.path:
+    _sys.path.insert(0, str(_lib))
+del _pl, _sys, _lib
+from zbx_api import ZabbixAPI, call_chunked
+import ast_cli, fleet
+
 # ========= CONFIG =========
 ZBX_URL   = os.environ.get("ZBX_URL",   "http://<IP>/zabbix/api_jsonrpc.php")
 ZBX_USER  = os.environ.get("ZBX_USER",  "admin")
@@ -34,27 +43,33 @@ ITEM_VALUE_TYPE = 0   # 0 = Numeric (float)  |  3 = Numeric (unsigned)
 ITEM_TYPE       = 0   # 0 = Zabbix agent
 ITEM_UNITS      = "ms"
 
-session = requests.Session()
+KEY_PREFIX = "asterisk.pjsip"
+CHUNK_SIZE = int(os.environ.get("ZBX_CHUNK_SIZE", "500"))  # objetos por item.create/update
+
+# PJSIP_COLLECTOR=true: los valores los empuja pjsip_rtt_collector.py (un solo
+# "pjsip show endpoints" por ciclo) -> items TRAPPER en vez de Zabbix agent.
+PJSIP_COLLECTOR = os.environ.get("PJSIP_COLLECTOR", "false").lower() == "true"
+if PJSIP_COLLECTOR:
+    ITEM_TYPE = 2     # 2 = Zabbix trapper
+
+# Cliente compartido (zbx_common/zbx_api.py): una conexion keep-alive, sesion
+# reutilizada entre corridas (o ZBX_API_TOKEN) y reintentos con backoff
+zapi = ZabbixAPI(ZBX_URL, user=ZBX_USER, password=ZBX_PASS,
+                 token=os.environ.get("ZBX_API_TOKEN", ""), verify=VERIFY_TLS)
 
 def api(method, params, auth=None):
-    payload = {"jsonrpc":"2.0","method":method,"params":params,"id":1}
-    if auth: payload["auth"] = auth
-    r = session.post(ZBX_URL, json=payload, verify=VERIFY_TLS, timeout=30)
-    r.raise_for_status()
-    data = r.json()
-    if "error" in data:
-        raise RuntimeError(f"API error: {data['error']}")
-    return data["result"]
+    # <auth> queda por compatibilidad con los llamadores: la sesion vive en zapi
+    return zapi.call(method, params)
 
 def login():
-    return api("user.login", {"user": ZBX_USER, "password": ZBX_PASS})
+    return zapi.login()
 
-def get_hostid(auth):
-    res = api("host.get", {"filter":{"host":[HOST_NAME]}, "output":["hostid","host","name"]}, auth)
+def get_hostid(auth, host_name=HOST_NAME):
+    res = api("host.get", {"filter":{"host":[host_name]}, "output":["hostid","host","name"]}, auth)
     if not res:
-        res = api("host.get", {"filter":{"name":[HOST_NAME]}, "output":["hostid","host","name"]}, auth)
+        res = api("host.get", {"filter":{"name":[host_name]}, "output":["hostid","host","name"]}, auth)
     if not res:
-        raise RuntimeError(f"No se encontró el host '{HOST_NAME}' en Zabbix")
+        raise RuntimeError(f"No se encontró el host '{host_name}' en Zabbix")
     return res[0]["hostid"]
 
 def get_agent_interfaceid(auth, hostid):
@@ -70,35 +85,23 @@ def get_endpoints_from_asterisk():
     """
     Devuelve lista de endpoints PJSIP a partir de:
       asterisk -rx "pjsip show endpoints"
-    Extrae el token tras 'Endpoint:' (antes de un '/'), evita la línea plantilla '<Endpoint/...'.
+    leido linea por linea con zbx_common/ast_cli.py (nombre antes del '/',
+    sin la línea plantilla '<Endpoint/...').
     """
-    cmd = [ASTERISK_BIN, "-rx", "pjsip show endpoints"]
-    out = subprocess.check_output(cmd, stderr=subprocess.STDOUT)
-    if not isinstance(out, str):
-        out = out.decode("utf-8", errors="ignore")
-
-    eps = set()
-    for line in out.splitlines():
-        m = re.match(r'^\s*Endpoint:\s+(.*)$', line)
-        if not m:
-            continue
-        rest = m.group(1).strip()
-        if not rest:
-            continue
-        first = rest.split()[0]
-        name = first.split('/', 1)[0].strip()
-        # Evitar la línea plantilla que empieza con '<'
-        if not name or name.startswith('<'):
-            continue
-        eps.add(name)
-
-    return sorted(eps)
-
-def item_exists(auth, hostid, key_):
-    res = api("item.get", {"hostids": hostid, "filter":{"key_": key_}, "output":["itemid"]}, auth)
-    return bool(res)
-
-def create_item(auth, hostid, interfaceid, endpoint, key_):
+    lines = ast_cli.asterisk_lines("pjsip show endpoints", ASTERISK_BIN)
+    return sorted({ep.name for ep in ast_cli.pjsip_endpoints(lines)})
+
+def get_existing_items(auth, hostid):
+    """Un solo item.get con todas las keys asterisk.pjsip.* del host -> {key_: item}."""
+    res = api("item.get", {
+        "hostids": hostid,
+        "search": {"key_": f"{KEY_PREFIX}."},
+        "startSearch": True,
+        "output": ["itemid", "key_", "type"],
+    }, auth)
+    return {it["key_"]: it for it in res}
+
+def item_params(hostid, interfaceid, endpoint, key_):
     params = {
         "hostid": hostid,
         "interfaceid": interfaceid,
@@ -113,31 +116,111 @@ def create_item(auth, hostid, interfaceid, endpoint, key_):
         "trends": ITEM_TRENDS_S,
         "status": 0                    # enabled
     }
-    return api("item.create", params, auth)
+    if ITEM_TYPE == 2:
+        # Trapper: sin interfaz ni intervalo de sondeo
+        for k in ("interfaceid", "delay", "schedule"):
+            params.pop(k)
+    return params
+
+def provision(auth, host_name, endpoints):
+    """
+    Crea los items de <endpoints> en <host_name> (y los convierte a trapper
+    con PJSIP_COLLECTOR). Lo usan main() y el modo flota. Devuelve contadores.
+    """
+    hostid = get_hostid(auth, host_name)
+    ifaceid = get_agent_interfaceid(auth, hostid)
+
+    existing = get_existing_items(auth, hostid)
+    wanted = {f"{KEY_PREFIX}.{ep}": ep for ep in endpoints}
+    missing = sorted(set(wanted) - set(existing))
+    present = sorted(set(wanted) & set(existing))
+
+    to_convert = []
+    if PJSIP_COLLECTOR:
+        to_convert = [{"itemid": existing[k]["itemid"], "type": 2}
+                      for k in present if str(existing[k].get("type")) != "2"]
+    print(f"Endpoints: {len(wanted)} | existentes: {len(present)} | "
+          f"a crear: {len(missing)} | a convertir a trapper: {len(to_convert)}")
+
+    new_items = [item_params(hostid, ifaceid, wanted[k], k) for k in missing]
+    created, failed_create = call_chunked(api, "item.create", new_items, "itemids", CHUNK_SIZE)
+    for obj, e in failed_create:
+        print(f"[ERR] crear: {obj.get('key_', obj.get('itemid'))} -> {e}")
+    for obj, itemid in created:
+        print(f"[OK] creado: {obj['key_']} -> itemid={itemid}")
+    converted, failed_convert = call_chunked(api, "item.update", to_convert, "itemids", CHUNK_SIZE)
+    for obj, e in failed_convert:
+        print(f"[ERR] convertir: {obj.get('key_', obj.get('itemid'))} -> {e}")
+
+    counts = {"endpoints": len(wanted), "created": len(created), "existing": len(present) - len(to_convert),
+              "converted": len(converted), "failed": len(failed_create) + len(failed_convert)}
+    print(f"\nResumen: creados={counts['created']}, existentes={counts['existing']}, "
+          f"convertidos a trapper={counts['converted']}, fallidos={counts['failed']}")
+    return counts
+
+def run_fleet(args):
+    """--inventory: provision() (+ triggers) para cada host del inventario, en paralelo."""
+    global zapi
+    hosts = fleet.load_inventory(args.inventory, tech="pjsip")
+    if not hosts:
+        print("El inventario no tiene hosts PJSIP.")
+        return 1
+    # Un cliente para toda la flota, con una conexion por hilo
+    zapi = ZabbixAPI(ZBX_URL, user=ZBX_USER, password=ZBX_PASS,
+                     token=os.environ.get("ZBX_API_TOKEN", ""), verify=VERIFY_TLS,
+                     pool_size=args.workers + 1)
+    triggers = None
+    if args.with_triggers:
+        import bulk_pjsipdevice_trigger_serverzabbix as triggers
+        triggers.zapi = zapi
+    columns = ["endpoints", "created", "existing", "converted", "failed"]
+    if triggers:
+        columns += ["t_created", "t_updated", "t_failed"]
+
+    print(f"Flota PJSIP: {len(hosts)} hosts, {args.workers} hilos"
+          + (" (items + triggers)" if triggers else ""))
+    auth = login()
+
+    def task(entry):
+        if not entry["endpoints"]:
+            raise RuntimeError(f"sin endpoints en el inventario ({entry['source']})")
+        counts = provision(auth, entry["host"], entry["endpoints"])
+        if triggers:
+            counts.update({f"t_{k}": v for k, v in triggers.reconcile(auth, entry["host"]).items()})
+        return counts
+
+    results = fleet.run_fleet(hosts, task, args.workers)
+    fleet.print_summary(results, columns)
+    print(f"API: {zapi.summary()}")
+    return fleet.exit_code(results)
 
 def main():
+    parser = argparse.ArgumentParser(description="Items asterisk.pjsip.<endpoint> en Zabbix")
+    parser.add_argument("--export", metavar="ARCHIVO",
+                        help="Solo descubrir endpoints y escribirlos como inventario JSON ('-' = stdout)")
+    parser.add_argument("--inventory", nargs="+", metavar="RUTA",
+                        help="Modo flota: archivos JSON o directorios exportados con --export")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("FLEET_WORKERS", "8")),
+                        help="Hosts en paralelo en modo flota")
+    parser.add_argument("--with-triggers", action="store_true",
+                        help="Modo flota: reconciliar tambien los triggers de cada host")
+    args = parser.parse_args()
+
     try:
-        auth = login()
-        hostid = get_hostid(auth)
-        ifaceid = get_agent_interfaceid(auth, hostid)
+        if args.inventory:
+            sys.exit(run_fleet(args))
 
         endpoints = get_endpoints_from_asterisk()
         if not endpoints:
             print("No se detectaron endpoints desde 'pjsip show endpoints'.")
             sys.exit(1)
+        if args.export:
+            fleet.export_entry(args.export, HOST_NAME, "pjsip", endpoints)
+            return
 
-        created = skipped = 0
-        for ep in endpoints:
-            key_ = f"asterisk.pjsip.{ep}"
-            if item_exists(auth, hostid, key_):
-                skipped += 1
-                print(f"[SKIP] ya existe: {key_}")
-                continue
-            res = create_item(auth, hostid, ifaceid, ep, key_)
-            print(f"[OK] creado: {key_} -> itemid={res['itemids'][0]}")
-            created += 1
-
-        print(f"\nResumen: creados={created}, existentes={skipped}")
+        auth = login()
+        if provision(auth, HOST_NAME, endpoints)["failed"]:
+            sys.exit(3)
 
     except subprocess.CalledProcessError as e:
         msg = e.output.decode("utf-8", errors="ignore") if isinstance(e.output, (bytes,bytearray)) else str(e.output)
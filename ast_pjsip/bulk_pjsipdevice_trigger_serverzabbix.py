@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-import os, sys, requests
+import argparse, os, re, sys
 
 # Carga .env desde la raíz del proyecto (sin dependencias externas)
 import pathlib as _pl, os as _os
@@ -14,6 +14,15 @@ if _ef:
                 _os.environ[_k] = _v
 del _pl, _os, _ef
 
+# Modulos compartidos (zbx_common/) buscando hacia arriba, igual que el .env
+import pathlib as _pl, sys as _sys
+_lib = next((p / "zbx_common" for p in _pl.Path(__file__).resolve().parents if (p / "zbx_common").is_dir()), None)
+if _lib and str(_lib) not in _sys.path:
+    _sys.path.insert(0, str(_lib))
+del _pl, _sys, _lib
+from zbx_api import ZabbixAPI, call_chunked
+import fleet
+
 # ================== CONFIG ==================
 ZBX_URL   = os.environ.get("ZBX_URL",   "http://<IP>/zabbix/api_jsonrpc.php")
 ZBX_USER  = os.environ.get("ZBX_USER",  "admin")
@@ -24,27 +33,32 @@ VERIFY_TLS = os.environ.get("ZBX_VERIFY_TLS", "false").lower() == "true"
 TRIGGER_NAME_PREFIX = os.environ.get("TRIGGER_NAME_PREFIX", "status_tpjsip_asterisk.")
 DEBUG = os.environ.get("DEBUG", "false").lower() == "true"
 
-session = requests.Session()
+# Expresion del trigger: "last" = alerta si el ultimo valor = 0 (default)
+#                       "count3" = alternativa mas estable: 3 ultimos valores a 0
+TRIGGER_EXPR_MODE = os.environ.get("TRIGGER_EXPR_MODE", "last").lower()
+# true = ademas de crear los que faltan, actualiza los triggers cuya expresion
+# ya no coincide (p.ej. al pasar de "last" a "count3")
+TRIGGER_RECONCILE = os.environ.get("TRIGGER_RECONCILE", "false").lower() == "true"
+CHUNK_SIZE = int(os.environ.get("ZBX_CHUNK_SIZE", "500"))  # objetos por trigger.create/update
+
+# Cliente compartido (zbx_common/zbx_api.py): una conexion keep-alive, sesion
+# reutilizada entre corridas (o ZBX_API_TOKEN) y reintentos con backoff
+zapi = ZabbixAPI(ZBX_URL, user=ZBX_USER, password=ZBX_PASS,
+                 token=os.environ.get("ZBX_API_TOKEN", ""), verify=VERIFY_TLS)
 
 def api(method, params, auth=None):
-    payload = {"jsonrpc":"2.0","method":method,"params":params,"id":1}
-    if auth: payload["auth"] = auth
-    r = session.post(ZBX_URL, json=payload, verify=VERIFY_TLS, timeout=30)
-    r.raise_for_status()
-    data = r.json()
-    if "error" in data:
-        raise RuntimeError(f"API error: {data['error']}")
-    return data["result"]
+    # <auth> queda por compatibilidad con los llamadores: la sesion vive en zapi
+    return zapi.call(method, params)
 
 def login():
-    return api("user.login", {"user": ZBX_USER, "password": ZBX_PASS})
+    return zapi.login()
 
-def get_host(auth):
-    res = api("host.get", {"filter":{"host":[ZBX_HOST]}, "output":["hostid","host","name"]}, auth)
+def get_host(auth, host_name=ZBX_HOST):
+    res = api("host.get", {"filter":{"host":[host_name]}, "output":["hostid","host","name"]}, auth)
     if not res:
-        res = api("host.get", {"filter":{"name":[ZBX_HOST]}, "output":["hostid","host","name"]}, auth)
+        res = api("host.get", {"filter":{"name":[host_name]}, "output":["hostid","host","name"]}, auth)
     if not res:
-        raise RuntimeError(f"No se encontró el host '{ZBX_HOST}'")
+        raise RuntimeError(f"No se encontró el host '{host_name}'")
     return res[0]  # {hostid, host, name}
 
 def items_pjsip_status(auth, hostid):
@@ -74,24 +88,32 @@ def items_pjsip_status(auth, hostid):
             print(f"  - {it['name']} :: {it['key_']} :: vtype={it['value_type']}")
     return final
 
-def trigger_exists(auth, hostid, name):
+def get_host_triggers(auth, hostid):
+    """Un solo trigger.get para todo el host -> {description: trigger} (expresion expandida)."""
     res = api("trigger.get", {
         "hostids": hostid,
-        "filter": {"description": name},
-        "output": ["triggerid"]
+        "output": ["triggerid", "description", "expression"],
+        "expandExpression": True,
     }, auth)
-    return bool(res)
+    return {t["description"]: t for t in res}
+
+def trigger_expression(host_tech_name, item_key):
+    if TRIGGER_EXPR_MODE == "count3":
+        return f"count(/{host_tech_name}/{item_key},#3,\"eq\",\"0\")=3"
+    return f"last(/{host_tech_name}/{item_key})=0"
 
-def create_trigger_status_zero(auth, host_visible_name, item_key, trigger_name, peer):
-    # Sencillo: alerta si el último valor = 0
-    expr = f"last(/{host_visible_name}/{item_key})=0"
+# expandExpression devuelve la expresion como la guarda Zabbix, con o sin
+# comillas en los parametros segun la version (#3,"eq","0" / #3,eq,0): se
+# compara sin espacios ni comillas para no "actualizar" en cada corrida
+QUOTED_PARAM_RE = re.compile(r'"((?:[^"\\]|\\.)*)"')
 
-    # (Opcional) alternativa más estable: 3 últimos valores a 0 (descomenta esta línea y comenta la anterior)
-    # expr = f"count(/{host_visible_name}/{item_key},#3,0,\"eq\")=3"
+def _norm_expr(expr):
+    return QUOTED_PARAM_RE.sub(r"\1", "".join((expr or "").split()))
 
-    params = {
+def trigger_params(host_tech_name, item_key, trigger_name, peer):
+    return {
         "description": trigger_name,
-        "expression": expr,
+        "expression": trigger_expression(host_tech_name, item_key),
         "priority": 5,          # Disaster (ajusta a 4=High si prefieres)
         "manual_close": 0,
         "status": 0,            # enabled
@@ -100,45 +122,105 @@ def create_trigger_status_zero(auth, host_visible_name, item_key, trigger_name,
             {"tag": "peer", "value": peer}
         ],
     }
-    return api("trigger.create", params, auth)
+
+def reconcile(auth, host_name):
+    """
+    Crea (y con TRIGGER_RECONCILE actualiza) los triggers de los items
+    pjsip_status_* de <host_name>. Lo usan main() y el modo flota (tambien
+    desde bulk_pjsipdevice_serverzabbix.py --with-triggers). Devuelve contadores.
+    """
+    host = get_host(auth, host_name)
+    hostid, host_tech = host["hostid"], host["host"]
+
+    items = items_pjsip_status(auth, hostid)
+    if not items:
+        # Ayuda de depuración: muestra cuántos hay con ese prefijo aunque no pasen el filtro
+        maybe = api("item.get", {
+            "hostids": hostid,
+            "search": {"key_": "asterisk.pjsip."},
+            "output": ["itemid", "key_", "name", "value_type"],
+        }, auth)
+        print("No se encontraron ítems 'pjsip_status_*' con key 'asterisk.pjsip.'")
+        print(f"Sugerencia: revisa value_type. Ejemplo de keys encontradas ({min(5,len(maybe))}):")
+        for it in maybe[:5]:
+            print(f"  - {it.get('name')} :: {it.get('key_')} :: vtype={it.get('value_type')}")
+        return {"items": 0, "created": 0, "updated": 0, "existing": 0, "failed": 0}
+
+    existing = get_host_triggers(auth, hostid)
+
+    to_create, to_update = [], []
+    skipped = 0
+    for it in items:
+        key_ = it["key_"]
+        name = it.get("name", "")
+        peer = name.split("pjsip_status_", 1)[1] if "pjsip_status_" in name else key_.split("asterisk.pjsip.",1)[1]
+        trig_name = f"{TRIGGER_NAME_PREFIX}{peer}"
+        wanted = trigger_params(host_tech, key_, trig_name, peer)
+
+        cur = existing.get(trig_name)
+        if cur is None:
+            to_create.append(wanted)
+        elif _norm_expr(cur.get("expression")) != _norm_expr(wanted["expression"]):
+            if TRIGGER_RECONCILE:
+                to_update.append({"triggerid": cur["triggerid"], "expression": wanted["expression"]})
+            else:
+                print(f"[DRIFT] expresion distinta (TRIGGER_RECONCILE=true para actualizar): {trig_name}")
+                skipped += 1
+        else:
+            skipped += 1
+
+    created, failed_create = call_chunked(api, "trigger.create", to_create, "triggerids", CHUNK_SIZE)
+    for obj, e in failed_create:
+        print(f"[ERR] crear: {obj.get('description', obj.get('triggerid'))} -> {e}")
+    for obj, tid in created:
+        print(f"[OK] creado trigger: {obj['description']} -> id={tid}")
+    updated, failed_update = call_chunked(api, "trigger.update", to_update, "triggerids", CHUNK_SIZE)
+    for obj, e in failed_update:
+        print(f"[ERR] actualizar: {obj.get('description', obj.get('triggerid'))} -> {e}")
+    for obj, tid in updated:
+        print(f"[OK] expresion actualizada: trigger id={tid}")
+
+    counts = {"items": len(items), "created": len(created), "updated": len(updated),
+              "existing": skipped, "failed": len(failed_create) + len(failed_update)}
+    print(f"\nResumen: creados={counts['created']}, actualizados={counts['updated']}, "
+          f"existentes={counts['existing']}, fallidos={counts['failed']}")
+    return counts
+
+def run_fleet(args):
+    """--inventory: reconcile() para cada host del inventario, en paralelo (solo se usa "host")."""
+    global zapi
+    hosts = fleet.load_inventory(args.inventory, tech="pjsip")
+    if not hosts:
+        print("El inventario no tiene hosts PJSIP.")
+        return 1
+    zapi = ZabbixAPI(ZBX_URL, user=ZBX_USER, password=ZBX_PASS,
+                     token=os.environ.get("ZBX_API_TOKEN", ""), verify=VERIFY_TLS,
+                     pool_size=args.workers + 1)
+    print(f"Flota PJSIP (triggers): {len(hosts)} hosts, {args.workers} hilos")
+    auth = login()
+    results = fleet.run_fleet(hosts, lambda entry: reconcile(auth, entry["host"]), args.workers)
+    fleet.print_summary(results, ["items", "created", "updated", "existing", "failed"])
+    print(f"API: {zapi.summary()}")
+    return fleet.exit_code(results)
 
 def main():
+    parser = argparse.ArgumentParser(description="Triggers de los items pjsip_status_* en Zabbix")
+    parser.add_argument("--inventory", nargs="+", metavar="RUTA",
+                        help="Modo flota: archivos JSON o directorios de inventario (ver zbx_common/fleet.py)")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("FLEET_WORKERS", "8")),
+                        help="Hosts en paralelo en modo flota")
+    args = parser.parse_args()
+
     try:
+        if args.inventory:
+            sys.exit(run_fleet(args))
+
         auth = login()
-        host = get_host(auth)
-        hostid, host_visible = host["hostid"], host["name"]
-
-        items = items_pjsip_status(auth, hostid)
-        if not items:
-            # Ayuda de depuración: muestra cuántos hay con ese prefijo aunque no pasen el filtro
-            maybe = api("item.get", {
-                "hostids": hostid,
-                "search": {"key_": "asterisk.pjsip."},
-                "output": ["itemid", "key_", "name", "value_type"],
-            }, auth)
-            print("No se encontraron ítems 'pjsip_status_*' con key 'asterisk.pjsip.'")
-            print(f"Sugerencia: revisa value_type. Ejemplo de keys encontradas ({min(5,len(maybe))}):")
-            for it in maybe[:5]:
-                print(f"  - {it.get('name')} :: {it.get('key_')} :: vtype={it.get('value_type')}")
+        counts = reconcile(auth, ZBX_HOST)
+        if not counts["items"]:
             sys.exit(1)
-
-        created = skipped = 0
-        for it in items:
-            key_ = it["key_"]
-            name = it.get("name", "")
-            peer = name.split("pjsip_status_", 1)[1] if "pjsip_status_" in name else key_.split("asterisk.pjsip.",1)[1]
-            trig_name = f"{TRIGGER_NAME_PREFIX}{peer}"
-
-            if trigger_exists(auth, hostid, trig_name):
-                print(f"[SKIP] ya existe trigger: {trig_name}")
-                skipped += 1
-                continue
-
-            res = create_trigger_status_zero(auth, host_visible, key_, trig_name, peer)
-            print(f"[OK] creado trigger: {trig_name} -> id={res['triggerids'][0]}")
-            created += 1
-
-        print(f"\nResumen: creados={created}, existentes={skipped}")
+        if counts["failed"]:
+            sys.exit(3)
 
     except Exception as e:
         print(f"ERROR: {e}")
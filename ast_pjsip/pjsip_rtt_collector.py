@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# Recolector PJSIP de una sola pasada: en vez de que cada pjsip-<EP>.sh haga su
+# propio "pjsip show endpoint <EP>" (1 fork de sudo+asterisk por endpoint y por
+# minuto), corre UNA vez "pjsip show endpoints" -- que ya lista los Contact de
+# cada endpoint con su RTT -- y envia todos los valores asterisk.pjsip.<EP> en
+# un solo lote de zabbix_sender.
+# Los items deben ser tipo TRAPPER: crearlos con PJSIP_COLLECTOR=true
+# (ver bulk_pjsipdevice_serverzabbix.py). Ejecutar por cron cada minuto.
+import argparse, os, re, subprocess, sys, time
+
+# Carga .env desde la raíz del proyecto (sin dependencias externas)
+import pathlib as _pl, os as _os
+_ef = next((p / ".env" for p in _pl.Path(__file__).resolve().parents if (p / ".env").is_file()), None)
+if _ef:
+    for _l in open(_ef):
+        _l = _l.strip()
+        if _l and not _l.startswith('#') and '=' in _l:
+            _k, _, _v = _l.partition('=')
+            _k, _v = _k.strip(), _v.strip().strip('"').strip("'")
+            if _k and _k not in _os.environ:
+                _os.environ[_k] = _v
+del _pl, _os, _ef
+
+# Modulos compartidos (zbx_common/) buscando hacia arriba, igual que el .env
+import pathlib as _pl, sys as _sys
+_lib = next((p / "zbx_common" for p in _pl.Path(__file__).resolve().parents if (p / "zbx_common").is_dir()), None)
+if _lib and str(_lib) not in _sys.path:
+    _sys.path.insert(0, str(_lib))
+del _pl, _sys, _lib
+import ast_cli
+
+# ========= CONFIG =========
+ZBX_SERVER = os.environ.get("ZBX_SERVER", "127.0.0.1")
+ZBX_PORT   = os.environ.get("ZBX_PORT",   "10051")
+HOST_NAME  = os.environ.get("ZBX_HOST_PJSIP", os.environ.get("ZBX_HOST", "gatewayd"))  # nombre EXACTO del host en Zabbix
+
+ASTERISK_BIN   = os.environ.get("ASTERISK_BIN", "/usr/sbin/asterisk")
+SENDER_BIN     = os.environ.get("ZABBIX_SENDER_BIN", "zabbix_sender")
+ASTERISK_TIMEOUT = 20   # segundos; debe quedar holgado dentro del minuto del cron
+
+KEY_PREFIX = "asterisk.pjsip"
+
+def parse_endpoint_rtts(lines):
+    """
+    Recorre la salida de "pjsip show endpoints" (texto o lineas, p. ej. el
+    pipe de ast_cli.asterisk_lines) y devuelve {endpoint: rtt}. Cada endpoint
+    queda con el MINIMO RTT de sus Contact (o "0" si no tiene ninguno
+    disponible), igual que pjsip-<EP>.sh; las reglas viven en ast_cli.
+    """
+    return {ep.name: (ep.rtt if ep.rtt is not None else "0") for ep in ast_cli.pjsip_endpoints(lines)}
+
+def _quote(s):
+    return '"' + s.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+def build_sender_input(rtts):
+    return "".join(f"{_quote(HOST_NAME)} {_quote(f'{KEY_PREFIX}.{ep}')} {val}\n"
+                   for ep, val in sorted(rtts.items()))
+
+def send_batch(payload):
+    """Envia el lote completo por stdin a zabbix_sender; devuelve (rc, salida)."""
+    cmd = [SENDER_BIN, "-z", ZBX_SERVER, "-p", str(ZBX_PORT), "-i", "-"]
+    proc = subprocess.run(cmd, input=payload.encode("utf-8"),
+                          stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    return proc.returncode, proc.stdout.decode("utf-8", errors="ignore")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dry-run", action="store_true", help="Muestra los valores sin enviarlos")
+    args = parser.parse_args()
+
+    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Recolectando RTT PJSIP...")
+    # Se parsea a medida que Asterisk escribe: memoria plana con miles de endpoints
+    try:
+        rtts = parse_endpoint_rtts(ast_cli.asterisk_lines("pjsip show endpoints", ASTERISK_BIN,
+                                                          timeout=ASTERISK_TIMEOUT))
+    except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError) as e:
+        print(f"ERROR: sin salida de 'pjsip show endpoints' ({e})")
+        sys.exit(2)
+    if not rtts:
+        print("No se detectaron endpoints desde 'pjsip show endpoints'.")
+        sys.exit(1)
+    up = sum(1 for v in rtts.values() if v != "0")
+    print(f"[INFO] Endpoints: {len(rtts)} | Con RTT: {up} | Sin contacto disponible: {len(rtts) - up}")
+
+    payload = build_sender_input(rtts)
+    if args.dry_run:
+        sys.stdout.write(payload)
+        return
+
+    rc, out = send_batch(payload)
+    print("\n".join(out.strip().splitlines()[-3:]))
+    processed = re.findall(r'processed:\s*([0-9]+)', out)
+    failed = re.findall(r'failed:\s*([0-9]+)', out)
+    print(f"[RESULT] processed={processed[-1] if processed else '?'} failed={failed[-1] if failed else '?'}")
+    if failed and int(failed[-1]) > 0:
+        print(f"[WARN] Hay {failed[-1]} items rechazados (¿items sin crear o no trapper?). "
+              f"Corre bulk_pjsipdevice_serverzabbix.py con PJSIP_COLLECTOR=true")
+    # zabbix_sender sale con 2 cuando hubo rechazos parciales: solo es error si no proceso nada
+    if rc not in (0, 2):
+        sys.exit(2)
+
+if __name__ == "__main__":
+    main()
@@ -21,11 +21,18 @@ ASTERISK_USER_DEFAULT="${ASTERISK_USER_DEFAULT:-root}"
 # ======= Preparación =======
 mkdir -p "$SCRIPTS_DIR"
 chmod 755 "$SCRIPTS_DIR"
-cp -a "$ZABBIX_CONF" "${ZABBIX_CONF}.bak.$(date +%Y%m%d%H%M%S)"
+# UserParameters en un include propio de zabbix_agentd.d/ (ver zbx_common/agent_conf.sh)
+source "$(dirname "${BASH_SOURCE[0]}")/../zbx_common/agent_conf.sh"
+AGENT_CONF_NAME="asterisk_sip.conf"
+# ASTERISK_PROBE=true: la misma key la contesta ast_lld/asterisk_lld.py desde un
+# listado compartido (stale-while-revalidate), sin generar un script por peer
+ASTERISK_PROBE="${ASTERISK_PROBE:-false}"
+PROBE_SCRIPT="$(cd "$(dirname "${BASH_SOURCE[0]}")/../ast_lld" && pwd)/asterisk_lld.py"
 
 # ======= Obtener peers (columna 1 antes de "/"), evitando cabeceras y resúmenes =======
 TMP_PEERS="$(mktemp)"
-trap 'rm -f "$TMP_PEERS"' EXIT
+TMP_CONF="$(mktemp)"
+trap 'rm -f "$TMP_PEERS" "$TMP_CONF"' EXIT
 
 "$ASTERISK_BIN" -rx "sip show peers" 2>/dev/null | awk '
   BEGIN{IGNORECASE=1}
@@ -41,11 +48,22 @@ trap 'rm -f "$TMP_PEERS"' EXIT
   }
 ' | sort -u > "$TMP_PEERS"
 
+# Sin peers (Asterisk caido o sin permisos) NO se vacia el include del agente
+if [[ ! -s "$TMP_PEERS" ]]; then
+  echo "ERROR: 'sip show peers' no devolvió peers; no se modifica la configuración del agente." >&2
+  exit 1
+fi
+
 # ======= Generar script por peer y registrar UserParameter =======
 while IFS= read -r PEER; do
   [[ -z "$PEER" ]] && continue
   SCRIPT_PATH="${SCRIPTS_DIR}/${PEER}.sh"
 
+  if [[ "$ASTERISK_PROBE" == "true" ]]; then
+    printf "UserParameter=asterisk.%s, /usr/bin/python3 %s rtt sip '%s'\n" "$PEER" "$PROBE_SCRIPT" "$PEER" >> "$TMP_CONF"
+    continue
+  fi
+
   # Script por peer: usa sudo con rutas absolutas y fallback sin sudo; siempre imprime solo número
   cat > "$SCRIPT_PATH" <<'EOS'
 #!/usr/bin/env bash
@@ -65,8 +83,9 @@ if [[ -z "$RAW" ]]; then
   RAW="$("$ASTERISK_BIN" -rx "sip show peer ${PEER}" 2>/dev/null || true)"
 fi
 
-# 3) Extraer la línea Status y devolver solo ms
-STATUS_LINE="$(printf '%s\n' "$RAW" | awk -F: '/^[[:space:]]*Status/{print $0; exit}')"
+# 3) Extraer la línea Status y devolver solo ms (awk lee todo: con "exit" y
+#    pipefail, un detalle grande mataba al printf por SIGPIPE y salia vacio)
+STATUS_LINE="$(printf '%s\n' "$RAW" | awk -F: '/^[[:space:]]*Status/ && !found {print $0; found=1}')"
 if [[ "$STATUS_LINE" =~ \(([0-9]+)[[:space:]]*ms\) ]]; then
   echo "${BASH_REMATCH[1]}"
 else
@@ -79,27 +98,14 @@ EOS
   sed -i "s/__ASTERISK_USER__/${ASTERISK_USER_DEFAULT}/g" "$SCRIPT_PATH"
   chmod 755 "$SCRIPT_PATH"
 
-  # Registrar UserParameter si no existe
-  USERPARAM="UserParameter=asterisk.${PEER}, ${SCRIPT_PATH}"
-  if ! grep -Fq "UserParameter=asterisk.${PEER}," "$ZABBIX_CONF"; then
-    printf "\n%s\n" "$USERPARAM" >> "$ZABBIX_CONF"
-    echo "Añadido UserParameter para ${PEER}"
-  else
-    echo "UserParameter para ${PEER} ya existe, se omite."
-  fi
+  # UserParameter al include (se escribe entero al final)
+  printf "UserParameter=asterisk.%s, %s\n" "$PEER" "$SCRIPT_PATH" >> "$TMP_CONF"
 done < "$TMP_PEERS"
 
-# ======= Reiniciar Zabbix Agent =======
-if command -v systemctl >/dev/null 2>&1; then
-  if systemctl list-unit-files | grep -q '^zabbix-agent2\.service'; then
-    systemctl restart zabbix-agent2 || true
-  elif systemctl list-unit-files | grep -q '^zabbix-agent\.service'; then
-    systemctl restart zabbix-agent || true
-  else
-    service zabbix-agent restart || service zabbix-agent2 restart || true
-  fi
-else
-  service zabbix-agent restart || service zabbix-agent2 restart || true
-fi
+# ======= Include atómico + recarga del agente =======
+agent_conf_ensure_include
+agent_conf_write "$AGENT_CONF_NAME" "$TMP_CONF"
+agent_conf_adopt "$TMP_CONF"
+agent_reload
 
 echo "Proceso completado."
@@ -1,5 +1,5 @@
 #!/usr/bin/env python3
-import os, re, sys, subprocess, requests
+import argparse, os, re, sys, subprocess
 
 # Carga .env desde la raíz del proyecto (sin dependencias externas)
 import pathlib as _pl, os as _os
@@ -14,6 +14,15 @@ if _ef:
                 _os.environ[_k] = _v
 del _pl, _os, _ef
 
+# Modulos compartidos (zbx_common/) buscando hacia arriba, igual que el .env
+import pathlib as _pl, sys as _sys
+_lib = next((p / "zbx_common" for p in _pl.Path(__file__).resolve().parents if (p / "zbx_common").is_dir()), None)
+if _lib and str(_lib) not in _sys.path:
+    _sys.path.insert(0, str(_lib))
+del _pl, _sys, _lib
+from zbx_api import ZabbixAPI
+import ast_cli, fleet
+
 # ========= CONFIG =========
 ZBX_URL   = os.environ.get("ZBX_URL",   "http://<IP>/zabbix/api_jsonrpc.php")
 ZBX_USER  = os.environ.get("ZBX_USER",  "admin")
@@ -35,27 +44,24 @@ ITEM_VALUE_TYPE = 3   # Numeric (unsigned)
 ITEM_TYPE       = 0   # Zabbix agent
 ITEM_UNITS      = "ms"
 
-session = requests.Session()
+# Cliente compartido (zbx_common/zbx_api.py): una conexion keep-alive, sesion
+# reutilizada entre corridas (o ZBX_API_TOKEN) y reintentos con backoff
+zapi = ZabbixAPI(ZBX_URL, user=ZBX_USER, password=ZBX_PASS,
+                 token=os.environ.get("ZBX_API_TOKEN", ""), verify=VERIFY_TLS)
 
 def api(method, params, auth=None):
-    payload = {"jsonrpc":"2.0","method":method,"params":params,"id":1}
-    if auth: payload["auth"] = auth
-    r = session.post(ZBX_URL, json=payload, verify=VERIFY_TLS, timeout=30)
-    r.raise_for_status()
-    data = r.json()
-    if "error" in data:
-        raise RuntimeError(f"API error: {data['error']}")
-    return data["result"]
+    # <auth> queda por compatibilidad con los llamadores: la sesion vive en zapi
+    return zapi.call(method, params)
 
 def login():
-    return api("user.login", {"user": ZBX_USER, "password": ZBX_PASS})
+    return zapi.login()
 
-def get_hostid(auth):
-    res = api("host.get", {"filter":{"host":[HOST_NAME]}, "output":["hostid","host","name"]}, auth)
+def get_hostid(auth, host_name=HOST_NAME):
+    res = api("host.get", {"filter":{"host":[host_name]}, "output":["hostid","host","name"]}, auth)
     if not res:
-        res = api("host.get", {"filter":{"name":[HOST_NAME]}, "output":["hostid","host","name"]}, auth)
+        res = api("host.get", {"filter":{"name":[host_name]}, "output":["hostid","host","name"]}, auth)
     if not res:
-        raise RuntimeError(f"No se encontró el host '{HOST_NAME}' en Zabbix")
+        raise RuntimeError(f"No se encontró el host '{host_name}' en Zabbix")
     return res[0]["hostid"]
 
 def get_agent_interfaceid(auth, hostid):
@@ -68,36 +74,10 @@ def get_agent_interfaceid(auth, hostid):
     raise RuntimeError("El host no tiene interfaces. Agrega una interfaz de agente en Zabbix.")
 
 def get_peers_from_asterisk():
-    # Ejecuta en LOCAL (servidor Asterisk)
-    cmd = [ASTERISK_BIN, "-rx", "sip show peers"]
-    out = subprocess.check_output(cmd, stderr=subprocess.STDOUT)
-    if not isinstance(out, str):
-        out = out.decode("utf-8", errors="ignore")
-
-    peers = set()
-    for line in out.splitlines():
-        line = line.strip()
-        if not line:
-            continue
-        # Filtrar cabeceras y resúmenes
-        if line.lower().startswith("name/username"):
-            continue
-        if "Monitored:" in line or "objects found" in line or "sip peers" in line.lower() or "sip devices" in line.lower():
-            continue
-
-        parts = line.split()
-        first = parts[0] if parts else ""
-        # Asegurar formato "name/username" en la primera columna
-        if "/" not in first:
-            continue
-        if first.lower() == "name/username":
-            continue
-
-        peer = first.split("/", 1)[0].strip()
-        if peer:
-            peers.add(peer)
-
-    return sorted(peers)
+    # Ejecuta en LOCAL (servidor Asterisk); zbx_common/ast_cli.py parsea
+    # "sip show peers" a medida que el CLI escribe
+    lines = ast_cli.asterisk_lines("sip show peers", ASTERISK_BIN)
+    return sorted({p.name for p in ast_cli.sip_peers(lines)})
 
 def item_exists(auth, hostid, key_):
     res = api("item.get", {"hostids": hostid, "filter":{"key_": key_}, "output":["itemid"]}, auth)
@@ -121,29 +101,97 @@ def create_item(auth, hostid, interfaceid, peer_name, key_):
     }
     return api("item.create", params, auth)
 
+def provision(auth, host_name, peers):
+    """
+    Crea los items asterisk.<peer> que falten en <host_name>. Un peer que
+    falla se reporta y el resto sigue. Lo usan main() y el modo flota.
+    Devuelve contadores.
+    """
+    hostid = get_hostid(auth, host_name)
+    ifaceid = get_agent_interfaceid(auth, hostid)
+
+    created = skipped = failed = 0
+    for p in peers:
+        key_ = f"asterisk.{p}"
+        if item_exists(auth, hostid, key_):
+            skipped += 1
+            print(f"[SKIP] ya existe: {key_}")
+            continue
+        try:
+            res = create_item(auth, hostid, ifaceid, p, key_)
+        except RuntimeError as e:  # ZabbixAPIError (API, HTTP o red)
+            failed += 1
+            print(f"[ERR] crear: {key_} -> {e}")
+            continue
+        print(f"[OK] creado: {key_} -> itemid={res['itemids'][0]}")
+        created += 1
+
+    print(f"\nResumen: creados={created}, existentes={skipped}, fallidos={failed}")
+    return {"endpoints": len(peers), "created": created, "existing": skipped, "failed": failed}
+
+def run_fleet(args):
+    """--inventory: provision() (+ triggers) para cada host del inventario, en paralelo."""
+    global zapi
+    hosts = fleet.load_inventory(args.inventory, tech="sip")
+    if not hosts:
+        print("El inventario no tiene hosts SIP.")
+        return 1
+    # Un cliente para toda la flota, con una conexion por hilo
+    zapi = ZabbixAPI(ZBX_URL, user=ZBX_USER, password=ZBX_PASS,
+                     token=os.environ.get("ZBX_API_TOKEN", ""), verify=VERIFY_TLS,
+                     pool_size=args.workers + 1)
+    triggers = None
+    if args.with_triggers:
+        import bulk_sipdevice_trigger_serverzabbix as triggers
+        triggers.zapi = zapi
+    columns = ["endpoints", "created", "existing", "failed"]
+    if triggers:
+        columns += ["t_created", "t_updated", "t_failed"]
+
+    print(f"Flota SIP: {len(hosts)} hosts, {args.workers} hilos"
+          + (" (items + triggers)" if triggers else ""))
+    auth = login()
+
+    def task(entry):
+        if not entry["endpoints"]:
+            raise RuntimeError(f"sin peers en el inventario ({entry['source']})")
+        counts = provision(auth, entry["host"], entry["endpoints"])
+        if triggers:
+            counts.update({f"t_{k}": v for k, v in triggers.reconcile(auth, entry["host"]).items()})
+        return counts
+
+    results = fleet.run_fleet(hosts, task, args.workers)
+    fleet.print_summary(results, columns)
+    print(f"API: {zapi.summary()}")
+    return fleet.exit_code(results)
+
 def main():
+    parser = argparse.ArgumentParser(description="Items asterisk.<peer> (sip show peers) en Zabbix")
+    parser.add_argument("--export", metavar="ARCHIVO",
+                        help="Solo descubrir peers y escribirlos como inventario JSON ('-' = stdout)")
+    parser.add_argument("--inventory", nargs="+", metavar="RUTA",
+                        help="Modo flota: archivos JSON o directorios exportados con --export")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("FLEET_WORKERS", "8")),
+                        help="Hosts en paralelo en modo flota")
+    parser.add_argument("--with-triggers", action="store_true",
+                        help="Modo flota: reconciliar tambien los triggers de cada host")
+    args = parser.parse_args()
+
     try:
-        auth = login()
-        hostid = get_hostid(auth)
-        ifaceid = get_agent_interfaceid(auth, hostid)
+        if args.inventory:
+            sys.exit(run_fleet(args))
 
         peers = get_peers_from_asterisk()
         if not peers:
             print("No se detectaron peers desde 'sip show peers'.")
             sys.exit(1)
+        if args.export:
+            fleet.export_entry(args.export, HOST_NAME, "sip", peers)
+            return
 
-        created = skipped = 0
-        for p in peers:
-            key_ = f"asterisk.{p}"
-            if item_exists(auth, hostid, key_):
-                skipped += 1
-                print(f"[SKIP] ya existe: {key_}")
-                continue
-            res = create_item(auth, hostid, ifaceid, p, key_)
-            print(f"[OK] creado: {key_} -> itemid={res['itemids'][0]}")
-            created += 1
-
-        print(f"\nResumen: creados={created}, existentes={skipped}")
+        auth = login()
+        if provision(auth, HOST_NAME, peers)["failed"]:
+            sys.exit(3)
 
     except subprocess.CalledProcessError as e:
         print(f"ERROR ejecutando asterisk: {e.output}")
@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""
+Salidas sinteticas del CLI de Asterisk para bench_parsers.py.
+
+Genera, con semilla fija (mismo texto en cada corrida), la salida de:
+
+    sip show peers               (una fila por peer)
+    sip show peer <peer>         (detalle; crece por la seccion Variables)
+    pjsip show endpoints         (bloque Endpoint/Aor/Contact/Transport por endpoint)
+    pjsip show endpoint <ep>     (detalle; crece por Contacts de su AOR)
+    core show channels concise   (una linea por canal)
+
+en el formato de varias versiones de Asterisk (VERSIONS): columnas de la
+cabecera de chan_sip, columna Hash en los Contact de PJSIP, estados NonQual /
+Unavail con RTT "nan", campo Bridged de "concise"... Todas las variantes que
+los parsers del repo ya tienen que aguantar, incluida la linea plantilla
+" Endpoint:  <Endpoint/CID...>" y los endpoints con CallerID ("1001/1001").
+
+Cada generador devuelve (texto, esperado): lo que un parser correcto tiene
+que sacar de ese texto (nombres, RTT, canales por peer), que bench_parsers.py
+compara con lo que devuelve cada parser.
+
+Uso a mano (vuelca una salida para mirarla o para usarla de fixture):
+    asterisk_fixtures.py "pjsip show endpoints" 18 1000 > /tmp/eps.txt
+"""
+import random, sys
+
+VERSIONS = ("13", "16", "18", "20")
+SIZES = (10, 1000, 10000, 50000)
+COMMANDS = ("sip show peers", "sip show peer", "pjsip show endpoints",
+            "pjsip show endpoint", "core show channels concise")
+
+SEED = 20240601
+
+def _rng(command, version, rows):
+    return random.Random(f"{SEED}:{command}:{version}:{rows}")
+
+def _peer_name(rng, i):
+    kind = rng.random()
+    if kind < 0.6:
+        return str(1000 + i)
+    if kind < 0.9:
+        return f"trunk_{rng.choice(('telmex', 'axtel', 'totalplay', 'izzi'))}_{i}"
+    return f"gw-{i}.sucursal"
+
+def _hash(rng):
+    # Hexadecimal con al menos una letra: un hash solo de digitos se leeria como RTT
+    return f"{rng.choice('abcdef')}{rng.getrandbits(36):09x}"
+
+def _ip(rng):
+    b = rng.getrandbits(24)
+    return f"10.{b >> 16}.{(b >> 8) & 255}.{(b & 255) or 1}"
+
+def _rtt(rng):
+    return f"{rng.uniform(0.5, 250):.3f}"
+
+# ================== chan_sip ==================
+def sip_show_peers(version, rows):
+    """Una fila por peer; la columna Status trae el RTT ("OK (25 ms)")."""
+    rng = _rng("sip show peers", version, rows)
+    comedia = version != "13"   # las variantes viejas no traen la columna Comedia
+    head = "Name/username             Host                                    Dyn Forcerport "
+    head += ("Comedia    ACL Port     Status      Description" if comedia
+             else "ACL Port     Status     ")
+    lines, names, rtt = [head], set(), {}
+    online = offline = 0
+    for i in range(rows):
+        name = _peer_name(rng, i)
+        roll = rng.random()
+        if roll < 0.7:
+            ms = rng.randrange(1, 400)
+            status, value = (f"OK ({ms} ms)" if ms < 300 else f"LAGGED ({ms} ms)"), ms
+            online += 1
+        elif roll < 0.85:
+            status, value = "UNREACHABLE", 0
+            offline += 1
+        elif roll < 0.95:
+            status, value = "UNKNOWN", 0
+            offline += 1
+        else:
+            status, value = "Unmonitored", 0
+        host = _ip(rng) if value else "(Unspecified)"
+        dyn = "D " if rng.random() < 0.5 else "  "
+        fcp = rng.choice(("No        ", "Yes       ", "Auto (No) "))
+        cols = f"{name + '/' + name.split('.')[0]:<25} {host:<39} {dyn} {fcp} "
+        cols += (f"No         {rng.choice(('A', ' '))}   " if comedia else f"{rng.choice(('A', ' '))}   ")
+        cols += f"{5060 if value else 0:<8} {status:<11} "
+        lines.append(cols + ("" if not comedia else "Sucursal" if rng.random() < 0.2 else ""))
+        names.add(name)
+        rtt[name] = value
+    lines.append(f"{rows} sip peers [Monitored: {online} online, {offline} offline "
+                 f"Unmonitored: {rows - online - offline} online, 0 offline]")
+    return "\n".join(lines) + "\n", {"names": names, "rtt": rtt}
+
+def sip_show_peer(version, rows):
+    """Detalle de UN peer; <rows> lineas en total (lo que sobra va a Variables)."""
+    rng = _rng("sip show peer", version, rows)
+    name = "Telmex_New"
+    ms = rng.randrange(1, 300)
+    body = [
+        "",
+        "",
+        "  * Name       : " + name,
+        "  Description  : ",
+        "  Secret       : <Set>",
+        "  MD5Secret    : <Not set>",
+        "  Remote Secret: <Not set>",
+        "  Context      : from-trunk",
+        "  Record On feature : automon",
+        "  Record Off feature : automon",
+        "  Subscr.Cont. : <Not set>",
+        "  Language     : es",
+        "  Tonezone     : <Not set>",
+        "  AMA flags    : Unknown",
+        "  Transfer mode: open",
+        "  CallingPres  : Presentation Allowed, Not Screened",
+        "  Callgroup    : ",
+        "  Pickupgroup  : ",
+        "  Named Callgr : ",
+        "  Nam. Pickupgr: ",
+        "  MOH Suggest  : ",
+        "  Mailbox      : ",
+        "  VM Extension : *97",
+        "  LastMsgsSent : 0/0",
+        "  Call limit   : 0",
+        "  Max forwards : 0",
+        "  Dynamic      : No",
+        "  Callerid     : \"\" <>",
+        "  MaxCallBR    : 384 kbps",
+        "  Expire       : -1",
+        "  Insecure     : port,invite",
+        "  Force rport  : No",
+        "  Symmetric RTP: No",
+        "  ACL          : No",
+        "  DirectMedACL : No",
+        "  T.38 support : No",
+        "  DTMF mode    : rfc2833",
+        "  Timer T1     : 500",
+        "  Timer B      : 32000",
+        "  ToHost       : 200.57.1.1",
+        "  Addr->IP     : 200.57.1.1:5060",
+        "  Defaddr->IP  : (null)",
+        "  Prim.Transp. : UDP",
+        "  Allowed.Trsp : UDP",
+        "  Def. Username: telmex",
+        "  SIP Options  : (none)",
+        "  Codecs       : (ulaw|alaw)",
+        "  Auto-Framing : No",
+        f"  Status       : OK ({ms} ms)",
+        "  Useragent    : ",
+        "  Reg. Contact : ",
+        "  Qualify Freq : 60000 ms",
+        "  Keepalive    : 0 ms",
+        "  Sess-Timers  : Accept",
+        "  Sess-Refresh : uas",
+        "  Sess-Expires : 1800 secs",
+        "  Min-Sess     : 90 secs",
+        "  RTP Engine   : asterisk",
+        "  Parkinglot   : ",
+        "  Use Reason   : No",
+        "  Encryption   : No",
+    ]
+    if version != "13":
+        body.insert(body.index("  Auto-Framing : No"), "  Codec Order  : (ulaw:20,alaw:20)")
+    body.append("  Variables    :")
+    while len(body) < rows:
+        body.append(f"                 VAR_{len(body)} = {_hash(rng)}")
+    return "\n".join(body) + "\n", {"peer": name, "rtt": str(ms)}
+
+# ================== PJSIP ==================
+PJSIP_HEADER = """
+ Endpoint:  <Endpoint/CID.....................................>  <State.....>  <Channels.>
+    I/OAuth:  <AuthId/UserName...........................................................>
+        Aor:  <Aor............................................>  <MaxContact>
+      Contact:  <Aor/ContactUri..........................> <Hash....> <Status> <RTT(ms)..>
+  Transport:  <TransportId........>  <Type>  <cos>  <tos>  <BindAddress..................>
+   Identify:  <Identify/Endpoint.........................................................>
+        Match:  <criteria.........................>
+    Channel:  <ChannelId......................................>  <State.....>  <Time.....>
+        Exten: <DialedExten...........>  CLCID: <ConnectedLineCID.......>
+=========================================================================================
+"""
+
+def _contact(rng, version, aor, status=None):
+    """Linea Contact y su RTT (None si no cuenta: Unavail/NonQual/Unknown)."""
+    status = status or rng.choice(("Avail", "Avail", "Avail", "Unavail", "NonQual", "Unknown"))
+    if version == "13" and status == "NonQual":
+        status = "Unknown"
+    rtt = _rtt(rng) if status == "Avail" else None
+    uri = f"{aor}/sip:{aor}@{_ip(rng)}:5060;ob"
+    hash_col = f"{_hash(rng)} " if version != "13" else ""
+    return f"      Contact:  {uri:<42} {hash_col}{status:<8} {rtt or 'nan':>10}", rtt
+
+def _min_rtt(values):
+    values = [v for v in values if v is not None]
+    return min(values, key=float) if values else "0"
+
+def pjsip_show_endpoints(version, rows):
+    """Un bloque por endpoint (<rows> endpoints) con 0-3 Contacts."""
+    rng = _rng("pjsip show endpoints", version, rows)
+    lines, names, rtt = [PJSIP_HEADER.rstrip("\n"), ""], set(), {}
+    for i in range(rows):
+        name = _peer_name(rng, i)
+        cid = f"/{name}" if name.isdigit() and rng.random() < 0.5 else ""
+        ncontacts = rng.choice((0, 1, 1, 1, 2, 3))
+        values = []
+        contact_lines = []
+        for _ in range(ncontacts):
+            line, value = _contact(rng, version, name)
+            contact_lines.append(line)
+            values.append(value)
+        state = "Not in use" if any(v is not None for v in values) else "Unavailable"
+        lines.append(f" Endpoint:  {name + cid:<52} {state:<13} 0 of inf")
+        if name.isdigit():
+            lines.append(f"     InAuth:  {name}-auth/{name}")
+        lines.append(f"        Aor:  {name:<52} {max(ncontacts, 1)}")
+        lines.extend(contact_lines)
+        lines.append("   Transport:  transport-udp             udp      0      0  0.0.0.0:5060")
+        if not name.isdigit():
+            lines.append(f"   Identify:  {name}-identify/{name}")
+            lines.append(f"        Match: {_ip(rng)}/32")
+        lines.append("")
+        names.add(name)
+        rtt[name] = _min_rtt(values)
+    lines.append(f"Objects found: {rows}")
+    return "\n".join(lines) + "\n", {"names": names, "rtt": rtt}
+
+def pjsip_show_endpoint(version, rows):
+    """Detalle de UN endpoint; <rows> lineas en total (crece por Contacts del AOR)."""
+    rng = _rng("pjsip show endpoint", version, rows)
+    name = "1001"
+    lines = [PJSIP_HEADER.rstrip("\n"), "",
+             f" Endpoint:  {name}/{name:<47} Not in use    0 of inf",
+             f"     InAuth:  {name}-auth/{name}",
+             f"        Aor:  {name:<52} {max(rows // 2, 1)}"]
+    values = []
+    params = [" ParameterName                      : ParameterValue",
+              " =========================================================="]
+    for p in ("100rel", "accountcode", "acl", "aggregate_mwi", "allow", "allow_overlap",
+              "aors", "auth", "callerid", "context", "direct_media", "disallow",
+              "dtmf_mode", "force_rport", "ice_support", "identify_by", "language",
+              "media_encryption", "moh_suggest", "outbound_auth", "rewrite_contact",
+              "rtp_symmetric", "send_pai", "timers", "transport", "trust_id_inbound"):
+        params.append(f" {p:<35}: {_hash(rng) if p == 'accountcode' else 'yes'}")
+    # La mitad de lo que sobra son Contacts y la otra mitad parametros
+    room = max(rows - len(lines) - 2, 1)
+    for _ in range(max(room // 2, 1)):
+        line, value = _contact(rng, version, name)
+        lines.append(line)
+        values.append(value)
+    lines.append("   Transport:  transport-udp             udp      0      0  0.0.0.0:5060")
+    lines.append("")
+    while len(lines) + len(params) < rows:
+        params.append(f" set_var                            : VAR_{len(params)}={_hash(rng)}")
+    lines.extend(params)
+    return "\n".join(lines) + "\n", {"peer": name, "rtt": _min_rtt(values)}
+
+# ================== canales ==================
+def core_show_channels_concise(version, rows):
+    """<rows> canales SIP/ y PJSIP/ repartidos entre ~rows/4 peers."""
+    rng = _rng("core show channels concise", version, rows)
+    peers = [_peer_name(rng, i) for i in range(max(rows // 4, 1))]
+    lines, counts = [], {}
+    for i in range(rows):
+        tech = rng.choice(("SIP", "PJSIP", "PJSIP"))
+        peer = rng.choice(peers)
+        owner = f"{tech}/{peer}"
+        ident = f"{rng.randrange(16 ** 8):08x}"
+        bridged = "(None)" if version == "13" else _hash(rng)
+        uniqueid = f"17000{i:05d}.{i}"
+        lines.append(f"{owner}-{ident}!from-internal!{rng.randrange(1000, 9999)}!1!Up!Dial!"
+                     f"{tech}/{rng.choice(peers)},,tT!{peer}!!!3!{rng.randrange(1, 3600)}!"
+                     f"{bridged}!{uniqueid}")
+        counts[owner] = counts.get(owner, 0) + 1
+    # Un canal Local/ (sin "SIP/" ni "PJSIP/") para que los filtros por tecnologia trabajen
+    lines.append("Local/2000@from-internal-0000000a;1!from-internal!2000!1!Up!AppDial!"
+                 "(Outgoing Line)!2000!!!3!5!(None)!1700000000.99")
+    counts["Local/2000@from-internal"] = 1
+    return "\n".join(lines) + "\n", {"channels": counts}
+
+GENERATORS = {
+    "sip show peers": sip_show_peers,
+    "sip show peer": sip_show_peer,
+    "pjsip show endpoints": pjsip_show_endpoints,
+    "pjsip show endpoint": pjsip_show_endpoint,
+    "core show channels concise": core_show_channels_concise,
+}
+
+_cache = {}
+
+def fixture(command, version, rows):
+    """(texto, esperado) de <command> en <version> con <rows> filas (cacheado)."""
+    key = (command, version, rows)
+    if key not in _cache:
+        _cache[key] = GENERATORS[command](version, rows)
+    return _cache[key]
+
+def main():
+    if len(sys.argv) != 4 or sys.argv[1] not in GENERATORS:
+        print(__doc__.strip(), file=sys.stderr)
+        sys.exit(1)
+    text, _ = fixture(sys.argv[1], sys.argv[2], int(sys.argv[3]))
+    sys.stdout.write(text)
+
+if __name__ == "__main__":
+    main()
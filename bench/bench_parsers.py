@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+"""
+Benchmark de los parsers de salidas del CLI de Asterisk.
+
+Corre cada parser del repo sobre las salidas de asterisk_fixtures.py (4
+versiones x 10 / 1k / 10k / 50k filas) y sobre las capturas de fixtures/,
+y por cada caso mide:
+
+  - filas/s   mejor de --repeat corridas (o las que entren en --budget s)
+  - pico KB   Python: pico de tracemalloc de una corrida; shell: maxrss del
+              script y sus hijos (awk, sort...) en una corrida aparte
+  - resultado contra lo esperado del generador (nombres, RTT, canales) y su
+              huella (sha1), para que un parser mas rapido pero distinto no pase
+
+Parsers (PARSERS): los get_*() de los *_serverzabbix.py (se les pasa el texto
+en lugar de correr asterisk), los parse_*() de asterisk_lld.py y
+pjsip_rtt_collector.py, y los de shell tal como estan en el repo: el pipeline
+awk de cada bulk_*_scripts.sh, el script por peer que generan (heredoc EOS) y
+asterisk_channels_snapshot.sh. Los de shell se sacan del archivo en cada
+corrida: si alguien optimiza el awk, se mide el awk nuevo.
+
+Regresiones: --save-baseline guarda los resultados en baseline.json (hacerlo
+en la maquina de referencia ANTES de optimizar). Las corridas siguientes se
+comparan contra ese archivo y salen con 1 si un caso cambia de resultado, es
+mas lento que la baseline por mas de --tolerance o usa mas memoria por mas de
+--tolerance. Los tiempos de menos de 1 ms no se comparan (ruido).
+
+Capturas reales: fixtures/<version>/<comando con _>.txt, p.ej.
+    asterisk -rx "pjsip show endpoints" > fixtures/20/pjsip_show_endpoints.txt
+No hay "esperado" para ellas: se comparan solo por huella contra la baseline.
+
+Uso:
+    bench_parsers.py                              # todo
+    bench_parsers.py --sizes 10,1000 --only lld   # parsers cuyo nombre contiene "lld"
+    bench_parsers.py --save-baseline
+    bench_parsers.py --json resultados.json
+
+Codigos de salida: 0 OK, 1 resultado incorrecto o regresion, 2 error.
+"""
+import argparse, hashlib, importlib.util, io, json, os, pathlib, re, signal, subprocess, sys
+import tempfile, threading, time, tracemalloc
+
+import asterisk_fixtures
+
+BENCH_DIR = pathlib.Path(__file__).resolve().parent
+ROOT = BENCH_DIR.parent
+FIXTURES_DIR = BENCH_DIR / "fixtures"
+BASELINE = BENCH_DIR / "baseline.json"
+MIN_TIMED = 0.001   # por debajo de 1 ms el tiempo es ruido: no se compara
+
+# Los get_*() de countcalls suman EXTRA_PEERS del .env: el bench mide solo lo parseado
+os.environ["EXTRA_PEERS"] = ""
+
+# ================== PARSERS ==================
+# (nombre, comando, (tipo, argumentos), chequeo contra lo esperado)
+#   chequeos: names (conjunto de nombres), names_rtt ({nombre: rtt}), value (un
+#   valor), channels ({TECH/peer: canales}), channel_count (canales de un peer),
+#   None (sin esperado: solo huella contra la baseline)
+PARSERS = [
+    ("sip.get_peers_from_asterisk", "sip show peers",
+     ("cli", ("ast_sip/bulk_sipdevice_serverzabbix.py", "get_peers_from_asterisk")), "names"),
+    ("countcalls.get_peers_from_sip_show_peers", "sip show peers",
+     ("cli", ("ast_countcalls_latency/bulk_sipcountcalls_serverzabbix.py", "get_peers_from_sip_show_peers")), "names"),
+    ("lld.parse_sip_peers", "sip show peers",
+     ("text", ("ast_lld/asterisk_lld.py", "parse_sip_peers")), "names_rtt"),
+    ("sh.bulk_sipdevice_scripts", "sip show peers",
+     ("pipeline", "ast_sip/bulk_sipdevice_scripts.sh"), "names"),
+    ("sh.bulk_sipcountcalls_scripts", "sip show peers",
+     ("pipeline", "ast_countcalls_latency/bulk_sipcountcalls_scripts.sh"), "names"),
+    ("sh.sip_peer_script", "sip show peer",
+     ("template", "ast_sip/bulk_sipdevice_scripts.sh"), "value"),
+    ("pjsip.get_endpoints_from_asterisk", "pjsip show endpoints",
+     ("cli", ("ast_pjsip/bulk_pjsipdevice_serverzabbix.py", "get_endpoints_from_asterisk")), "names"),
+    ("collector.parse_endpoint_rtts", "pjsip show endpoints",
+     ("text", ("ast_pjsip/pjsip_rtt_collector.py", "parse_endpoint_rtts")), "names_rtt"),
+    ("lld.parse_pjsip_endpoints", "pjsip show endpoints",
+     ("text", ("ast_lld/asterisk_lld.py", "parse_pjsip_endpoints")), "names_rtt"),
+    ("sh.bulk_pjsipdevice_scripts", "pjsip show endpoints",
+     ("pipeline", "ast_pjsip/bulk_pjsipdevice_scripts.sh"), "names"),
+    # Saca "<ep>/<cid>" y la linea plantilla tal cual: sin esperado, solo huella
+    ("sh.bulk_pjsipcountcalls_scripts", "pjsip show endpoints",
+     ("pipeline", "ast_countcalls_latency/pjsip/bulk_pjsipcountcalls_scripts.sh"), None),
+    ("sh.pjsip_endpoint_script", "pjsip show endpoint",
+     ("template", "ast_pjsip/bulk_pjsipdevice_scripts.sh"), "value"),
+    ("lld.count_channels", "core show channels concise",
+     ("text", ("ast_lld/asterisk_lld.py", "count_channels")), "channels"),
+    ("sh.asterisk_channels_snapshot", "core show channels concise",
+     ("snapshot", "ast_countcalls_latency/asterisk_channels_snapshot.sh"), "channel_count"),
+]
+
+# ================== CARGA DE LOS PARSERS ==================
+_modules = {}
+
+def load_module(relpath):
+    """Importa un script del repo por ruta (los directorios no son paquetes)."""
+    if relpath not in _modules:
+        name = "bench_" + re.sub(r"\W", "_", relpath[:-3])
+        spec = importlib.util.spec_from_file_location(name, str(ROOT / relpath))
+        mod = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(mod)
+        _modules[relpath] = mod
+    return _modules[relpath]
+
+class FakeCLI(object):
+    """
+    Lo que los get_*() usan de subprocess (directo o via ast_cli.asterisk_lines):
+    check_output y el stdout de Popen devuelven el fixture.
+    """
+    STDOUT = subprocess.STDOUT
+    PIPE = subprocess.PIPE
+    DEVNULL = subprocess.DEVNULL
+    CalledProcessError = subprocess.CalledProcessError
+    TimeoutExpired = subprocess.TimeoutExpired
+
+    def __init__(self, data):
+        self.data = data
+
+    def check_output(self, *args, **kwargs):
+        return self.data
+
+    def Popen(self, *args, **kwargs):
+        return _FakeProc(self.data)
+
+class _FakeProc(object):
+    returncode = 0
+
+    def __init__(self, data):
+        self.stdout = io.BytesIO(data)
+
+    def poll(self):
+        return 0
+
+    def wait(self, timeout=None):
+        return 0
+
+    def kill(self):
+        pass
+
+def _replace(text, old, new, source):
+    if old not in text:
+        raise RuntimeError(f"{source}: no se encontro {old!r} (cambio el script?)")
+    return text.replace(old, new)
+
+def shell_pipeline(relpath, command):
+    """Pipeline awk/sort del generador para <command>, leyendo el fixture de $1."""
+    text = (ROOT / relpath).read_text(encoding="utf-8")
+    m = re.search(r'"\$ASTERISK_BIN" -rx "' + re.escape(command) + r'" 2>/dev/null(.*?)\s*>\s*"\$TMP_\w+"',
+                  text, re.S)
+    if not m:
+        raise RuntimeError(f"{relpath}: no se encontro el pipeline de '{command}'")
+    return 'cat "$1"' + m.group(1) + "\n"
+
+def shell_script(relpath, workdir, subject, template):
+    """
+    Script por peer (heredoc EOS del generador) o asterisk_channels_snapshot.sh
+    listo para correr: asterisk falso que hace cat de $BENCH_FIXTURE, sudo que
+    falla (cae al fallback directo, como en un agente sin sudo) y cache en <workdir>.
+    """
+    text = (ROOT / relpath).read_text(encoding="utf-8")
+    if template:
+        m = re.search(r"cat > \"\$SCRIPT_PATH\" <<'EOS'\n(.*?)\nEOS\n", text, re.S)
+        if not m:
+            raise RuntimeError(f"{relpath}: no se encontro el heredoc EOS")
+        text = m.group(1) + "\n"
+        text = text.replace("__PEER__", subject).replace("__EP__", subject)
+    else:
+        text = _replace(text, 'TTL="__TTL__"', 'TTL="0"', relpath)   # refresca en cada consulta
+        text = _replace(text, 'CACHE_DIR="/dev/shm"', f'CACHE_DIR="{workdir}"', relpath)
+    fake = os.path.join(workdir, "asterisk")
+    if not os.path.exists(fake):
+        with open(fake, "w") as f:
+            f.write('#!/bin/sh\nexec cat "$BENCH_FIXTURE"\n')
+        os.chmod(fake, 0o755)
+    text = _replace(text, 'ASTERISK_BIN="/usr/sbin/asterisk"', f'ASTERISK_BIN="{fake}"', relpath)
+    text = _replace(text, 'SUDO_BIN="/usr/bin/sudo"', 'SUDO_BIN="/bin/false"', relpath)
+    text = text.replace("__ASTERISK_USER__", "nobody")
+    path = os.path.join(workdir, re.sub(r"\W", "_", relpath) + (".peer" if template else ""))
+    with open(path, "w") as f:
+        f.write(text)
+    os.chmod(path, 0o755)
+    return path
+
+# ================== MEDICION ==================
+def run_shell(argv, env, timeout):
+    """(stdout, segundos) de UNA corrida de un parser de shell."""
+    with tempfile.TemporaryFile() as out:
+        t0 = time.perf_counter()
+        proc = subprocess.Popen(argv, stdout=out, stderr=subprocess.DEVNULL, env=env)
+        try:
+            proc.wait(timeout)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+            raise RuntimeError(f"mas de {timeout:g}s")
+        elapsed = time.perf_counter() - t0
+        out.seek(0)
+        return out.read().decode("utf-8", errors="replace"), elapsed
+
+PR_SET_CHILD_SUBREAPER = 36
+_subreaper = None
+
+def shell_peak_kb(argv, env, timeout):
+    """
+    maxrss (KB) de un parser de shell y sus hijos (awk, sort...). Un hijo
+    directo de Python arrastra en ru_maxrss el tamaño de Python (se hereda en
+    el fork+exec), asi que lo lanza un bash intermedio y Python, como
+    subreaper, cosecha al nieto con wait4. None si no hay prctl (no Linux).
+    """
+    global _subreaper
+    if _subreaper is None:
+        try:
+            import ctypes
+            libc = ctypes.CDLL(None, use_errno=True)
+            _subreaper = libc.prctl(PR_SET_CHILD_SUBREAPER, 1, 0, 0, 0) == 0
+        except (OSError, AttributeError):
+            _subreaper = False
+    if not _subreaper:
+        return None
+    launcher = subprocess.run(["bash", "-c", '"$@" >/dev/null 2>&1 </dev/null & echo $!', "bench"] + argv,
+                              stdout=subprocess.PIPE, env=env, check=True)
+    pid = int(launcher.stdout)
+    timer = threading.Timer(timeout, os.kill, (pid, signal.SIGKILL))
+    timer.start()
+    try:
+        _, _, usage = os.wait4(pid, 0)
+    finally:
+        timer.cancel()
+    return usage.ru_maxrss
+
+def measure(call, repeat, budget):
+    """Mejor tiempo de hasta <repeat> corridas (al menos una; corta al pasar <budget> s)."""
+    best, spent, result = None, 0.0, None
+    for _ in range(repeat):
+        result, elapsed, peak = call()
+        best = elapsed if best is None else min(best, elapsed)
+        spent += elapsed
+        if spent >= budget:
+            break
+    return result, best, peak
+
+def python_call(fn):
+    def call():
+        t0 = time.perf_counter()
+        result = fn()
+        return result, time.perf_counter() - t0, None
+    return call
+
+def python_peak_kb(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1] // 1024
+    finally:
+        tracemalloc.stop()
+
+def make_runner(kind, args, command, text, fixture_path, subject, workdir, timeout):
+    """Devuelve call() -> (resultado, segundos, pico KB o None)."""
+    if kind in ("cli", "text"):
+        relpath, func = args
+        mod = load_module(relpath)
+        fn = getattr(mod, func)
+        if kind == "cli":
+            data = text.encode("utf-8")
+
+            # El script y zbx_common/ast_cli.py (si lo usa) leen del fixture
+            patched = [m for m in (mod, sys.modules.get("ast_cli")) if m is not None]
+
+            def target():
+                real = [m.subprocess for m in patched]
+                for m in patched:
+                    m.subprocess = FakeCLI(data)
+                try:
+                    return fn()
+                finally:
+                    for m, r in zip(patched, real):
+                        m.subprocess = r
+        else:
+            def target():
+                return fn(text)
+        peak = python_peak_kb(target)
+
+        def call():
+            result, elapsed, _ = python_call(target)()
+            return result, elapsed, peak
+        return call
+
+    env = dict(os.environ, BENCH_FIXTURE=fixture_path)
+    if kind == "pipeline":
+        argv = ["bash", "-c", shell_pipeline(args, command), "bench", fixture_path]
+        parse = lambda out: [l for l in out.splitlines() if l.strip()]
+    else:
+        argv = [shell_script(args, workdir, subject, kind == "template")]
+        if kind == "snapshot":
+            argv.append(subject)
+        parse = lambda out: out.strip()
+
+    peak = shell_peak_kb(argv, env, timeout)
+
+    def call():
+        out, elapsed = run_shell(argv, env, timeout)
+        return parse(out), elapsed, peak
+    return call
+
+# ================== RESULTADOS ==================
+def normalize(result):
+    """Forma canonica (texto) de lo que devuelve un parser, para la huella."""
+    if isinstance(result, dict):
+        return json.dumps(sorted((str(k), str(v)) for k, v in result.items()))
+    if isinstance(result, (list, set, tuple)):
+        return json.dumps(sorted(str(x) for x in result))
+    return json.dumps(str(result))
+
+def check(kind, result, expected, subject):
+    """None si el resultado es el esperado, o el motivo."""
+    if kind is None or expected is None:
+        return None
+    if kind == "names":
+        got = set(result)
+        if got != expected["names"]:
+            return (f"nombres: faltan {len(expected['names'] - got)}, "
+                    f"sobran {len(got - expected['names'])}")
+    elif kind == "names_rtt":
+        want = expected["rtt"]
+        bad = [k for k in set(want) | set(result) if result.get(k) != want.get(k)]
+        if bad:
+            k = sorted(bad)[0]
+            return f"{len(bad)} valores distintos (p.ej. {k}: {result.get(k)!r} != {want.get(k)!r})"
+    elif kind == "value":
+        if str(result) != str(expected["rtt"]):
+            return f"valor {result!r} != {expected['rtt']!r}"
+    elif kind == "channels":
+        want = expected["channels"]
+        bad = [k for k in set(want) | set(result) if result.get(k) != want.get(k)]
+        if bad:
+            return f"{len(bad)} peers con otro conteo de canales"
+    elif kind == "channel_count":
+        want = expected["channels"].get(subject, 0)
+        if str(result) != str(want):
+            return f"{subject}: {result!r} canales != {want}"
+    return None
+
+def subject_for(command, text, expected):
+    """Peer que consultan los scripts por peer / el snapshot."""
+    if expected and "peer" in expected:
+        return expected["peer"]
+    if expected and "channels" in expected:
+        # El peer con mas canales (desempate por nombre): caso mas caro
+        return sorted(expected["channels"].items(), key=lambda kv: (-kv[1], kv[0]))[0][0]
+    if command == "sip show peer":
+        m = re.search(r"\*\s*Name\s*:\s*(\S+)", text)
+    elif command == "pjsip show endpoint":
+        m = re.search(r"^\s*Endpoint:\s+([^<\s/]\S*?)(?:/\S*)?\s", text, re.M)
+    else:
+        m = re.search(r"^((?:SIP|PJSIP)/\S+?)-[^-!]*!", text, re.M)
+    return m.group(1) if m else "bench"
+
+def cases(args):
+    """(fuente, version, filas, comando, texto, esperado) de generados y capturas."""
+    commands = {p[1] for p in PARSERS if _selected(p, args)}
+    for command in asterisk_fixtures.COMMANDS:
+        if command not in commands:
+            continue
+        for version in args.versions:
+            for rows in args.sizes:
+                text, expected = asterisk_fixtures.fixture(command, version, rows)
+                yield "synthetic", version, rows, command, text, expected
+    if FIXTURES_DIR.is_dir() and not args.synthetic_only:
+        for path in sorted(FIXTURES_DIR.glob("*/*.txt")):
+            command = path.stem.replace("_", " ")
+            if command in commands:
+                text = path.read_text(encoding="utf-8", errors="replace")
+                yield (f"fixtures/{path.parent.name}/{path.name}", path.parent.name,
+                       text.count("\n"), command, text, None)
+
+def _selected(parser, args):
+    return not args.only or any(o in parser[0] for o in args.only)
+
+def compare(res, base, tolerance):
+    """Motivos de regresion de <res> contra su entrada de baseline."""
+    problems = []
+    if res["digest"] != base["digest"]:
+        problems.append("resultado distinto a la baseline")
+    if base["seconds"] >= MIN_TIMED and res["seconds"] > base["seconds"] * (1 + tolerance):
+        problems.append(f"{res['seconds'] / base['seconds']:.2f}x mas lento")
+    if base.get("peak_kb") and res.get("peak_kb") is not None \
+            and res["peak_kb"] > base["peak_kb"] * (1 + tolerance) and res["peak_kb"] - base["peak_kb"] > 64:
+        problems.append(f"memoria {base['peak_kb']} -> {res['peak_kb']} KB")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de parsers de salidas del CLI de Asterisk")
+    parser.add_argument("--sizes", default=",".join(map(str, asterisk_fixtures.SIZES)),
+                        help="Filas por fixture sintetico (coma)")
+    parser.add_argument("--versions", default=",".join(asterisk_fixtures.VERSIONS),
+                        help="Versiones de Asterisk a simular (coma)")
+    parser.add_argument("--only", action="append", default=[], help="Solo parsers cuyo nombre contiene esto")
+    parser.add_argument("--synthetic-only", action="store_true", help="Sin las capturas de fixtures/")
+    parser.add_argument("--repeat", type=int, default=5, help="Corridas por caso (se toma la mejor)")
+    parser.add_argument("--budget", type=float, default=2.0, help="Segundos maximos de corridas por caso")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Corte por corrida de los parsers de shell")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Empeoramiento admitido contra la baseline")
+    parser.add_argument("--baseline", default=str(BASELINE), help="Archivo de baseline")
+    parser.add_argument("--save-baseline", action="store_true", help="Guardar estos resultados como baseline")
+    parser.add_argument("--json", help="Volcar los resultados a este archivo")
+    args = parser.parse_args()
+    args.sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+    args.versions = [v.strip() for v in args.versions.split(",") if v.strip()]
+
+    baseline = {}
+    if os.path.isfile(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    results, failures, errors = {}, 0, 0
+    print(f"{'parser':<42} {'fuente':<44} {'filas':>6} {'ms':>10} {'filas/s':>12} {'pico KB':>8}  estado")
+    with tempfile.TemporaryDirectory(prefix="bench_parsers.") as workdir:
+        for source, version, rows, command, text, expected in cases(args):
+            fixture_path = os.path.join(workdir, re.sub(r"\W", "_", f"{source}_{version}_{rows}_{command}"))
+            with open(fixture_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            subject = subject_for(command, text, expected)
+            label = f"v{version}" if source == "synthetic" else source
+            for name, cmd, (kind, kargs), expect in PARSERS:
+                if cmd != command or not _selected((name,), args):
+                    continue
+                key = f"{name}|{source}|{version}|{rows}"
+                try:
+                    call = make_runner(kind, kargs, command, text, fixture_path, subject, workdir, args.timeout)
+                    result, seconds, peak = measure(call, args.repeat, args.budget)
+                except Exception as e:
+                    errors += 1
+                    print(f"{name:<42} {label:<44} {rows:>6} {'-':>10} {'-':>12} {'-':>8}  ERROR {type(e).__name__}: {e}")
+                    continue
+                res = {"seconds": seconds, "rows_per_s": rows / seconds if seconds else 0.0,
+                       "peak_kb": peak, "digest": hashlib.sha1(normalize(result).encode()).hexdigest()}
+                problems = []
+                wrong = check(expect, result, expected, subject)
+                if wrong:
+                    problems.append(wrong)
+                if key in baseline:
+                    problems.extend(compare(res, baseline[key], args.tolerance))
+                status = "FAIL " + "; ".join(problems) if problems else ("ok" if baseline.get(key) or not baseline else "nuevo")
+                failures += bool(problems)
+                results[key] = res
+                print(f"{name:<42} {label:<44} {rows:>6} {seconds * 1000:>10.2f} {res['rows_per_s']:>12,.0f} "
+                      f"{'-' if peak is None else peak:>8}  {status}")
+                sys.stdout.flush()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+    if args.save_baseline:
+        tmp = args.baseline + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+        os.replace(tmp, args.baseline)
+        print(f"\nBaseline guardada en {args.baseline} ({len(results)} casos)")
+    print(f"\nCasos: {len(results)} | con problemas: {failures} | con error: {errors}")
+    return 2 if errors else 1 if failures else 0
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        sys.exit(2)
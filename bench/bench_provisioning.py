@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+Prueba de carga de los provisionadores contra la API Zabbix falsa
+(zbx_common/fake_zabbix_api.py), sin Zabbix ni Asterisk reales.
+
+Por cada tamaño de --items levanta la API falsa en proceso con un host que
+ya tiene esa cantidad de items de relleno (lo que pesa en un Zabbix de
+produccion: los item.get/search recorren el host) y corre, en orden, cada
+provisionador del repo como subproceso, dos veces:
+
+  frio   host sin los items del script: crea todo
+  tibio  segunda corrida idempotente: no deberia crear nada y es lo que
+         cuesta el cron nocturno de todos los dias
+
+Entradas: ASTERISK_BIN apunta a un asterisk falso que imprime los fixtures
+de asterisk_fixtures.py (--peers filas, --version), el include del agente
+para countcalls PJSIP se genera en un directorio temporal y WOLKVOX_URL
+apunta a wvx_latency_nr/fake_wolkvox_api.py con --agents agentes.
+
+Por corrida reporta: segundos de pared, codigo de salida, POSTs HTTP,
+llamadas a la API por metodo, errores de la API (incluidos los inyectados)
+y CPU del servidor falso. Con --latency / --row-latency-us se simula un
+frontend lento: ahi se ve que script escala con requests y cual con objetos.
+El limitador de zbx_ratelimit.py corre con --max-rps (alto por defecto, para
+medir el costo de la API y no el ritmo; --max-rps 10 = el de produccion).
+
+wvx.sync_agents importa bulk_grafana_agent_panels, que necesita requests.
+
+Uso:
+    bench_provisioning.py                                    # 10k y 100k items
+    bench_provisioning.py --items 1000 --peers 100 --only sip
+    bench_provisioning.py --latency '*=5' --row-latency-us 20 --json prov.json
+    bench_provisioning.py --error-rate 'item.create=0.05'    # reintentos / bisect
+
+Codigos de salida: 0 OK, 1 algun script salio con error, 2 error del benchmark.
+"""
+import argparse, json, os, pathlib, subprocess, sys, tempfile, time
+
+import asterisk_fixtures
+
+BENCH_DIR = pathlib.Path(__file__).resolve().parent
+ROOT = BENCH_DIR.parent
+sys.path.insert(0, str(ROOT / "zbx_common"))
+sys.path.insert(0, str(ROOT / "wvx_latency_nr"))
+import fake_wolkvox_api
+import fake_zabbix_api
+
+HOST = "bench-pbx"
+HOST_NAME = "Bench PBX"
+
+# ================== ESCENARIOS ==================
+# (nombre, script, argumentos, env extra). En orden: los de triggers despues
+# de los de items, porque la API (como Zabbix) rechaza triggers sobre items
+# que no existen
+SCENARIOS = [
+    ("sip.items",         "ast_sip/bulk_sipdevice_serverzabbix.py", [], {}),
+    ("sip.triggers",      "ast_sip/bulk_sipdevice_trigger_serverzabbix.py", [], {}),
+    ("pjsip.items",       "ast_pjsip/bulk_pjsipdevice_serverzabbix.py", [], {}),
+    ("pjsip.triggers",    "ast_pjsip/bulk_pjsipdevice_trigger_serverzabbix.py", [], {}),
+    ("countcalls.sip",    "ast_countcalls_latency/bulk_sipcountcalls_serverzabbix.py", [],
+     {"PEER_SOURCE": "sip_show_peers"}),
+    ("countcalls.pjsip",  "ast_countcalls_latency/pjsip/bulk_pjsipcountcalls_serverzabbix.py", [], {}),
+    ("lld",               "ast_lld/lld_serverzabbix.py", [], {}),
+    ("fail2ban",          "ast_fail2ban/asterisk.fail2ban.bulk.py", [], {}),
+    ("wvx.latency",       "wvx_latency_nr/create_latency_items.py", [], {}),
+    ("wvx.nr",            "wvx_latency_nr/create_nr_items.py", [], {}),
+    ("wvx.status",        "wvx_latency_nr/create_status_items.py", [], {}),
+    ("wvx.sync_agents",   "wvx_latency_nr/sync_agents.py", ["--skip-grafana"], {}),
+]
+PASSES = ("frio", "tibio")
+
+# ================== ENTRADAS ==================
+FAKE_ASTERISK = """#!/bin/sh
+# asterisk -rx "<comando>" -> fixture pregenerado (bench_provisioning.py)
+f="$(dirname "$0")/$(printf '%s' "$2" | tr ' ' '_').txt"
+[ -f "$f" ] && exec cat "$f"
+echo "No such command '$2'"
+exit 1
+"""
+
+def prepare_inputs(workdir, version, peers):
+    """Asterisk falso + include del agente; devuelve el env de los escenarios."""
+    astdir = os.path.join(workdir, "asterisk")
+    os.makedirs(astdir)
+    for command in ("sip show peers", "pjsip show endpoints", "core show channels concise"):
+        text, _ = asterisk_fixtures.fixture(command, version, peers)
+        with open(os.path.join(astdir, command.replace(" ", "_") + ".txt"), "w", encoding="utf-8") as f:
+            f.write(text)
+    fake = os.path.join(astdir, "asterisk")
+    with open(fake, "w") as f:
+        f.write(FAKE_ASTERISK)
+    os.chmod(fake, 0o755)
+
+    agentd = os.path.join(workdir, "zabbix_agentd.d")
+    os.makedirs(agentd)
+    _, endpoints = asterisk_fixtures.fixture("pjsip show endpoints", version, peers)
+    with open(os.path.join(agentd, "asterisk_calls_pjsip.conf"), "w", encoding="utf-8") as f:
+        for ep in sorted(endpoints):
+            f.write(f"UserParameter=asterisk.calls.pjsip.{ep},/etc/zabbix/scripts/countcalls_pjsip_{ep}.sh\n")
+    return {"ASTERISK_BIN": fake, "SUDO_BIN": "/bin/false",
+            "ZABBIX_AGENTD_DIR": agentd, "ZABBIX_CONF": os.path.join(workdir, "zabbix_agentd.conf")}
+
+# ================== CORRIDAS ==================
+def start_api(items, args):
+    store = fake_zabbix_api.ZabbixStore()
+    # Nombre visible distinto del tecnico, como en produccion: las expresiones
+    # de los triggers tienen que usar el tecnico
+    store.seed_items(store.add_host(HOST, name=HOST_NAME), items)
+    api = fake_zabbix_api.FakeZabbixAPI(
+        store, version=args.version_api, latency=fake_zabbix_api.parse_spec(args.latency),
+        row_latency_us=args.row_latency_us, error_rate=fake_zabbix_api.parse_spec(args.error_rate),
+        seed=items)
+    return fake_zabbix_api.FakeZabbixServer(("127.0.0.1", 0), api).start()
+
+def scenario_env(base, server, wolkvox_url, max_rps):
+    env = dict(os.environ, **base)
+    # Un .env en la raiz no debe mandar los scripts a un Zabbix real: todo explicito
+    env.update({
+        "ZBX_URL": server.url, "ZBX_USER": "Admin", "ZBX_PASS": "bench", "ZBX_API_TOKEN": "",
+        "ZBX_SESSION_CACHE": "off", "ZBX_VERIFY_TLS": "false", "ZBX_MAX_RPS": max_rps,
+        "ZBX_HOST": HOST, "ZBX_HOST_LLD": HOST, "ZBX_HOST_FAIL2BAN": HOST, "LATENCY_ZBX_HOST": HOST,
+        "WOLKVOX_URL": wolkvox_url, "WOLKVOX_OPERATION": "bench", "WOLKVOX_SERVER": "0000",
+        "WOLKVOX_TOKEN": "bench", "EXTRA_PEERS": "",
+    })
+    return env
+
+def run_scenario(relpath, argv, env, timeout):
+    """(rc, segundos, ultimas lineas de salida) de una corrida del script."""
+    t0 = time.perf_counter()
+    try:
+        proc = subprocess.run([sys.executable, str(ROOT / relpath)] + argv, env=env, cwd=str(ROOT),
+                              stdout=subprocess.PIPE, stderr=subprocess.STDOUT, timeout=timeout)
+        rc, out = proc.returncode, proc.stdout
+    except subprocess.TimeoutExpired as e:
+        rc, out = "timeout", e.output or b""
+    elapsed = time.perf_counter() - t0
+    tail = out.decode("utf-8", errors="replace").strip().splitlines()[-3:]
+    return rc, elapsed, tail
+
+def top_methods(methods, n=4):
+    ranked = sorted(methods.items(), key=lambda kv: -kv[1]["calls"])[:n]
+    return " ".join(f"{m}={c['calls']}" for m, c in ranked)
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga de los provisionadores contra una API Zabbix falsa")
+    parser.add_argument("--items", default="10000,100000", help="Items ya existentes en el host (coma)")
+    parser.add_argument("--peers", type=int, default=1000, help="Peers/endpoints del Asterisk falso")
+    parser.add_argument("--agents", type=int, default=1000, help="Agentes de la API Wolkvox falsa")
+    parser.add_argument("--version", default="18", choices=asterisk_fixtures.VERSIONS,
+                        help="Version de Asterisk de los fixtures")
+    parser.add_argument("--version-api", default=fake_zabbix_api.DEFAULT_VERSION, help="Version de Zabbix a simular")
+    parser.add_argument("--only", action="append", default=[], help="Solo escenarios cuyo nombre contiene esto")
+    parser.add_argument("--latency", default="", help="ms por llamada de la API falsa: 'item.create=20,*=2'")
+    parser.add_argument("--row-latency-us", type=float, default=0.0, help="us extra por objeto devuelto/escrito")
+    parser.add_argument("--error-rate", default="", help="Errores inyectados por metodo: 'item.create=0.01'")
+    parser.add_argument("--max-rps", default="1000", help="ZBX_MAX_RPS de los scripts (10 = produccion)")
+    parser.add_argument("--timeout", type=float, default=900.0, help="Corte por corrida de cada script")
+    parser.add_argument("--json", help="Volcar los resultados a este archivo")
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.items.split(",") if s.strip()]
+    scenarios = [s for s in SCENARIOS if not args.only or any(o in s[0] for o in args.only)]
+    if not scenarios:
+        print("Ningun escenario coincide con --only", file=sys.stderr)
+        return 2
+
+    results, failures = [], 0
+    print(f"{'escenario':<18} {'items':>7} {'pasada':<6} {'s':>8} {'rc':>7} {'POSTs':>6} {'llamadas':>8} "
+          f"{'errores':>7} {'CPU srv':>7} {'creados':>7}  metodos")
+    with tempfile.TemporaryDirectory(prefix="bench_provisioning.") as workdir:
+        base_env = prepare_inputs(workdir, args.version, args.peers)
+        wolkvox = fake_wolkvox_api.FakeWolkvoxServer(
+            ("127.0.0.1", 0), fake_wolkvox_api.WolkvoxReplay(args.agents, churn=0.0, seed=args.agents)).start()
+        wolkvox_url = wolkvox.url
+        for items in sizes:
+            server = start_api(items, args)
+            api, store = server.api, server.api.store
+            env = scenario_env(base_env, server, wolkvox_url, args.max_rps)
+            try:
+                for name, relpath, argv, extra in scenarios:
+                    for label in PASSES:
+                        before = store.count("item") + store.count("trigger") + store.count("discoveryrule")
+                        api.reset_stats()
+                        rc, seconds, tail = run_scenario(relpath, argv, dict(env, **extra), args.timeout)
+                        st = api.stats()
+                        created = store.count("item") + store.count("trigger") + store.count("discoveryrule") - before
+                        failures += rc != 0
+                        results.append(dict(scenario=name, items=items, run=label, rc=rc,
+                                            seconds=round(seconds, 3), created=created, **st))
+                        print(f"{name:<18} {items:>7} {label:<6} {seconds:>8.2f} {rc!s:>7} {st['posts']:>6} "
+                              f"{st['calls']:>8} {st['errors']:>7} {st['server_s']:>7.2f} {created:>7}  "
+                              f"{top_methods(st['methods'])}")
+                        if rc != 0:
+                            for line in tail:
+                                print(f"    | {line}")
+                        sys.stdout.flush()
+            finally:
+                server.shutdown()
+                server.server_close()
+        wolkvox.shutdown()
+        wolkvox.server_close()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+    print(f"\nCorridas: {len(results)} | con error: {failures}")
+    return 1 if failures else 0
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        sys.exit(2)
@@ -0,0 +1,214 @@
+#!/usr/bin/env python3
+"""
+Benchmark del pipeline por minuto de Wolkvox: API -> pollers -> trapper.
+
+Levanta en proceso la API falsa (wvx_latency_nr/fake_wolkvox_api.py, --agents
+agentes con --churn de cambios por ciclo, o --replay de capturas reales) y un
+trapper falso (zbx_common/fake_trapper.py), y corre el pipeline --cycles
+veces, un ciclo = un minuto de cron:
+
+  legacy    send_latency_data.sh + send_nr_data.sh + send_status_data.sh a la
+            vez, como los tres "* * * * *" del crontab del readme
+  unified   send_agent_data.sh (el que instala install_zabbix.sh)
+
+El ciclo 1 arranca sin estado (envia todo); los siguientes solo lo que
+cambio. Por ciclo reporta:
+
+  s         pared del ciclo (desde que arrancan hasta que termina el ultimo)
+  CPU s     user+sys de los scripts y sus hijos (jq, curl, zabbix_sender...)
+  forks     procesos creados durante el ciclo (/proc/stat, de TODA la maquina:
+            correr en una maquina quieta)
+  GETs / KB API      requests y bytes servidos por la API falsa
+  KB enviados        bytes que recibio el trapper (protocolo completo)
+  valores / aceptados  valores recibidos y aceptados por el trapper
+
+y al final si el peor ciclo entra en --window segundos (60: el cron del
+minuto siguiente no debe pisar al anterior).
+
+zabbix_sender: el binario si esta en el PATH; si no, zbx_common/zbx_sender.py,
+que es su reemplazo con la misma linea de salida ("processed: N; failed: N").
+
+Uso:
+    bench_wolkvox_pipeline.py                             # 5000 agentes, 5 ciclos, ambos pipelines
+    bench_wolkvox_pipeline.py --agents 20000 --churn 0.5 --pipeline unified
+    bench_wolkvox_pipeline.py --replay captura1.json captura2.json --cycles 2
+    bench_wolkvox_pipeline.py --reject 'nr\\[' --json wvx.json   # agentes sin item NR
+
+Codigos de salida: 0 entra en la ventana, 1 no entra o algun script fallo, 2 error.
+"""
+import argparse, json, os, pathlib, resource, shutil, subprocess, sys, tempfile, threading, time
+
+BENCH_DIR = pathlib.Path(__file__).resolve().parent
+ROOT = BENCH_DIR.parent
+WVX_DIR = ROOT / "wvx_latency_nr"
+sys.path.insert(0, str(ROOT / "zbx_common"))
+sys.path.insert(0, str(WVX_DIR))
+import fake_trapper
+import fake_wolkvox_api
+
+HOST = "bench-wvx"
+PIPELINES = {
+    "legacy":  ("send_latency_data.sh", "send_nr_data.sh", "send_status_data.sh"),
+    "unified": ("send_agent_data.sh",),
+}
+
+SENDER_SHIM = """#!/bin/sh
+# zabbix_sender -> zbx_common/zbx_sender.py (bench_wolkvox_pipeline.py)
+exec "{python}" "{sender}" "$@"
+"""
+
+def forks_total():
+    """Procesos creados desde el arranque (Linux), None si no hay /proc/stat."""
+    try:
+        with open("/proc/stat") as f:
+            for line in f:
+                if line.startswith("processes "):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+def children_cpu():
+    ru = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return ru.ru_utime + ru.ru_stime
+
+def sender_dir(workdir):
+    """Directorio a anteponer al PATH (None si hay zabbix_sender de verdad)."""
+    if shutil.which("zabbix_sender"):
+        return None
+    bindir = os.path.join(workdir, "bin")
+    os.makedirs(bindir)
+    shim = os.path.join(bindir, "zabbix_sender")
+    with open(shim, "w") as f:
+        f.write(SENDER_SHIM.format(python=sys.executable, sender=ROOT / "zbx_common" / "zbx_sender.py"))
+    os.chmod(shim, 0o755)
+    return bindir
+
+def run_cycle(scripts, env, logdir, cycle, timeout):
+    """Corre los scripts a la vez; devuelve (segundos, [rc por script])."""
+    procs, logs = [], []
+    t0 = time.perf_counter()
+    for script in scripts:
+        log = open(os.path.join(logdir, f"{cycle:03d}_{script}.log"), "wb")
+        logs.append(log)
+        procs.append(subprocess.Popen(["bash", str(WVX_DIR / script)], env=env, cwd=str(WVX_DIR),
+                                      stdout=log, stderr=subprocess.STDOUT))
+    deadline = t0 + timeout
+    rcs = []
+    for proc in procs:
+        try:
+            rcs.append(proc.wait(max(0.0, deadline - time.perf_counter())))
+        except subprocess.TimeoutExpired:
+            proc.kill()
+            proc.wait()
+            rcs.append("timeout")
+    elapsed = time.perf_counter() - t0
+    for log in logs:
+        log.close()
+    return elapsed, rcs
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))]
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark del pipeline por minuto de Wolkvox")
+    parser.add_argument("--agents", type=int, default=5000, help="Agentes sinteticos")
+    parser.add_argument("--churn", type=float, default=0.2, help="Fraccion de agentes que cambian por ciclo")
+    parser.add_argument("--replay", nargs="+", metavar="JSON", help="Respuestas grabadas en lugar de sinteticas")
+    parser.add_argument("--cycles", type=int, default=5, help="Ciclos (minutos de cron) por pipeline")
+    parser.add_argument("--pipeline", choices=("legacy", "unified", "both"), default="both")
+    parser.add_argument("--reject", help="Regex de keys que el trapper rechaza (items sin crear)")
+    parser.add_argument("--window", type=float, default=60.0, help="Segundos que puede durar un ciclo")
+    parser.add_argument("--timeout", type=float, default=300.0, help="Corte de un ciclo")
+    parser.add_argument("--seed", type=int, default=20240601, help="Semilla de los datos sinteticos")
+    parser.add_argument("--keep", action="store_true", help="No borrar el directorio de trabajo (logs por ciclo)")
+    parser.add_argument("--json", help="Volcar los resultados a este archivo")
+    args = parser.parse_args()
+    if not shutil.which("jq") or not shutil.which("curl"):
+        print("ERROR: los scripts bash necesitan jq y curl en el PATH", file=sys.stderr)
+        return 2
+    try:
+        replay = fake_wolkvox_api.load_replay(args.replay) if args.replay else None
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        return 2
+
+    pipelines = ("legacy", "unified") if args.pipeline == "both" else (args.pipeline,)
+    workdir = tempfile.mkdtemp(prefix="bench_wolkvox.")
+    trapper = fake_trapper.FakeTrapper(("127.0.0.1", 0), reject=args.reject, quiet=True)
+    threading.Thread(target=trapper.serve_forever, daemon=True).start()
+    bindir = sender_dir(workdir)
+    print(f"zabbix_sender: {'zbx_common/zbx_sender.py' if bindir else shutil.which('zabbix_sender')} | "
+          f"trabajo: {workdir}")
+
+    results, worst, failures = [], {}, 0
+    print(f"{'pipeline':<8} {'ciclo':>5} {'s':>7} {'CPU s':>7} {'forks':>7} {'GETs':>5} {'KB API':>8} "
+          f"{'KB env.':>8} {'valores':>8} {'acept.':>8}  rc")
+    try:
+        for name in pipelines:
+            # Misma secuencia de datos para los dos pipelines
+            source = fake_wolkvox_api.WolkvoxReplay(args.agents, args.churn, args.seed, replay)
+            api = fake_wolkvox_api.FakeWolkvoxServer(("127.0.0.1", 0), source).start()
+            base = os.path.join(workdir, name)
+            logdir = os.path.join(base, "logs")
+            os.makedirs(logdir)
+            env = dict(os.environ, ZBX_SERVER="127.0.0.1", ZBX_PORT=str(trapper.server_address[1]),
+                       LATENCY_ZBX_HOST=HOST, WOLKVOX_URL=api.url, WOLKVOX_OPERATION="bench",
+                       WOLKVOX_SERVER="0000", WOLKVOX_TOKEN="bench", LATENCY_BASE_DIR=base)
+            if bindir:
+                env["PATH"] = bindir + os.pathsep + env.get("PATH", "")
+            walls = []
+            for cycle in range(1, args.cycles + 1):
+                if cycle > 1:
+                    source.advance()
+                t0, a0, f0, c0 = trapper.stats(), source.stats(), forks_total(), children_cpu()
+                seconds, rcs = run_cycle(PIPELINES[name], env, logdir, cycle, args.timeout)
+                t1, a1, f1, c1 = trapper.stats(), source.stats(), forks_total(), children_cpu()
+                forks = f1 - f0 if f0 is not None and f1 is not None else None
+                row = {"pipeline": name, "cycle": cycle, "seconds": round(seconds, 3),
+                       "cpu_s": round(c1 - c0, 3), "forks": forks,
+                       "api_requests": a1["requests"] - a0["requests"],
+                       "api_bytes": a1["bytes_out"] - a0["bytes_out"],
+                       "bytes_sent": t1["bytes"] - t0["bytes"],
+                       "values": t1["values"] - t0["values"],
+                       "accepted": t1["accepted"] - t0["accepted"],
+                       "rc": dict(zip(PIPELINES[name], rcs))}
+                results.append(row)
+                walls.append(seconds)
+                failures += any(rc != 0 for rc in rcs)
+                print(f"{name:<8} {cycle:>5} {seconds:>7.2f} {row['cpu_s']:>7.2f} "
+                      f"{'-' if forks is None else forks:>7} {row['api_requests']:>5} "
+                      f"{row['api_bytes'] / 1024:>8.0f} {row['bytes_sent'] / 1024:>8.0f} "
+                      f"{row['values']:>8} {row['accepted']:>8}  {' '.join(map(str, rcs))}")
+                sys.stdout.flush()
+            worst[name] = (max(walls), percentile(walls, 0.5))
+            api.shutdown()
+            api.server_close()
+    finally:
+        trapper.shutdown()
+        trapper.server_close()
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+    print("")
+    fits = True
+    for name, (peak, p50) in worst.items():
+        ok = peak <= args.window
+        fits = fits and ok
+        who = f"{args.agents} agentes" if replay is None else f"{len(replay)} respuestas grabadas"
+        print(f"{name:<8} {who}: peor ciclo {peak:.2f}s, "
+              f"p50 {p50:.2f}s -> {'entra' if ok else 'NO entra'} en {args.window:g}s")
+    if failures:
+        print(f"Ciclos con algun script en error: {failures}"
+              + ("" if args.keep else " (--keep para ver los logs)"))
+    return 0 if fits and not failures else 1
+
+if __name__ == "__main__":
+    try:
+        sys.exit(main())
+    except KeyboardInterrupt:
+        sys.exit(2)
@@ -4,14 +4,18 @@
 #
 # Módulos (= directorios del proyecto):
 #   ast_fail2ban | ast_sip | ast_pjsip | ast_countcalls_latency
-#   wvx_latency_nr
+#   ast_lld | wvx_latency_nr
 #
 # Uso:
 #   bash install_zabbix.sh                          # instala todo
 #   bash install_zabbix.sh --skip-<modulo>          # omite ese módulo
 #
 # Nota: si ast_sip, ast_pjsip o ast_countcalls_latency están activos,
-#       sus scripts de agente se escriben en zabbix_agentd.conf automáticamente.
+#       sus scripts de agente se registran en zabbix_agentd.d/ automáticamente
+#       (con ASTERISK_PROBE=true sin script por peer: los contesta ast_lld/asterisk_lld.py).
+#       Con ASTERISK_LLD=true en el .env esos tres módulos se omiten y ast_lld
+#       instala en su lugar descubrimiento (LLD): 3 UserParameters fijos y
+#       reglas + prototipos en Zabbix, sin un script ni un ítem por peer.
 #
 # Ejemplo:
 #   # Solo wvx_latency_nr:
@@ -34,6 +38,7 @@ SKIP_AST_FAIL2BAN=0
 SKIP_AST_SIP=0
 SKIP_AST_PJSIP=0
 SKIP_AST_COUNTCALLS_LATENCY=0
+SKIP_AST_LLD=0
 SKIP_WVX_LATENCY_NR=0
 RUN_WIZARD=0
 
@@ -43,6 +48,7 @@ for arg in "$@"; do
         --skip-ast_sip)                SKIP_AST_SIP=1 ;;
         --skip-ast_pjsip)              SKIP_AST_PJSIP=1 ;;
         --skip-ast_countcalls_latency) SKIP_AST_COUNTCALLS_LATENCY=1 ;;
+        --skip-ast_lld)                SKIP_AST_LLD=1 ;;
         --skip-wvx_latency_nr)         SKIP_WVX_LATENCY_NR=1 ;;
         --wizard|--configure)          RUN_WIZARD=1 ;;
         *)
@@ -50,7 +56,7 @@ for arg in "$@"; do
             echo ""
             echo "Uso: bash install_zabbix.sh [--skip-<modulo>] [--wizard]"
             echo "  Módulos: ast_fail2ban  ast_sip  ast_pjsip"
-            echo "           ast_countcalls_latency  wvx_latency_nr"
+            echo "           ast_countcalls_latency  ast_lld  wvx_latency_nr"
             exit 1
             ;;
     esac
@@ -199,6 +205,8 @@ module_header "AST SIP  [host: ${ZBX_HOST_SIP:-${ZBX_HOST:-gatewayp}}]"
 
 if [[ $SKIP_AST_SIP -eq 1 ]]; then
     skip_step "ast_sip (--skip-ast_sip)"
+elif [[ "${ASTERISK_LLD:-false}" == "true" ]]; then
+    skip_step "ast_sip (ASTERISK_LLD=true, ver ast_lld)"
 else
     run "Scripts agente + UserParameters SIP" \
         bash "${SCRIPT_DIR}/ast_sip/bulk_sipdevice_scripts.sh"
@@ -217,15 +225,52 @@ module_header "AST PJSIP  [host: ${ZBX_HOST_PJSIP:-${ZBX_HOST:-gatewayd}}]"
 
 if [[ $SKIP_AST_PJSIP -eq 1 ]]; then
     skip_step "ast_pjsip (--skip-ast_pjsip)"
+elif [[ "${ASTERISK_LLD:-false}" == "true" ]]; then
+    skip_step "ast_pjsip (ASTERISK_LLD=true, ver ast_lld)"
 else
-    run "Scripts agente + UserParameters PJSIP" \
-        bash "${SCRIPT_DIR}/ast_pjsip/bulk_pjsipdevice_scripts.sh"
+    # PJSIP_COLLECTOR=true: un solo recolector por cron (pjsip_rtt_collector.py)
+    # en vez de un script + UserParameter por endpoint.
+    if [[ "${PJSIP_COLLECTOR:-false}" == "true" ]]; then
+        skip_step "Scripts agente PJSIP (PJSIP_COLLECTOR=true)"
+    else
+        run "Scripts agente + UserParameters PJSIP" \
+            bash "${SCRIPT_DIR}/ast_pjsip/bulk_pjsipdevice_scripts.sh"
+    fi
     run "Items PJSIP en Zabbix" \
         env ZBX_HOST="${ZBX_HOST_PJSIP:-${ZBX_HOST:-gatewayd}}" \
         python3 "${SCRIPT_DIR}/ast_pjsip/bulk_pjsipdevice_serverzabbix.py"
     run "Triggers PJSIP en Zabbix" \
         env ZBX_HOST="${ZBX_HOST_PJSIP:-${ZBX_HOST:-gatewayd}}" \
         python3 "${SCRIPT_DIR}/ast_pjsip/bulk_pjsipdevice_trigger_serverzabbix.py"
+
+    if [[ "${PJSIP_COLLECTOR:-false}" == "true" ]]; then
+        # ─── Cron /etc/crontab ──────────────────────────────────
+        # Un "pjsip show endpoints" por minuto para TODOS los endpoints,
+        # enviado en un solo lote de zabbix_sender.
+        _CRON_MARKER="AUTO:ast_pjsip_collector:${SCRIPT_DIR}"
+        _PJSIP_COLLECTOR="${SCRIPT_DIR}/ast_pjsip/pjsip_rtt_collector.py"
+        printf "  %-54s" "Cron recolector PJSIP en /etc/crontab"
+        if grep -q "${_CRON_MARKER}" /etc/crontab 2>/dev/null; then
+            echo -e "[${Y}SKIP${N}] ya configurado"
+            ((SKIP_COUNT++))
+        else
+            cat >> /etc/crontab <<CRONEOF
+
+#--- ${_CRON_MARKER}
+* * * * * root /usr/bin/python3 ${_PJSIP_COLLECTOR} >/dev/null 2>&1
+#--- END ${_CRON_MARKER}
+CRONEOF
+            if [[ $? -eq 0 ]]; then
+                echo -e "[${G}OK${N}]"
+                echo "      Cada minuto | ${_PJSIP_COLLECTOR}"
+                ((PASS++))
+            else
+                echo -e "[${R}FAIL${N}]"
+                ((FAIL_COUNT++))
+                FAIL_MSGS+=("Cron recolector PJSIP en /etc/crontab")
+            fi
+        fi
+    fi
 fi
 
 # ═══════════════════════════════════════════════════════════════
@@ -235,6 +280,8 @@ module_header "AST COUNTCALLS LATENCY  [host: ${ZBX_HOST_COUNTCALLS:-${ZBX_HOST:
 
 if [[ $SKIP_AST_COUNTCALLS_LATENCY -eq 1 ]]; then
     skip_step "ast_countcalls_latency (--skip-ast_countcalls_latency)"
+elif [[ "${ASTERISK_LLD:-false}" == "true" ]]; then
+    skip_step "ast_countcalls_latency (ASTERISK_LLD=true, ver ast_lld)"
 else
     run "Scripts conteo + UserParameters SIP" \
         bash "${SCRIPT_DIR}/ast_countcalls_latency/bulk_sipcountcalls_scripts.sh"
@@ -248,6 +295,23 @@ else
         python3 "${SCRIPT_DIR}/ast_countcalls_latency/pjsip/bulk_pjsipcountcalls_serverzabbix.py"
 fi
 
+# ═══════════════════════════════════════════════════════════════
+# MÓDULO 4b — AST LLD (descubrimiento en vez de un script/ítem por peer)
+# ═══════════════════════════════════════════════════════════════
+module_header "AST LLD  [host: ${ZBX_HOST_LLD:-${ZBX_HOST:-gatewayd}}]"
+
+if [[ $SKIP_AST_LLD -eq 1 ]]; then
+    skip_step "ast_lld (--skip-ast_lld)"
+elif [[ "${ASTERISK_LLD:-false}" != "true" ]]; then
+    skip_step "ast_lld (ASTERISK_LLD no activo)"
+else
+    run "UserParameters LLD en el agente" \
+        bash "${SCRIPT_DIR}/ast_lld/install_lld_agent.sh"
+    run "Reglas LLD + prototipos en Zabbix" \
+        env ZBX_HOST="${ZBX_HOST_LLD:-${ZBX_HOST:-gatewayd}}" \
+        python3 "${SCRIPT_DIR}/ast_lld/lld_serverzabbix.py"
+fi
+
 # ═══════════════════════════════════════════════════════════════
 # MÓDULO 5 — WVX LATENCY NR
 # ═══════════════════════════════════════════════════════════════
@@ -262,8 +326,8 @@ else
         python3 "${SCRIPT_DIR}/wvx_latency_nr/create_nr_items.py"
     run "Items estado/plataforma/conexion/version en Zabbix" \
         python3 "${SCRIPT_DIR}/wvx_latency_nr/create_status_items.py"
-    run "Primer envio de estado/plataforma/conexion/version" \
-        bash "${SCRIPT_DIR}/wvx_latency_nr/send_status_data.sh"
+    run "Primer envio de latencia/NR/estado/plataforma/conexion/version" \
+        bash "${SCRIPT_DIR}/wvx_latency_nr/send_agent_data.sh"
     # Si GRAFANA_DASHBOARD_UID esta vacio/CHANGE_ME (cliente nuevo), este paso
     # crea el tablero + carpeta en Grafana automaticamente (mismo formato que
     # "wvx - npls - Latencia Agentes") y guarda el UID nuevo en el .env.
@@ -272,8 +336,9 @@ else
 
     # ─── Cron /etc/crontab ──────────────────────────────────────
     # Ventana 07:00-21:00: horario operativo del contact center.
-    # send_latency c/10 min | send_nr c/11 min | send_status c/12 min —
-    #   desfases distintos para que los pollers no colisionen en la API.
+    # send_agent_data c/10 min — una sola consulta a la API de Wolkvox por
+    #   ciclo alimenta latencia + NR + estado en un unico lote de zabbix_sender
+    #   (antes eran 3 pollers c/10, c/11 y c/12 min consultando lo mismo).
     # sync_agents 01:00 AM — registra agentes nuevos (latencia/NR/estado)
     #   en Zabbix y regenera todos los paneles de Grafana automáticamente,
     #   incluyendo el umbral de "version desactualizada" (30 dias).
@@ -283,22 +348,37 @@ else
     _CRON_MARKER="AUTO:wvx_latency_nr:${SCRIPT_DIR}"
     _WVX_SCRIPTS="${SCRIPT_DIR}/wvx_latency_nr"
     printf "  %-54s" "Cron entries en /etc/crontab"
-    if grep -q "${_CRON_MARKER}" /etc/crontab 2>/dev/null; then
+    # Instalaciones anteriores: el bloque tiene los 3 pollers viejos (latencia
+    # c/10, NR c/11, estado c/12, cada uno consultando la API por su cuenta).
+    # Se borra el bloque entero (y cualquier linea suelta de esos pollers de
+    # esta instalacion) para escribir el nuevo, igual que la limpieza de fail2ban
+    # (rutas escapadas para usarlas como regex; el marcador se compara por linea
+    # exacta: /opt/cliente no debe matchear el bloque de /opt/cliente2)
+    _WVX_RE_DIR="$(printf '%s' "${SCRIPT_DIR}" | sed 's/[][\.*^$+?(){}|%]/\\&/g')"
+    _WVX_OLD_POLLERS="${_WVX_RE_DIR}/wvx_latency_nr/send_(latency|nr|status)_data\.sh"
+    _WVX_MIGRATED=0
+    if grep -qE "${_WVX_OLD_POLLERS}" /etc/crontab 2>/dev/null; then
+        sed -i -E "\%^#--- AUTO:wvx_latency_nr:${_WVX_RE_DIR}\$%,\%^#--- END AUTO:wvx_latency_nr:${_WVX_RE_DIR}\$%d" \
+            /etc/crontab 2>/dev/null || true
+        sed -i -E "\%${_WVX_OLD_POLLERS}%d" /etc/crontab 2>/dev/null || true
+        _WVX_MIGRATED=1
+    fi
+    if grep -qxF "#--- ${_CRON_MARKER}" /etc/crontab 2>/dev/null; then
         echo -e "[${Y}SKIP${N}] ya configurado"
         ((SKIP_COUNT++))
     else
         cat >> /etc/crontab <<CRONEOF
 
 #--- ${_CRON_MARKER}
-*/10 7-21 * * * root /bin/bash ${_WVX_SCRIPTS}/send_latency_data.sh >/dev/null 2>&1
-*/11 7-21 * * * root /bin/bash ${_WVX_SCRIPTS}/send_nr_data.sh >/dev/null 2>&1
-*/12 7-21 * * * root /bin/bash ${_WVX_SCRIPTS}/send_status_data.sh >/dev/null 2>&1
+*/10 7-21 * * * root /bin/bash ${_WVX_SCRIPTS}/send_agent_data.sh >/dev/null 2>&1
 0 1 * * * root /bin/bash ${_WVX_SCRIPTS}/sync_agents.sh >/dev/null 2>&1
 #--- END ${_CRON_MARKER}
 CRONEOF
         if [[ $? -eq 0 ]]; then
             echo -e "[${G}OK${N}]"
-            echo "      Ventana 07:00-21:00 | latencia c/10 min | NR c/11 min | estado c/12 min | sync 01:00 AM"
+            echo "      Ventana 07:00-21:00 | latencia+NR+estado c/10 min | sync 01:00 AM"
+            [[ $_WVX_MIGRATED -eq 1 ]] && \
+                echo "      Reemplazados send_latency/send_nr/send_status_data.sh por send_agent_data.sh"
             ((PASS++))
         else
             echo -e "[${R}FAIL${N}]"
@@ -33,6 +33,14 @@ if _ef:
                 _os.environ[_k] = _v
 del _pl, _os, _ef
 
+# Modulos compartidos (zbx_common/) buscando hacia arriba, igual que el .env
+import pathlib as _pl, sys as _sys
+_lib = next((p / "zbx_common" for p in _pl.Path(__file__).resolve().parents if (p / "zbx_common").is_dir()), None)
+if _lib and str(_lib) not in _sys.path:
+    _sys.path.insert(0, str(_lib))
+del _pl, _sys, _lib
+from zbx_api import ZabbixAPI, item_pages
+
 ZBX_URL   = os.environ.get("ZBX_URL",        "http://68.183.116.34/zabbix/api_jsonrpc.php")
 ZBX_USER  = os.environ.get("ZBX_USER",       "Admin")
 ZBX_PASS  = os.environ.get("ZBX_PASS",       "CHANGE_ME")
@@ -52,21 +60,15 @@ TILE_W = 3
 TILE_H = 3
 ROW_H  = 1
 
-session = requests.Session()
+# Zabbix via el cliente compartido (zbx_common/zbx_api.py); Grafana sigue con requests
+zapi = ZabbixAPI(ZBX_URL, user=ZBX_USER, password=ZBX_PASS,
+                 token=os.environ.get("ZBX_API_TOKEN", ""), verify=False)
 
 def zbx_api(method, params, auth=None):
-    payload = {"jsonrpc": "2.0", "method": method, "params": params, "id": 1}
-    if auth:
-        payload["auth"] = auth
-    r = session.post(ZBX_URL, json=payload, verify=False, timeout=30)
-    r.raise_for_status()
-    j = r.json()
-    if "error" in j:
-        raise RuntimeError(j["error"])
-    return j["result"]
+    return zapi.call(method, params)
 
 def zbx_login():
-    return zbx_api("user.login", {"user": ZBX_USER, "password": ZBX_PASS})
+    return zapi.login()
 
 def zbx_get_hostid(auth):
     res = zbx_api("host.get", {"filter": {"host": [HOST_NAME]}, "output": ["hostid"]}, auth)
@@ -74,19 +76,24 @@ def zbx_get_hostid(auth):
         raise SystemExit(f"Host no encontrado: {HOST_NAME}")
     return res[0]["hostid"]
 
+ITEM_PAGE_SIZE = int(os.environ.get("ZBX_PAGE_SIZE", "1000"))
+
+STATUS_FIELDS = ["status", "platform", "connection_type", "version"]
+
 def zbx_get_status_items(auth, hostid):
     """Devuelve {code: {display_name, status_itemid, platform_itemid, connection_type_itemid, version_itemid}}"""
-    items = zbx_api("item.get", {"hostids": hostid, "output": ["itemid", "key_", "name"]}, auth)
     agents = {}
-    for it in items:
-        key = it["key_"]
-        m = re.match(rf"^{re.escape(WOLKVOX_OPERATION)}\.agent\.(status|platform|connection_type|version)\[(\d+)\]$", key)
-        if not m:
-            continue
-        field, code = m.group(1), m.group(2)
-        agents.setdefault(code, {})[f"{field}_itemid"] = it["itemid"]
-        m2 = re.search(r"Agent\s+\d+\s*-\s*([^-]+?)\s*-", it["name"])
-        agents[code]["display_name"] = m2.group(1).strip() if m2 else code
+    pattern = re.compile(rf"^{re.escape(WOLKVOX_OPERATION)}\.agent\.({'|'.join(STATUS_FIELDS)})\[(\d+)\]$")
+    prefixes = [f"{WOLKVOX_OPERATION}.agent.{f}[" for f in STATUS_FIELDS]
+    for page in item_pages(zbx_api, hostid, prefixes, ["itemid", "key_", "name"], ITEM_PAGE_SIZE):
+        for it in page:
+            m = pattern.match(it["key_"])
+            if not m:
+                continue
+            field, code = m.group(1), m.group(2)
+            agents.setdefault(code, {})[f"{field}_itemid"] = it["itemid"]
+            m2 = re.search(r"Agent\s+\d+\s*-\s*([^-]+?)\s*-", it["name"])
+            agents[code]["display_name"] = m2.group(1).strip() if m2 else code
     return agents
 
 def grafana_request(method, path, **kwargs):
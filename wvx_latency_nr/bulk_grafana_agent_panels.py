@@ -1,5 +1,29 @@
 #!/usr/bin/env python3
 """
+v7 - Cambios respecto a v6:
+  - Sharding: con miles de agentes un solo tablero llega a miles de paneles y
+    Grafana tarda en renderizar/consultar. Si los paneles por agente superan
+    GRAFANA_MAX_PANELS (default 600), los agentes se reparten en varios
+    tableros ("shards") por rango de codigos o por equipo (GRAFANA_SHARD_BY /
+    GRAFANA_TEAMS): rangos fijos consecutivos (GRAFANA_SHARD_RANGE) juntados
+    hasta llenar el presupuesto de paneles. Los limites se guardan entre
+    corridas: un agente nuevo cae en el shard existente de su codigo y solo se
+    parte el shard que se pasa del presupuesto. El UID de cada shard sale de
+    su equipo + inicio, no de su posicion. El tablero de GRAFANA_DASHBOARD_UID
+    pasa a ser el indice: paneles globales + tabla con links a cada shard. Los
+    shards sobrantes se borran solos.
+
+v6 - Cambios respecto a v5:
+  - Si los paneles autogenerados no cambiaron (hash de contenido igual al del
+    tablero guardado) NO se guarda: el cron nocturno ya no crea una version
+    nueva del dashboard cada noche (--force guarda igual).
+  - Ids y posiciones estables por agente (id derivado del codigo, slot de la
+    grilla conservado entre corridas): agregar/quitar/renombrar un agente solo
+    cambia SUS paneles; los agentes nuevos ocupan los huecos libres y van al
+    final. --relayout reordena todo por codigo.
+  - El corte de "version desactualizada" se redondea a VERSION_CUTOFF_STEP_DAYS
+    (default 7) para que no cambie todos los dias.
+
 v5 - Cambios respecto a v4:
   - Si GRAFANA_DASHBOARD_UID esta vacio/CHANGE_ME (o el UID configurado ya no
     existe en Grafana), el script crea el tablero y su carpeta automaticamente
@@ -25,10 +49,14 @@ v3 - Cambios respecto a v2:
   - GLOBAL_MARKER para limpiar/regenerar paneles globales independientemente
 """
 import argparse
+import bisect
 import datetime
+import hashlib
+import itertools
 import json
 import os
 import re
+import sqlite3
 import sys
 import requests
 import urllib3
@@ -54,6 +82,15 @@ if _ef:
 ENV_FILE_PATH = _ef
 del _pl, _os, _ef
 
+# Modulos compartidos (zbx_common/) buscando hacia arriba, igual que el .env
+import pathlib as _pl, sys as _sys
+_lib = next((p / "zbx_common" for p in _pl.Path(__file__).resolve().parents if (p / "zbx_common").is_dir()), None)
+if _lib and str(_lib) not in _sys.path:
+    _sys.path.insert(0, str(_lib))
+del _pl, _sys, _lib
+from state_store import StateStore
+from zbx_api import ZabbixAPI, item_pages
+
 # ============================================================
 # CONFIGURACIÓN — valores desde .env o variables de entorno
 # ============================================================
@@ -81,6 +118,21 @@ GRAFANA_TOKEN  = os.environ.get("GRAFANA_TOKEN", "")
 GRAFANA_USER   = os.environ.get("GRAFANA_USER",  "admin")
 GRAFANA_PASS   = os.environ.get("GRAFANA_PASS",  "CHANGE_ME")
 
+# Sharding: auto = partir por rango de codigo solo si se supera el presupuesto,
+# range = partir siempre por rango, team = un tablero por equipo (GRAFANA_TEAMS,
+# p. ej. "Ventas:100-199,250;Soporte:200-249"), off = siempre un solo tablero.
+# GRAFANA_SHARD_RANGE = los limites entre shards caen en multiplos de esto (0 =
+# los codigos que entran en el presupuesto aun con todos sus cubos:
+# GRAFANA_MAX_PANELS // 6). Los limites de la ultima corrida se guardan en
+# agent_state.sqlite (LATENCY_BASE_DIR) para no mover agentes entre shards.
+GRAFANA_SHARD_BY    = os.environ.get("GRAFANA_SHARD_BY", "auto").strip().lower()
+GRAFANA_MAX_PANELS  = int(os.environ.get("GRAFANA_MAX_PANELS", "600"))
+GRAFANA_SHARD_RANGE = int(os.environ.get("GRAFANA_SHARD_RANGE", "0"))
+GRAFANA_TEAMS       = os.environ.get("GRAFANA_TEAMS", "")
+SHARD_STATE_DB = os.path.join(os.environ.get("LATENCY_BASE_DIR", "/etc/zabbix/scripts/wvx_latency_agent"),
+                              "agent_state.sqlite")
+SHARD_STATE_FAMILY = f"grafana_shards:{WOLKVOX_OPERATION}"   # {grupo: [inicio de cada shard]}
+
 GRAFANA_HOST_FILTER  = os.environ.get("GRAFANA_HOST_FILTER",  "Zabbix server")
 GRAFANA_GROUP_FILTER = os.environ.get("GRAFANA_GROUP_FILTER", "Zabbix servers")
 
@@ -114,12 +166,16 @@ TILE_H  = 3   # alto de cada cubo de estado/plataforma/conexion/version
 AGENT_COL_H = NR_H + LAT_H + TILE_H * 4  # alto total de la columna de un agente
 GLOBAL_H = 9  # alto paneles globales (timeseries)
 START_Y = 18  # y inicial por-agente (2 x GLOBAL_H para los paneles globales)
+# Ids estables: id = AGENT_ID_BASE + codigo * IDS_PER_AGENT + n° de cubo (0..5)
+AGENT_ID_BASE = 100000
+IDS_PER_AGENT = 8
 
 # Markers — identifican paneles autogenerados para reemplazarlos limpiamente
-MARKER        = "auto:wvx_agent_v2"
+MARKER        = "auto:wvx_agent_v3"
 GLOBAL_MARKER = "auto:wvx_global_v1"
-OLD_MARKERS   = ["auto:wvx_agent_v1", "auto:wvx_agent_v2"]  # per-agente
-ALL_AUTO_MARKERS = OLD_MARKERS + [GLOBAL_MARKER]            # todos
+INDEX_MARKER  = "auto:wvx_index_v1"
+OLD_MARKERS   = ["auto:wvx_agent_v1", "auto:wvx_agent_v2", "auto:wvx_agent_v3"]  # per-agente
+ALL_AUTO_MARKERS = OLD_MARKERS + [GLOBAL_MARKER, INDEX_MARKER]  # todos
 
 # Umbrales NR (contador de rechazos, NO porcentaje)
 NR_THRESHOLDS = [
@@ -155,29 +211,28 @@ CONNECTION_MAPPINGS = [{"type": "value", "options": {
 }}]
 
 # Version = fecha YYYYMMDD como entero (crece igual que la fecha, sirve para threshold numerico).
-# Se recalcula en cada corrida (cron nocturno) para que el corte de "30 dias" no quede desactualizado.
-_VERSION_CUTOFF = int((datetime.date.today() - datetime.timedelta(days=30)).strftime("%Y%m%d"))
+# Se recalcula en cada corrida (cron nocturno) para que el corte de "30 dias" no quede
+# desactualizado, redondeado a pasos de VERSION_CUTOFF_STEP_DAYS: si cambiara a diario,
+# el tablero nunca quedaria "sin cambios" y se guardaria una version nueva cada noche.
+VERSION_CUTOFF_STEP_DAYS = max(1, int(os.environ.get("VERSION_CUTOFF_STEP_DAYS", "7")))
+_cutoff = datetime.date.today() - datetime.timedelta(days=30)
+_cutoff -= datetime.timedelta(days=_cutoff.toordinal() % VERSION_CUTOFF_STEP_DAYS)
+_VERSION_CUTOFF = int(_cutoff.strftime("%Y%m%d"))
 VERSION_THRESHOLDS = [
     {"value": None, "color": "red"},
     {"value": _VERSION_CUTOFF, "color": "green"},
 ]
 
 # ============================================================
-session = requests.Session()
+# Zabbix via el cliente compartido (zbx_common/zbx_api.py); Grafana sigue con requests
+zapi = ZabbixAPI(ZBX_URL, user=ZBX_USER, password=ZBX_PASS,
+                 token=os.environ.get("ZBX_API_TOKEN", ""), verify=False)
 
 def zbx_api(method, params, auth=None):
-    payload = {"jsonrpc": "2.0", "method": method, "params": params, "id": 1}
-    if auth:
-        payload["auth"] = auth
-    r = session.post(ZBX_URL, json=payload, verify=False, timeout=30)
-    r.raise_for_status()
-    j = r.json()
-    if "error" in j:
-        raise RuntimeError(j["error"])
-    return j["result"]
+    return zapi.call(method, params)
 
 def zbx_login():
-    return zbx_api("user.login", {"user": ZBX_USER, "password": ZBX_PASS})
+    return zapi.login()
 
 def zbx_get_hostid(auth):
     res = zbx_api("host.get", {"filter": {"host": [HOST_NAME]}, "output": ["hostid"]}, auth)
@@ -185,14 +240,23 @@ def zbx_get_hostid(auth):
         raise SystemExit(f"Host no encontrado: {HOST_NAME}")
     return res[0]["hostid"]
 
+# item.get de a paginas por prefijo de key_ (zbx_api.item_pages): el host es
+# compartido por todas las operaciones
+ITEM_PAGE_SIZE = int(os.environ.get("ZBX_PAGE_SIZE", "1000"))
+
 STATUS_FIELDS = ["latency", "nr", "status", "platform", "connection_type", "version"]
 
-def zbx_get_agent_items(auth, hostid):
-    items = zbx_api("item.get", {"hostids": hostid, "output": ["itemid", "key_", "name"]}, auth)
+def agents_from_items(items):
+    """
+    [{"itemid", "key_", "name"}, ...] -> {codigo: {"<campo>_itemid", "<campo>_name", "display_name"}}.
+    Lo usan zbx_get_agent_items() y sync_agents.py (que ya tiene los items y no
+    necesita otro item.get).
+    """
     agents = {}
     fields_re = "|".join(re.escape(f) for f in STATUS_FIELDS)
     pattern = re.compile(rf"^{re.escape(WOLKVOX_OPERATION)}\.agent\.({fields_re})\[(\d+)\]$")
     for it in items:
+        # el prefijo ya filtra en el servidor; el regex descarta claves con sufijos raros
         m = pattern.match(it["key_"])
         if not m:
             continue
@@ -205,6 +269,11 @@ def zbx_get_agent_items(auth, hostid):
         data["display_name"] = m.group(1).strip() if m else code
     return agents
 
+def zbx_get_agent_items(auth, hostid):
+    prefixes = [f"{WOLKVOX_OPERATION}.agent.{f}[" for f in STATUS_FIELDS]
+    pages = item_pages(zbx_api, hostid, prefixes, ["itemid", "key_", "name"], ITEM_PAGE_SIZE)
+    return agents_from_items(it for page in pages for it in page)
+
 def grafana_request(method, path, allow_404=False, **kwargs):
     url = f"{GRAFANA_URL.rstrip('/')}{path}"
     headers = {"Content-Type": "application/json"}
@@ -253,10 +322,10 @@ def grafana_ensure_folder(title):
     print(f"      Carpeta creada: '{title}' ({uid})")
     return uid
 
-def grafana_create_dashboard(title, folder_uid):
-    dashboard = {
+def new_dashboard(title, uid=None):
+    return {
         "id": None,
-        "uid": None,
+        "uid": uid,
         "title": title,
         "tags": [],
         "timezone": GRAFANA_TIMEZONE,
@@ -264,11 +333,21 @@ def grafana_create_dashboard(title, folder_uid):
         "version": 0,
         "refresh": "",
         "time": {"from": "now/d", "to": "now/d"},
+        "links": [],
         "panels": [],
     }
-    res = grafana_save_dashboard(dashboard, message="Creacion inicial automatica (install_zabbix.sh)", folder_uid=folder_uid)
+
+def grafana_create_dashboard(title, folder_uid):
+    res = grafana_save_dashboard(new_dashboard(title), message="Creacion inicial automatica (install_zabbix.sh)",
+                                 folder_uid=folder_uid)
     return res["uid"]
 
+def grafana_search_by_tag(tag):
+    return grafana_request("GET", "/api/search", params={"tag": tag, "type": "dash-db"}) or []
+
+def grafana_delete_dashboard(uid):
+    return grafana_request("DELETE", f"/api/dashboards/uid/{uid}", allow_404=True)
+
 def persist_dashboard_uid(uid):
     if not ENV_FILE_PATH:
         print(f"      [!] No se encontro .env para guardar GRAFANA_DASHBOARD_UID={uid}; agregalo manualmente.")
@@ -575,18 +654,397 @@ def make_info_tile(panel_id, title, itemid, x, y, mappings, unit="short", decima
         "fieldConfig": {"defaults": fc, "overrides": []}
     }
 
-def main():
+# Cubos de estado (debajo de NR y Latencia): etiqueta, campo, mappings, unit, decimals, thresholds
+STATUS_TILES = [
+    ("Estado",     "status_itemid",          STATUS_MAPPINGS,     "short", None, None),
+    ("Plataforma", "platform_itemid",        PLATFORM_MAPPINGS,   "short", None, None),
+    ("Conexion",   "connection_type_itemid", CONNECTION_MAPPINGS, "short", None, None),
+    ("Version",    "version_itemid",         [],                  "none",  0,    VERSION_THRESHOLDS),
+]
+
+# Claves que Grafana agrega por su cuenta al guardar desde la UI; no cuentan como cambio
+VOLATILE_KEYS = ("pluginVersion",)
+
+def agent_panel_id(code, tile):
+    return AGENT_ID_BASE + int(code) * IDS_PER_AGENT + tile
+
+def slot_xy(slot, start_y=START_Y):
+    return (slot % PANELS_PER_ROW) * PANEL_W, start_y + (slot // PANELS_PER_ROW) * AGENT_COL_H
+
+def xy_slot(x, y, start_y=START_Y):
+    return ((y - start_y) // AGENT_COL_H) * PANELS_PER_ROW + x // PANEL_W
+
+def agent_panel_count(data):
+    return 2 + sum(1 for t in STATUS_TILES if t[1] in data)
+
+def make_agent_panels(code, data, slot, start_y=START_Y):
+    """Columna de un agente: NR, Latencia y los cubos de estado que tengan item."""
+    name = data["display_name"]
+    x, y = slot_xy(slot, start_y)
+    panels = [
+        make_nr_panel(agent_panel_id(code, 0), code, name, data["nr_itemid"], x, y),
+        make_lat_panel(agent_panel_id(code, 1), code, data["latency_itemid"], x, y + NR_H),
+    ]
+    for tile_idx, (label, key, mappings, unit, decimals, thresholds) in enumerate(STATUS_TILES):
+        if key not in data:
+            continue
+        tile_y = y + NR_H + LAT_H + TILE_H * tile_idx
+        panels.append(make_info_tile(agent_panel_id(code, 2 + tile_idx), f"{code} - {name} - {label}",
+                                     data[key], x, tile_y, mappings, unit=unit, decimals=decimals,
+                                     thresholds=thresholds))
+    return panels
+
+def _strip_volatile(obj):
+    if isinstance(obj, dict):
+        return {k: _strip_volatile(v) for k, v in obj.items() if k not in VOLATILE_KEYS}
+    if isinstance(obj, list):
+        return [_strip_volatile(v) for v in obj]
+    return obj
+
+def canonical(panels):
+    """JSON estable (claves ordenadas, paneles por id) para comparar contenido."""
+    ordered = sorted(panels, key=lambda p: p.get("id") or 0)
+    return json.dumps(_strip_volatile(ordered), sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+
+def content_hash(panels):
+    return hashlib.sha256(canonical(panels).encode("utf-8")).hexdigest()
+
+def is_auto(panel):
+    return any(m in (panel.get("description") or "") for m in ALL_AUTO_MARKERS)
+
+def existing_agent_columns(panels):
+    """{codigo: [paneles]} de los paneles por-agente con ids estables (MARKER actual)."""
+    by_code = {}
+    for p in panels:
+        pid = p.get("id") or 0
+        if MARKER in (p.get("description") or "") and pid >= AGENT_ID_BASE:
+            by_code.setdefault(str((pid - AGENT_ID_BASE) // IDS_PER_AGENT), []).append(p)
+    return by_code
+
+def assign_slots(codes, previous, relayout=False):
+    """
+    Slot de grilla por agente. Los agentes que ya estaban conservan su slot (sus
+    paneles no se mueven); los nuevos llenan huecos libres y despues van al final.
+    Sin tablero previo o con relayout: orden por codigo.
+    """
+    if relayout or not previous:
+        return {c: i for i, c in enumerate(codes)}
+    slots = {c: previous[c] for c in codes if c in previous}
+    used = set(slots.values())
+    free = (s for s in itertools.count() if s not in used)
+    for c in codes:
+        if c not in slots:
+            slots[c] = next(free)
+    return slots
+
+def plan_agent_panels(existing_panels, complete, relayout=False, start_y=START_Y):
+    """
+    Genera los paneles por-agente contra los que ya hay en el tablero.
+    Devuelve (paneles, {"added": [...], "removed": [...], "changed": [...], "unchanged": n}).
+    """
+    old_cols = existing_agent_columns(existing_panels)
+    previous = {}
+    for code, col in old_cols.items():
+        nr = next((p for p in col if p["id"] == agent_panel_id(code, 0)), col[0])
+        gp = nr.get("gridPos", {})
+        previous[code] = xy_slot(gp.get("x", 0), gp.get("y", start_y), start_y)
+    codes = sorted(complete.keys(), key=int)
+    slots = assign_slots(codes, previous, relayout)
+
+    panels = []
+    diff = {"added": [], "removed": sorted(set(old_cols) - set(complete), key=int), "changed": [], "unchanged": 0}
+    for code in codes:
+        col = make_agent_panels(code, complete[code], slots[code], start_y)
+        panels.extend(col)
+        if code not in old_cols:
+            diff["added"].append(code)
+        elif canonical(col) != canonical(old_cols[code]):
+            diff["changed"].append(code)
+        else:
+            diff["unchanged"] += 1
+    return panels, diff
+
+# ============================================================
+# Sharding (un tablero por rango de codigos / equipo + tablero indice)
+# ============================================================
+SHARD_MODES = ("auto", "range", "team", "off")
+
+def shard_uid(index_uid, key):
+    # Derivado de la clave del shard (equipo + rango), no de su posicion en la
+    # lista: un rango nuevo no renumera a los demas. UID de Grafana: max 40 caracteres
+    return f"{index_uid[:31]}-{hashlib.sha1(key.encode('utf-8')).hexdigest()[:8]}"
+
+def shard_tag(index_uid):
+    return f"wvx-shard-{index_uid}"
+
+def parse_teams(spec):
+    """'Ventas:100-199,250;Soporte:200-249' -> [(equipo, [(desde, hasta), ...])], en orden."""
+    teams = []
+    for part in (spec or "").split(";"):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, ranges = part.partition(":")
+        spans = []
+        for r in ranges.split(","):
+            r = r.strip()
+            if not r:
+                continue
+            lo, _, hi = r.partition("-")
+            try:
+                spans.append((int(lo), int(hi or lo)))
+            except ValueError:
+                raise ValueError(f"rango invalido '{r}' en GRAFANA_TEAMS ('{part}')")
+        if not name.strip() or not spans:
+            raise ValueError(f"equipo invalido en GRAFANA_TEAMS: '{part}'")
+        teams.append((name.strip(), spans))
+    return teams
+
+def split_range(lo, hi, codes, count, budget):
+    """
+    [(desde, hasta, codigos)] del rango [lo, hi): el rango entero si entra en
+    <budget>; si no, se parte por la mitad (limites fijos) hasta que entre.
+    Solo se parte el rango que se desborda, los demas no se tocan.
+    """
+    if not codes:
+        return []
+    if hi - lo <= 1 or sum(count[c] for c in codes) <= budget:
+        return [(lo, hi, codes)]
+    mid = (lo + hi) // 2
+    return (split_range(lo, mid, [c for c in codes if int(c) < mid], count, budget)
+            + split_range(mid, hi, [c for c in codes if int(c) >= mid], count, budget))
+
+# Dos shards vecinos que juntos no pasan esta fraccion del presupuesto se
+# fusionan (tableros casi vacios cuando se van agentes). Menos de 1: un shard
+# recien partido no se vuelve a fusionar en la corrida siguiente
+SHARD_MERGE_FILL = 0.75
+
+def shard_units(codes, count, budget, width):
+    """[(inicio, codigos)] por rango fijo int(codigo) // <width>, partido si no entra en <budget>."""
+    buckets = {}
+    for c in codes:
+        buckets.setdefault(int(c) // width, []).append(c)
+    return [(lo, part) for b in sorted(buckets)
+            for lo, _, part in split_range(b * width, (b + 1) * width, buckets[b], count, budget)]
+
+def pack_units(units, count, budget, target):
+    """
+    Junta rangos consecutivos en shards de hasta <budget> paneles; corta al
+    llegar a <target> (= budget para llenar, n/k para partir en k parejos).
+    """
+    parts = []
+    for lo, codes in units:
+        n = sum(count[c] for c in codes)
+        if parts and parts[-1][2] < target and parts[-1][2] + n <= budget:
+            parts[-1][1].extend(codes)
+            parts[-1][2] += n
+        else:
+            parts.append([lo, list(codes), n])
+    return [(lo, codes) for lo, codes, _ in parts]
+
+def layout_group(codes, count, budget, width, starts=None):
+    """
+    [(inicio, codigos)] de los shards de un grupo (codigos ordenados).
+
+    Sin layout previo: rangos fijos consecutivos juntados hasta el presupuesto.
+    Con <starts> (los inicios que guardo la corrida anterior, en orden): cada
+    codigo va al shard del mayor inicio <= codigo (el primero toma tambien los
+    menores), asi un codigo nuevo cae en un shard existente y no mueve al
+    resto. Solo cambia un shard que se pasa del presupuesto (se parte en partes
+    parejas; la primera conserva su inicio) o que con el anterior no llega a
+    SHARD_MERGE_FILL (se fusionan). Un shard sin agentes lo absorbe su vecino.
+    """
+    if not starts:
+        return pack_units(shard_units(codes, count, budget, width), count, budget, budget)
+    bounds = starts[1:]
+    members = [[] for _ in starts]
+    for c in codes:
+        members[bisect.bisect_right(bounds, int(c))].append(c)
+    parts = []
+    for start, part in zip(starts, members):
+        if not part:
+            continue
+        n = sum(count[c] for c in part)
+        if n > budget:
+            k = -(-n // budget)
+            split = pack_units(shard_units(part, count, budget, width), count, budget, n / k)
+            parts.append([start, split[0][1], sum(count[c] for c in split[0][1])])
+            parts.extend([lo, sub, sum(count[c] for c in sub)] for lo, sub in split[1:])
+        elif parts and parts[-1][2] + n <= budget * SHARD_MERGE_FILL:
+            parts[-1][1].extend(part)
+            parts[-1][2] += n
+        else:
+            parts.append([start, part, n])
+    return [(start, part) for start, part, _ in parts]
+
+def plan_shards(complete, mode=GRAFANA_SHARD_BY, budget=GRAFANA_MAX_PANELS, teams_spec=GRAFANA_TEAMS,
+                width=GRAFANA_SHARD_RANGE, layout=None):
+    """
+    Reparte los agentes en tableros de a lo sumo <budget> paneles por agente,
+    con limites en multiplos de <width> y estables entre corridas a partir de
+    <layout> ({grupo: [inicio, ...]}, ver layout_group / load_shard_layout).
+    Devuelve [] si alcanza con un solo tablero (o mode=off); si no, una lista
+    de {"group", "start", "key", "label", "codes", "panels"} en orden estable
+    (equipo, codigo).
+    """
+    if mode not in SHARD_MODES:
+        raise ValueError(f"GRAFANA_SHARD_BY invalido: '{mode}' (opciones: {', '.join(SHARD_MODES)})")
+    codes = sorted(complete.keys(), key=int)
+    count = {c: agent_panel_count(complete[c]) for c in codes}
+    if mode == "off" or (mode == "auto" and sum(count.values()) <= budget):
+        return []
+
+    if mode == "team":
+        teams = parse_teams(teams_spec)
+        if not teams:
+            raise ValueError("GRAFANA_SHARD_BY=team requiere GRAFANA_TEAMS")
+        by_team = {name: [] for name, _ in teams}
+        rest = []
+        for c in codes:
+            # Si los rangos se solapan gana el primer equipo
+            team = next((name for name, spans in teams
+                         if any(lo <= int(c) <= hi for lo, hi in spans)), None)
+            (by_team[team] if team else rest).append(c)
+        groups = [(name, by_team[name]) for name, _ in teams] + [("Sin equipo", rest)]
+    else:
+        groups = [("Agentes", codes)]
+
+    width = width if width > 0 else max(1, budget // (2 + len(STATUS_TILES)))
+    shards = []
+    for name, group in groups:
+        if not group:
+            continue
+        parts = layout_group(group, count, budget, width, (layout or {}).get(name))
+        for start, part in parts:
+            label = name if mode == "team" and len(parts) == 1 else f"{name} {part[0]}-{part[-1]}"
+            shards.append({"group": name, "start": start, "key": f"{name}:{start}", "label": label,
+                           "codes": part, "panels": sum(count[c] for c in part)})
+    return shards
+
+def load_shard_layout():
+    """{grupo: [inicio, ...]} de la ultima corrida ({} si no hay o no se puede leer)."""
+    if not os.path.isfile(SHARD_STATE_DB):
+        return {}
+    try:
+        with StateStore(SHARD_STATE_DB) as st:
+            return {g: json.loads(v) for g, v in st.load(SHARD_STATE_FAMILY).items()}
+    except (sqlite3.Error, OSError, ValueError) as e:
+        print(f"      [!] No se pudo leer el layout de shards ({SHARD_STATE_DB}): {e}")
+        return {}
+
+def save_shard_layout(shards):
+    """Guarda los inicios por grupo para que la proxima corrida reparta igual."""
+    layout = {}
+    for sh in shards:
+        layout.setdefault(sh["group"], []).append(sh["start"])
+    try:
+        with StateStore(SHARD_STATE_DB) as st:
+            st.forget(SHARD_STATE_FAMILY)
+            st.commit(SHARD_STATE_FAMILY, {g: json.dumps(v) for g, v in layout.items()})
+    except (sqlite3.Error, OSError) as e:
+        print(f"      [!] No se pudo guardar el layout de shards ({SHARD_STATE_DB}): {e}")
+
+def make_index_panel(panel_id, shards, y):
+    base = GRAFANA_URL.rstrip("/")
+    rows = ["| Tablero | Agentes | Codigos | Paneles |", "|---|---|---|---|"]
+    for sh in shards:
+        rows.append(f"| [{sh['label']}]({base}/d/{sh['uid']}) | {len(sh['codes'])} | "
+                    f"{sh['codes'][0]}-{sh['codes'][-1]} | {sh['panels']} |")
+    return {
+        "id": panel_id,
+        "type": "text",
+        "title": f"Agentes por tablero ({len(shards)})",
+        "description": INDEX_MARKER,
+        "gridPos": {"x": 0, "y": y, "w": 24, "h": min(4 + len(shards), 30)},
+        "options": {"mode": "markdown", "content": "\n".join(rows)},
+    }
+
+def merge_links(current, index_uid, ours):
+    """Links del tablero: conserva los manuales y reemplaza los de navegacion entre shards."""
+    tag = shard_tag(index_uid)
+    manual = [l for l in (current or [])
+              if tag not in (l.get("tags") or []) and l.get("url") != f"/d/{index_uid}"]
+    return manual + ours
+
+def shard_links(index_uid, with_index=True):
+    links = []
+    if with_index:
+        links.append({"type": "link", "title": "Indice", "url": f"/d/{index_uid}", "icon": "dashboard",
+                      "tags": [], "asDropdown": False, "keepTime": True, "includeVars": False,
+                      "targetBlank": False, "tooltip": ""})
+    links.append({"type": "dashboards", "title": "Tableros de agentes", "tags": [shard_tag(index_uid)],
+                  "icon": "external link", "url": "", "asDropdown": True, "keepTime": True,
+                  "includeVars": False, "targetBlank": False, "tooltip": ""})
+    return links
+
+def sync_dashboard(dashboard, static_panels, agents, args, folder_uid, start_y=START_Y, meta=None,
+                   indent="      "):
+    """
+    Reemplaza los paneles autogenerados de <dashboard> (static_panels + columnas
+    de <agents>) conservando los manuales, aplica <meta> (timezone, titulo,
+    links...) y guarda SOLO si algo cambio. Devuelve la respuesta del save o
+    None si no hizo falta guardar.
+    """
+    existing = dashboard.get("panels", [])
+    kept = [p for p in existing if not is_auto(p)]
+    old_auto = [p for p in existing if is_auto(p)]
+    agent_panels, diff = plan_agent_panels(old_auto, agents, relayout=args.relayout, start_y=start_y)
+    new_auto = static_panels + agent_panels
+    print(f"{indent}Existentes: {len(existing)} | Conservados: {len(kept)} | Auto: {len(old_auto)} -> {len(new_auto)}")
+    print(f"{indent}Agentes: +{len(diff['added'])} nuevos | -{len(diff['removed'])} removidos | "
+          f"~{len(diff['changed'])} cambiados | ={diff['unchanged']} sin cambios")
+    for label in ("added", "removed", "changed"):
+        if diff[label]:
+            print(f"{indent}  {label}: {', '.join(diff[label][:30])}" + (" ..." if len(diff[label]) > 30 else ""))
+
+    meta_changed = False
+    for k, v in dict({"timezone": GRAFANA_TIMEZONE}, **(meta or {})).items():
+        if dashboard.get(k) == v:
+            continue
+        if isinstance(v, str):
+            print(f"{indent}{k.capitalize()}: {dashboard.get(k) or '(vacio)'} -> {v}")
+        else:
+            print(f"{indent}{k.capitalize()}: actualizado")
+        dashboard[k] = v
+        meta_changed = True
+
+    old_hash, new_hash = content_hash(old_auto), content_hash(new_auto)
+    print(f"{indent}Hash auto: {old_hash[:12]} -> {new_hash[:12]}")
+    if old_hash == new_hash and not meta_changed and not args.force:
+        print(f"{indent}Sin cambios: no se guarda (el tablero queda en la misma version)")
+        return None
+
+    dashboard["panels"] = kept + new_auto
+    print(f"{indent}Guardando ({len(dashboard['panels'])} paneles totales)...")
+    message = (f"auto: {len(agents)} agentes (+{len(diff['added'])} -{len(diff['removed'])} "
+               f"~{len(diff['changed'])})")
+    res = grafana_save_dashboard(dashboard, message=message, folder_uid=folder_uid)
+    print(f"{indent}OK ✓ version={res.get('version')}")
+    return res
+
+def main(argv=None, agents=None):
+    """
+    <agents> ({codigo: {...}} de agents_from_items) lo pasa sync_agents.py con
+    los items que acaba de sincronizar; sin eso se leen de Zabbix.
+    """
     parser = argparse.ArgumentParser()
     parser.add_argument("--dry-run", action="store_true")
-    args = parser.parse_args()
+    parser.add_argument("--relayout", action="store_true",
+                        help="Reordenar todos los agentes por codigo (mueve todos los paneles)")
+    parser.add_argument("--force", action="store_true", help="Guardar aunque no haya cambios")
+    args = parser.parse_args(argv)
 
-    print("[1/6] Zabbix login...")
-    auth = zbx_login()
-    hostid = zbx_get_hostid(auth)
-    print(f"      Host ID: {hostid}")
+    from_sync = agents is not None
+    if not from_sync:
+        print("[1/6] Zabbix login...")
+        auth = zbx_login()
+        hostid = zbx_get_hostid(auth)
+        print(f"      Host ID: {hostid}")
 
-    print("[2/6] Recolectando items...")
-    agents = zbx_get_agent_items(auth, hostid)
+        print("[2/6] Recolectando items...")
+        agents = zbx_get_agent_items(auth, hostid)
+    else:
+        print("[1/6] [2/6] Items recibidos del sync (sin consultar Zabbix)")
     # Solo latencia+NR son obligatorios (compat con agentes sin sync de estado
     # todavia); los 4 cubos de estado se agregan solo si el item existe.
     complete = {c: d for c, d in agents.items()
@@ -594,45 +1052,26 @@ def main():
     incomplete_status = [c for c, d in complete.items() if "status_itemid" not in d]
     print(f"      Agentes completos: {len(complete)}"
           + (f" ({len(incomplete_status)} sin items de estado: {', '.join(incomplete_status)})" if incomplete_status else ""))
+    if not from_sync:
+        print(f"      API Zabbix: {zapi.summary()}")
 
     agent_count = len(complete)
+    shards = plan_shards(complete, layout=load_shard_layout())
     print(f"[3/6] Generando paneles (2 globales + {agent_count} agentes x 6 cubos)...")
+    if shards:
+        print(f"      Sharding ({GRAFANA_SHARD_BY}): {len(shards)} tableros de hasta {GRAFANA_MAX_PANELS} paneles")
     # Paneles globales (timeseries)
     global_panels = [
         make_latency_global_panel(900),
         make_nr_global_panel(901),
     ]
-    # Paneles por agente (stat): NR, Latencia, Estado, Plataforma, Conexion, Version
-    agent_panels = []
-    next_id = 1000
-    for idx, code in enumerate(sorted(complete.keys(), key=int)):
-        data = complete[code]
-        name = data["display_name"]
-        col = idx % PANELS_PER_ROW
-        row = idx // PANELS_PER_ROW
-        x = col * PANEL_W
-        y = START_Y + row * AGENT_COL_H
-        agent_panels.append(make_nr_panel(next_id,     code, name, data["nr_itemid"],      x, y))
-        agent_panels.append(make_lat_panel(next_id + 1, code,       data["latency_itemid"], x, y + NR_H))
-        next_id += 2
-        status_tiles = [
-            ("Estado",     "status_itemid",          STATUS_MAPPINGS,     "short", None, None),
-            ("Plataforma", "platform_itemid",        PLATFORM_MAPPINGS,   "short", None, None),
-            ("Conexion",   "connection_type_itemid", CONNECTION_MAPPINGS, "short", None, None),
-            ("Version",    "version_itemid",         [],                  "none",  0,    VERSION_THRESHOLDS),
-        ]
-        for tile_idx, (label, key, mappings, unit, decimals, thresholds) in enumerate(status_tiles):
-            if key not in data:
-                continue
-            tile_y = y + NR_H + LAT_H + TILE_H * tile_idx
-            agent_panels.append(make_info_tile(next_id, f"{code} - {name} - {label}", data[key], x, tile_y,
-                                                mappings, unit=unit, decimals=decimals, thresholds=thresholds))
-            next_id += 1
-
-    new_panels = global_panels + agent_panels
 
     if args.dry_run:
-        print(f"\n[DRY-RUN] Total paneles: {len(new_panels)} (2 globales + {len(agent_panels)} por agente)")
+        agent_panels, _ = plan_agent_panels([], complete)
+        print(f"\n[DRY-RUN] Total paneles: {len(global_panels) + len(agent_panels)} "
+              f"(2 globales + {len(agent_panels)} por agente)")
+        for n, sh in enumerate(shards, 1):
+            print(f"[DRY-RUN]   s{n:02d} {sh['label']}: {len(sh['codes'])} agentes, {sh['panels']} paneles")
         if _is_placeholder_uid(DASHBOARD_UID):
             print(f"[DRY-RUN] GRAFANA_DASHBOARD_UID no configurado — se crearia "
                   f"'{GRAFANA_DASHBOARD_TITLE}' en carpeta '{GRAFANA_FOLDER_TITLE}'")
@@ -641,26 +1080,46 @@ def main():
     print("[4/6] Resolviendo tablero de Grafana...")
     dashboard_uid = grafana_resolve_dashboard_uid()
 
-    print("[5/6] Cargando dashboard...")
     dash_resp = grafana_get_dashboard(dashboard_uid)
     dashboard = dash_resp["dashboard"]
     folder_uid = dash_resp.get("meta", {}).get("folderUid")
     print(f"      Carpeta actual: {dash_resp.get('meta', {}).get('folderTitle')} ({folder_uid})")
-    existing = dashboard.get("panels", [])
-    # Limpia todos los paneles autogenerados (globales y por-agente)
-    kept = [p for p in existing
-            if not any(m in (p.get("description") or "") for m in ALL_AUTO_MARKERS)]
-    removed = len(existing) - len(kept)
-    print(f"      Existentes: {len(existing)} | Conservados: {len(kept)} | Removidos auto: {removed}")
-
-    if dashboard.get("timezone") != GRAFANA_TIMEZONE:
-        print(f"      Timezone: {dashboard.get('timezone') or '(vacio)'} -> {GRAFANA_TIMEZONE}")
-        dashboard["timezone"] = GRAFANA_TIMEZONE
-
-    dashboard["panels"] = kept + new_panels
-    print(f"[6/6] Guardando ({len(dashboard['panels'])} paneles totales)...")
-    res = grafana_save_dashboard(dashboard, message=f"v3: 2 globales + {agent_count} agentes", folder_uid=folder_uid)
-    print(f"      OK ✓ version={res.get('version')}")
+
+    if not shards:
+        # Un solo tablero: globales + todos los agentes (los autogenerados se
+        # regeneran, pero los agentes sin cambios quedan identicos)
+        print("[5/6] Comparando dashboard...")
+        sync_dashboard(dashboard, global_panels, complete, args, folder_uid,
+                       meta={"links": merge_links(dashboard.get("links"), dashboard_uid, [])})
+    else:
+        # Shards: cada uno solo con sus columnas de agente, desde y=0
+        print(f"[5/6] Sincronizando {len(shards)} tableros de agentes...")
+        for n, sh in enumerate(shards, 1):
+            sh["uid"] = shard_uid(dashboard_uid, sh["key"])
+            title = f"{GRAFANA_DASHBOARD_TITLE} - {sh['label']}"
+            print(f"      [s{n:02d}] {title} ({len(sh['codes'])} agentes, {sh['panels']} paneles) uid={sh['uid']}")
+            resp = grafana_get_dashboard(sh["uid"], allow_404=True)
+            shard_dash = resp["dashboard"] if resp else new_dashboard(title, sh["uid"])
+            sync_dashboard(shard_dash, [], {c: complete[c] for c in sh["codes"]}, args, folder_uid,
+                           start_y=0, indent="          ",
+                           meta={"title": title, "tags": [shard_tag(dashboard_uid)],
+                                 "links": merge_links(shard_dash.get("links"), dashboard_uid,
+                                                      shard_links(dashboard_uid))})
+        print("      [indice]")
+        sync_dashboard(dashboard, global_panels + [make_index_panel(902, shards, START_Y)], {}, args,
+                       folder_uid, indent="          ",
+                       meta={"links": merge_links(dashboard.get("links"), dashboard_uid,
+                                                  shard_links(dashboard_uid, with_index=False))})
+        save_shard_layout(shards)
+
+    print("[6/6] Limpiando tableros de agentes sobrantes...")
+    keep = {sh["uid"] for sh in shards}
+    stale = [d for d in grafana_search_by_tag(shard_tag(dashboard_uid)) if d.get("uid") not in keep]
+    for d in stale:
+        grafana_delete_dashboard(d["uid"])
+        print(f"      Borrado: {d.get('title')} ({d['uid']})")
+    if not stale:
+        print("      Nada que borrar")
     print(f"      URL: {GRAFANA_URL.rstrip('/')}/d/{dashboard_uid}")
 
 if __name__ == "__main__":
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 # Crea/actualiza items TRAPPER para latencia de agentes
-import json, os, subprocess, requests, time
+import json, os, subprocess, time
 
 # Carga .env desde la raíz del proyecto (sin dependencias externas)
 import pathlib as _pl, os as _os
@@ -20,6 +20,14 @@ if _ef:
                 _os.environ[_k] = _v
 del _pl, _os, _ef
 
+# Modulos compartidos (zbx_common/) buscando hacia arriba, igual que el .env
+import pathlib as _pl, sys as _sys
+_lib = next((p / "zbx_common" for p in _pl.Path(__file__).resolve().parents if (p / "zbx_common").is_dir()), None)
+if _lib and str(_lib) not in _sys.path:
+    _sys.path.insert(0, str(_lib))
+del _pl, _sys, _lib
+from zbx_api import ZabbixAPI, call_chunked
+
 ZBX_URL   = os.environ.get("ZBX_URL",        "http://IP/zabbix/api_jsonrpc.php")
 ZBX_USER  = os.environ.get("ZBX_USER",       "Admin")
 ZBX_PASS  = os.environ.get("ZBX_PASS",       "CHANGE_ME")
@@ -35,29 +43,36 @@ WOLKVOX_OPERATION = os.environ.get("WOLKVOX_OPERATION", "unknown_operation")
 _op_upper = WOLKVOX_OPERATION.upper()
 DISPLAY_TAG = _op_upper[len("ALOGLOBAL-"):] if _op_upper.startswith("ALOGLOBAL-") else _op_upper
 
-DELAY_BETWEEN_REQUESTS = 0.3
 MAX_RETRIES = 2
-session = requests.Session()
+CHUNK_SIZE = int(os.environ.get("ZBX_CHUNK_SIZE", "500"))  # objetos por item.create/update
+# Atributos que administra este sync: solo estos se comparan contra Zabbix
+MANAGED_FIELDS = ("name", "type", "value_type", "units", "history", "trends")
+# Cliente compartido (zbx_common/zbx_api.py): una conexion keep-alive, sesion
+# reutilizada entre corridas (o ZBX_API_TOKEN) y reintentos con backoff
+zapi = ZabbixAPI(ZBX_URL, user=ZBX_USER, password=ZBX_PASS,
+                 token=os.environ.get("ZBX_API_TOKEN", ""), verify=False)
 
 def api(method, params, auth=None):
-    payload = {"jsonrpc":"2.0","method":method,"params":params,"id":1}
-    if auth: payload["auth"] = auth
-    r = session.post(ZBX_URL, json=payload, verify=False, timeout=30)
-    r.raise_for_status()
-    j = r.json()
-    if "error" in j: raise RuntimeError(j["error"])
-    return j["result"]
+    # <auth> queda por compatibilidad con los llamadores: la sesion vive en zapi
+    return zapi.call(method, params)
 
-def login(): return api("user.login", {"user":ZBX_USER,"password":ZBX_PASS})
+def login():
+    return zapi.login()
 
 def get_hostid(auth):
     res = api("host.get", {"filter":{"host":[HOST_NAME]}, "output":["hostid"]}, auth)
     if not res: raise SystemExit(f"Host no encontrado: {HOST_NAME}")
     return res[0]["hostid"]
 
-def item_by_key(auth, hostid, key_):
-    res = api("item.get", {"hostids":hostid, "filter":{"key_":key_}, "output":["itemid"]}, auth)
-    return res[0] if res else None
+def get_existing_items(auth, hostid):
+    """Un solo item.get para todos los items de la operacion: {key_: item} con sus atributos actuales."""
+    res = api("item.get", {"hostids":hostid, "output":["itemid","key_",*MANAGED_FIELDS],
+                           "search":{"key_":f"{WOLKVOX_OPERATION}.agent.latency["}, "startSearch":True}, auth)
+    return {it["key_"]: it for it in res}
+
+def item_diff(current, wanted):
+    """Campos de <wanted> que difieren del item actual (la API devuelve todo como string)."""
+    return {k: v for k, v in wanted.items() if str(current.get(k, "")) != str(v)}
 
 def fetch_agents():
     url = f"{WOLKVOX_URL}?api=latency"
@@ -82,6 +97,61 @@ def fetch_agents():
             else: raise
     raise RuntimeError("No se pudieron obtener agentes")
 
+def sync(auth, hostid, agents, existing):
+    """
+    Crea/actualiza los items de <agents> ({codigo: nombre}) contra <existing>
+    ({key_: item}, ver get_existing_items). Lo usa main() y sync_agents.py, que
+    corre las tres familias en paralelo con un solo login/fetch.
+    Devuelve {key_: {"itemid", "name"}} de los items vigentes y los contadores.
+    """
+    print(f"  Items existentes: {len(existing)}")
+    to_create, to_update = [], []
+    agent_by_key = {}
+    unchanged = 0
+    for code, name in sorted(agents.items()):
+        key_ = f"{WOLKVOX_OPERATION}.agent.latency[{code}]"
+        wanted = {
+            "name": f"[{DISPLAY_TAG}] Agent {code} - {name} - Latency",
+            "type": 2, "value_type": 0, "units": "ms",
+            "history": "90d", "trends": "365d"
+        }
+        agent_by_key[key_] = (code, name)
+        it = existing.get(key_)
+        if it:
+            # Solo se actualiza lo que realmente cambio (p. ej. el nombre del agente)
+            diff = item_diff(it, wanted)
+            if diff:
+                to_update.append({"itemid": it["itemid"], **diff})
+            else:
+                unchanged += 1
+        else:
+            to_create.append({
+                "hostid": hostid, "key_": key_, **wanted,
+                "description": f"[{WOLKVOX_OPERATION}] Latencia del agente {code}"
+            })
+    created, failed_c = call_chunked(api, "item.create", to_create, "itemids", CHUNK_SIZE)
+    updated, failed_u = call_chunked(api, "item.update", to_update, "itemids", CHUNK_SIZE)
+    for label, failed in (("create", failed_c), ("update", failed_u)):
+        for obj, e in failed:
+            print(f"  ✗ ERR {label} {obj.get('key_', obj.get('itemid'))}: {e}")
+    new_agents = []
+    for obj, _ in created:
+        code, name = agent_by_key[obj["key_"]]
+        new_agents.append(f"{code}-{name}")
+        print(f"  ✓ NEW {code} - {name}")
+    print(f"Total: {len(agents)} | Nuevos: {len(created)} | Actualizados: {len(updated)} | "
+          f"Sin cambios: {unchanged} | Errores: {len(failed_c) + len(failed_u)}")
+    if new_agents:
+        print(f"Nuevos agentes: {', '.join(new_agents)}")
+    # Items vigentes por key_: sync_agents.py se los pasa al generador de Grafana sin otro item.get
+    key_by_itemid = {it["itemid"]: k for k, it in existing.items()}
+    items = {k: {"itemid": it["itemid"], "name": it["name"]} for k, it in existing.items() if k in agent_by_key}
+    for obj, itemid in created + updated:
+        key_ = obj.get("key_") or key_by_itemid[itemid]
+        items[key_] = {"itemid": itemid, "name": obj["name"] if "name" in obj else items[key_]["name"]}
+    return {"items": items, "created": len(created), "updated": len(updated), "unchanged": unchanged,
+            "errors": len(failed_c) + len(failed_u)}
+
 def main():
     print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] === LATENCY ITEMS SYNC ===")
     print("[1/3] Autenticando en Zabbix...")
@@ -92,36 +162,8 @@ def main():
     agents = fetch_agents()
     print(f"  OK - {len(agents)} agentes encontrados")
     print(f"[3/3] Creando/actualizando items...")
-    created = updated = 0
-    new_agents = []
-    for idx, (code, name) in enumerate(sorted(agents.items()), 1):
-        key_ = f"{WOLKVOX_OPERATION}.agent.latency[{code}]"
-        item_name = f"[{DISPLAY_TAG}] Agent {code} - {name} - Latency"
-        it = item_by_key(auth, hostid, key_)
-        try:
-            if it:
-                api("item.update", {
-                    "itemid": it["itemid"], "name": item_name,
-                    "type": 2, "value_type": 0, "units": "ms",
-                    "history": "90d", "trends": "365d"
-                }, auth)
-                updated += 1
-            else:
-                api("item.create", {
-                    "hostid": hostid, "name": item_name, "key_": key_,
-                    "type": 2, "value_type": 0, "units": "ms",
-                    "history": "90d", "trends": "365d",
-                    "description": f"[{WOLKVOX_OPERATION}] Latencia del agente {code}"
-                }, auth)
-                created += 1
-                new_agents.append(f"{code}-{name}")
-                print(f"  ✓ NEW {code} - {name}")
-            time.sleep(DELAY_BETWEEN_REQUESTS)
-        except Exception as e:
-            print(f"  ✗ ERR {code}: {e}")
-    print(f"Total: {len(agents)} | Nuevos: {created} | Actualizados: {updated}")
-    if new_agents:
-        print(f"Nuevos agentes: {', '.join(new_agents)}")
+    sync(auth, hostid, agents, get_existing_items(auth, hostid))
+    print(f"API: {zapi.summary()}")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+API real_time.php de Wolkvox falsa para probar los pollers
+(send_latency_data.sh, send_nr_data.sh, send_status_data.sh,
+send_agent_data.py) y los create_*_items.py sin tocar la API real.
+
+Sirve {"code": 200, "data": [{"by_agent": [...]}]} en cualquier GET (el
+?api=latency de los scripts incluido), con los campos que leen: agent_id
+("<codigo>-<nombre>"), latency_ms, network_rejection, agent_status,
+platform, connection_type, version e ip.
+
+Dos fuentes:
+  - sintetica: --agents N agentes; en cada ciclo cambia una fraccion --churn
+    de ellos (latencia siempre; NR, estado, plataforma... con menos
+    frecuencia), igual que una operacion real donde la mayoria de los valores
+    se repite de un minuto al otro;
+  - grabada: --replay captura.json [...] (una respuesta real por archivo, o
+    JSONL con una por linea), servidas en orden, una por ciclo, en loop.
+
+El ciclo avanza cada --period segundos (60 = un cron por minuto) o, en
+proceso, con advance() (lo usa bench/bench_wolkvox_pipeline.py). Con
+--token, los requests sin header "wolkvox-token" igual reciben 401.
+
+Uso:
+  fake_wolkvox_api.py [--port 8081] [--agents 5000] [--churn 0.2] [--period 60]
+  fake_wolkvox_api.py --replay samples/real_time_latency_sample.json
+  WOLKVOX_URL=http://127.0.0.1:8081/api/v2/real_time.php bash send_latency_data.sh
+"""
+import argparse, json, random, socketserver, sys, threading, time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+STATUSES    = ("Connected", "Connected", "Connected", "Disconnected", "Conectado - Break")
+PLATFORMS   = ("wolkvox App", "Web", "web")
+CONNECTIONS = ("wifi", "ethernet", "cable", "unknown")
+VERSIONS    = ("8.4.2", "8.4.3", "8.5.0")
+# Probabilidad de que, siendo un agente "que cambia" en el ciclo, cambie
+# cada campo ademas de la latencia
+FIELD_CHURN = {"network_rejection": 0.3, "agent_status": 0.2, "connection_type": 0.05,
+               "platform": 0.02, "version": 0.01}
+
+def load_replay(paths):
+    """Respuestas grabadas: un JSON por archivo o JSONL (una por linea)."""
+    payloads = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            text = f.read()
+        try:
+            payloads.append(json.loads(text))
+        except ValueError:
+            payloads.extend(json.loads(line) for line in text.splitlines() if line.strip())
+    if not payloads:
+        raise ValueError(f"sin respuestas en {', '.join(paths)}")
+    return payloads
+
+class WolkvoxReplay(object):
+    """Fuente de respuestas por ciclo (sintetica o grabada), ya serializadas."""
+
+    def __init__(self, agents=5000, churn=0.2, seed=None, replay=None):
+        self.rand = random.Random(seed)
+        self.churn = churn
+        self.replay = replay
+        self.cycle = 0
+        self.lock = threading.Lock()
+        self.requests = self.bytes_out = self.unauthorized = 0
+        if replay is None:
+            self.agents = [self._agent(i) for i in range(agents)]
+        self._body = None
+
+    def _agent(self, i):
+        r = self.rand
+        return {"agent_id": f"{1000 + i}-agente{i}", "latency_ms": r.randint(20, 400),
+                "network_rejection": r.randint(0, 3), "agent_status": r.choice(STATUSES),
+                "platform": r.choice(PLATFORMS), "connection_type": r.choice(CONNECTIONS),
+                "version": r.choice(VERSIONS), "ip": f"10.{i // 65536 % 256}.{i // 256 % 256}.{i % 256}"}
+
+    def advance(self):
+        """Pasa al ciclo siguiente: cambia --churn de los agentes (o la proxima grabacion)."""
+        with self.lock:
+            self.cycle += 1
+            self._body = None
+            if self.replay is not None:
+                return
+            r = self.rand
+            for a in r.sample(self.agents, int(len(self.agents) * self.churn)):
+                a["latency_ms"] = max(1, a["latency_ms"] + r.randint(-80, 80))
+                for field, p in FIELD_CHURN.items():
+                    if r.random() < p:
+                        if field == "network_rejection":
+                            a[field] = r.randint(0, 5)
+                        else:
+                            a[field] = r.choice({"agent_status": STATUSES, "connection_type": CONNECTIONS,
+                                                 "platform": PLATFORMS, "version": VERSIONS}[field])
+
+    def body(self):
+        """Respuesta del ciclo actual (se serializa una vez por ciclo)."""
+        with self.lock:
+            if self._body is None:
+                if self.replay is not None:
+                    payload = self.replay[self.cycle % len(self.replay)]
+                else:
+                    payload = {"code": 200, "data": [{"by_agent": self.agents}]}
+                self._body = json.dumps(payload).encode("utf-8")
+            return self._body
+
+    def stats(self):
+        with self.lock:
+            return {"cycle": self.cycle, "requests": self.requests,
+                    "bytes_out": self.bytes_out, "unauthorized": self.unauthorized}
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        src = self.server.source
+        if self.server.token and self.headers.get("wolkvox-token") != self.server.token:
+            body, status = b'{"code": 401, "msg": "invalid token"}', 401
+            with src.lock:
+                src.unauthorized += 1
+        else:
+            body, status = src.body(), 200
+        with src.lock:
+            src.requests += 1
+            src.bytes_out += len(body)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        pass
+
+class FakeWolkvoxServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, source, token=None):
+        super().__init__(address, Handler)
+        self.source = source
+        self.token = token
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/api/v2/real_time.php"
+
+    def start(self):
+        """Sirve en un hilo daemon (uso en proceso, p. ej. desde un benchmark)."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+def main():
+    parser = argparse.ArgumentParser(description="API real_time.php de Wolkvox falsa")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--agents", type=int, default=5000, help="Agentes sinteticos")
+    parser.add_argument("--churn", type=float, default=0.2, help="Fraccion de agentes que cambian por ciclo")
+    parser.add_argument("--period", type=float, default=60.0, help="Segundos por ciclo (0 = no avanza)")
+    parser.add_argument("--replay", nargs="+", metavar="JSON", help="Respuestas grabadas en lugar de sinteticas")
+    parser.add_argument("--token", help="Exigir este wolkvox-token (401 si no coincide)")
+    parser.add_argument("--seed", type=int, help="Semilla de los datos sinteticos")
+    args = parser.parse_args()
+
+    try:
+        replay = load_replay(args.replay) if args.replay else None
+    except (OSError, ValueError) as e:
+        print(f"ERROR: {e}", file=sys.stderr)
+        sys.exit(2)
+    source = WolkvoxReplay(args.agents, args.churn, args.seed, replay)
+    server = FakeWolkvoxServer((args.host, args.port), source, args.token)
+    what = f"{len(replay)} respuestas grabadas" if replay else f"{args.agents} agentes, churn {args.churn:g}"
+    print(f"API Wolkvox falsa en {server.url} ({what})", flush=True)
+    if args.period > 0:
+        def tick():
+            while True:
+                time.sleep(args.period)
+                source.advance()
+        threading.Thread(target=tick, daemon=True).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        st = source.stats()
+        print(f"ciclos: {st['cycle']} | requests: {st['requests']} | bytes: {st['bytes_out']} "
+              f"| 401: {st['unauthorized']}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
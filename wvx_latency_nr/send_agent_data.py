@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+# Poller de agentes Wolkvox en Python: UNA consulta a real_time.php?api=latency
+# por ciclo, de la que salen latencia, NR y estado/plataforma/conexion/version
+# (codificados a numero, ver create_status_items.py), enviados en un solo lote
+# por el protocolo nativo del trapper (zbx_common/zbx_sender.py).
+#
+# Reemplaza el loop en bash de send_status_data.sh / send_agent_data.sh, que
+# lanzaba 4 subshells $(map_*) por agente: aca el JSON se parsea una vez, el
+# mapeo texto->codigo usa regex precompiladas con memo por valor crudo (los
+# textos se repiten entre agentes) y la comparacion contra el estado previo es
+# un dict. El estado vive en agent_state.sqlite (zbx_common/state_store.py) y
+# solo avanza para los valores que el trapper acepto; los agent_*_state.json de
+# los scripts bash se importan una vez al primer arranque.
+#
+# Uso: send_agent_data.py [--families latency,nr,status] [--dry-run] [--full]
+import argparse, json, os, re, subprocess, sys, time
+
+# Carga .env desde la raíz del proyecto (sin dependencias externas)
+import pathlib as _pl, os as _os
+_ef = next((p / ".env" for p in _pl.Path(__file__).resolve().parents if (p / ".env").is_file()), None)
+if _ef:
+    for _l in open(_ef):
+        _l = _l.strip()
+        if _l and not _l.startswith('#') and '=' in _l:
+            _k, _, _v = _l.partition('=')
+            _k, _v = _k.strip(), _v.strip()
+            if _v[:1] in ('"', "'"):
+                _q = _v[0]; _e = _v.find(_q, 1)
+                _v = _v[1:_e] if _e != -1 else _v[1:]
+            else:
+                _v = _v.split('#', 1)[0].strip()
+            if _k and _k not in _os.environ:
+                _os.environ[_k] = _v
+del _pl, _os, _ef
+
+# Modulos compartidos (zbx_common/) buscando hacia arriba, igual que el .env
+import pathlib as _pl, sys as _sys
+_lib = next((p / "zbx_common" for p in _pl.Path(__file__).resolve().parents if (p / "zbx_common").is_dir()), None)
+if _lib and str(_lib) not in _sys.path:
+    _sys.path.insert(0, str(_lib))
+del _pl, _sys, _lib
+from change_filter import ChangeFilter, parse_rules
+from state_store import StateStore
+from zbx_sender import SenderError, ZabbixSender
+
+ZBX_SERVER = os.environ.get("ZBX_SERVER", "68.183.116.34")
+ZBX_PORT   = int(os.environ.get("ZBX_PORT", "10051"))
+HOST_NAME  = os.environ.get("LATENCY_ZBX_HOST", os.environ.get("ZBX_HOST", "ippbx-cloud-issa5-redplus"))
+
+WOLKVOX_SERVER    = os.environ.get("WOLKVOX_SERVER",    "00XX")
+WOLKVOX_TOKEN     = os.environ.get("WOLKVOX_TOKEN",     "TOKEN")
+WOLKVOX_OPERATION = os.environ.get("WOLKVOX_OPERATION", "unknown_operation")
+WOLKVOX_URL       = os.environ.get("WOLKVOX_URL", f"https://wv{WOLKVOX_SERVER}.wolkvox.com/api/v2/real_time.php")
+API_URL = f"{WOLKVOX_URL}?api=latency"
+
+BASE_DIR = os.environ.get("LATENCY_BASE_DIR", "/etc/zabbix/scripts/wvx_latency_agent")
+STATE_DB = os.path.join(BASE_DIR, "agent_state.sqlite")
+# Deadband + heartbeat por familia (ver zbx_common/change_filter.py). La latencia
+# cambia casi cada ciclo: solo se envia si se mueve mas de 10 ms / 20%, y todo
+# valor se reenvia al menos cada 30 min para que nodata() detecte un poller caido.
+SEND_RULES = os.environ.get("LATENCY_SEND_RULES",
+                            "latency:abs=10,rel=0.2,heartbeat=1800;*:heartbeat=1800")
+# Estado heredado de send_{latency,nr,status}_data.sh (solo se lee para migrar)
+LEGACY_STATE_FILES = {
+    "latency": os.path.join(BASE_DIR, "agent_latency_state.json"),
+    "nr":      os.path.join(BASE_DIR, "agent_nr_state.json"),
+    "status":  os.path.join(BASE_DIR, "agent_status_state.json"),
+}
+FAMILIES = ("latency", "nr", "status")
+
+MAX_RETRIES = 2
+RETRY_DELAY = 3
+CURL_TIMEOUT = 10
+
+AGENT_RE   = re.compile(r'^([0-9]+)-')
+INT_RE     = re.compile(r'^[0-9]+$')
+NON_DIGITS = re.compile(r'[^0-9]')
+
+# Texto crudo del API -> codigo numerico (mismas reglas que send_status_data.sh:
+# case-insensitive, por substring, la primera regla que coincide gana, 0 = otro)
+VALUE_RULES = {
+    "status":          [(re.compile(r'disconnect|desconectado', re.I), "2"),
+                        (re.compile(r'connected|conectado', re.I), "1")],
+    "platform":        [(re.compile(r'app', re.I), "1"),
+                        (re.compile(r'web', re.I), "2")],
+    "connection_type": [(re.compile(r'wifi', re.I), "1"),
+                        (re.compile(r'ethernet|cable|wired', re.I), "2")],
+}
+# campo del item -> campo del JSON de Wolkvox
+STATUS_SOURCE = (("status", "agent_status"), ("platform", "platform"),
+                 ("connection_type", "connection_type"), ("version", "version"))
+
+_memo = {}
+
+def map_value(field, raw):
+    """Codigo numerico (texto) de un valor crudo; memorizado por (campo, valor)."""
+    key = (field, raw)
+    code = _memo.get(key)
+    if code is None:
+        if field == "version":
+            code = NON_DIGITS.sub("", raw) or "0"
+        else:
+            code = next((c for rx, c in VALUE_RULES[field] if rx.search(raw)), "0")
+        _memo[key] = code
+    return code
+
+def _text(v):
+    """Mismo resultado que '. // "" | tostring' en jq."""
+    if v is None:
+        return ""
+    if isinstance(v, str):
+        return v
+    if isinstance(v, float) and v.is_integer():
+        return str(int(v))
+    return json.dumps(v)
+
+def fetch_payload():
+    """JSON de real_time.php?api=latency (con reintentos), o None si no hay agentes."""
+    cmd = ["curl", "-sS", "-m", str(CURL_TIMEOUT),
+           "-H", f"wolkvox_server: {WOLKVOX_SERVER}",
+           "-H", f"wolkvox-token: {WOLKVOX_TOKEN}", API_URL]
+    for attempt in range(1, MAX_RETRIES + 1):
+        try:
+            raw = subprocess.check_output(cmd, stderr=subprocess.DEVNULL, timeout=CURL_TIMEOUT + 5)
+            j = json.loads(raw.decode("utf-8", errors="ignore"))
+            if any(item.get("by_agent") for item in j.get("data", []) or []):
+                return j
+        except (subprocess.CalledProcessError, subprocess.TimeoutExpired, OSError, ValueError, AttributeError):
+            pass
+        if attempt < MAX_RETRIES:
+            print("[WARN] Reintentando...")
+            time.sleep(RETRY_DELAY)
+    return None
+
+def current_values(payload, families):
+    """
+    Una pasada sobre by_agent -> {familia: {clave_de_estado: valor}}.
+    Claves de estado compatibles con los scripts bash: "<codigo>" para
+    latencia/NR y "<codigo>_<campo>" para estado.
+    """
+    out = {f: {} for f in families}
+    want_lat, want_nr, want_st = "latency" in out, "nr" in out, "status" in out
+    for item in payload.get("data", []) or []:
+        for agent in item.get("by_agent", []) or []:
+            m = AGENT_RE.match(_text(agent.get("agent_id")))
+            if not m:
+                continue
+            code = m.group(1)
+            if want_lat:
+                v = _text(agent.get("latency_ms"))
+                out["latency"][code] = v if INT_RE.match(v) else "0"
+            if want_nr:
+                v = _text(agent.get("network_rejection"))
+                out["nr"][code] = v if INT_RE.match(v) else "0"
+            if want_st:
+                st = out["status"]
+                for field, src in STATUS_SOURCE:
+                    st[f"{code}_{field}"] = map_value(field, _text(agent.get(src)))
+    return out
+
+def item_key(family, statekey):
+    if family == "status":
+        code, field = statekey.split("_", 1)
+        return f"{WOLKVOX_OPERATION}.agent.{field}[{code}]"
+    return f"{WOLKVOX_OPERATION}.agent.{family}[{statekey}]"
+
+def send_and_commit(store, groups, now):
+    """
+    Envia cada grupo por chunks y guarda en el estado SOLO los chunks que el
+    trapper acepto completos (failed=0), en una transaccion por familia al final.
+    Zabbix no dice QUE valor fallo, asi que un chunk con rechazos queda sin
+    guardar y se reintenta entero en el proximo ciclo; por eso los grupos nunca
+    comparten chunk. Cada grupo es una lista de (familia, clave_de_estado,
+    item_key, valor). Devuelve (processed, failed, error).
+    """
+    accepted = {}
+    processed = failed = 0
+    error = None
+    try:
+        with ZabbixSender(ZBX_SERVER, ZBX_PORT) as zs:
+            chunks = [g[i:i + zs.chunk_size] for g in groups for i in range(0, len(g), zs.chunk_size)]
+            for chunk in chunks:
+                res = zs.send_chunk([(HOST_NAME, key, v) for _, _, key, v in chunk])
+                processed += res.processed
+                failed += res.failed
+                if res.failed == 0:
+                    for fam, statekey, _, v in chunk:
+                        accepted.setdefault(fam, {})[statekey] = v
+    except SenderError as e:
+        error = e
+    # Lo aceptado antes de un corte de conexion tambien se guarda
+    for fam, values in accepted.items():
+        store.commit(fam, values, clock=now)
+    return processed, failed, error
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--families", default=",".join(FAMILIES),
+                        help="Familias a enviar, separadas por coma (latency,nr,status)")
+    parser.add_argument("--dry-run", action="store_true", help="Muestra el lote sin enviar ni guardar estado")
+    parser.add_argument("--full", action="store_true", help="Reenvia todos los valores ignorando estado previo y deadband")
+    args = parser.parse_args()
+    families = [f for f in args.families.split(",") if f]
+    unknown = set(families) - set(FAMILIES)
+    if unknown:
+        parser.error(f"familias desconocidas: {', '.join(sorted(unknown))}")
+
+    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Iniciando monitor de agentes ({' + '.join(families)})...")
+    os.makedirs(BASE_DIR, exist_ok=True)
+    payload = fetch_payload()
+    if payload is None:
+        print("[ERR] Fallo al obtener agentes")
+        return 1
+    print("[OK] Agentes obtenidos")
+
+    store = StateStore(STATE_DB)
+    for fam in families:
+        n = store.import_json(fam, LEGACY_STATE_FILES[fam])
+        if n:
+            print(f"[INFO] Estado {fam} migrado desde {os.path.basename(LEGACY_STATE_FILES[fam])} ({n} claves)")
+
+    t0 = time.monotonic()
+    now = time.time()
+    current = current_values(payload, families)
+    try:
+        flt = ChangeFilter(parse_rules(SEND_RULES))
+    except ValueError as e:
+        print(f"[ERR] LATENCY_SEND_RULES invalido: {e}")
+        store.close()
+        return 1
+    known, fresh, changes = [], [], {}
+    for fam in families:
+        last = store.load_with_clock(fam)
+        changed = current[fam] if args.full else flt.select(fam, current[fam], last, now)
+        for k, v in sorted(changed.items()):
+            (known if k in last else fresh).append((fam, k, item_key(fam, k), v))
+        changes[fam] = len(changed)
+    # Las claves ya aceptadas alguna vez y las nuevas (agentes que quiza todavia no
+    # tienen item) van en chunks separados, para que un rechazo no frene al resto
+    batch = known + fresh
+    agents = len({k.split("_", 1)[0] for fam in families for k in current[fam]})
+    print("")
+    print(f"[INFO] Total: {agents} agentes | A enviar: "
+          + " ".join(f"{f}={changes[f]}" for f in families)
+          + f" | mapeo: {(time.monotonic() - t0) * 1000:.1f} ms")
+    if not args.full:
+        for fam in families:
+            print(f"  {flt.summary(fam)}")
+
+    if args.dry_run:
+        for _, _, key, v in batch:
+            print(f"{HOST_NAME} {key} {v}")
+        store.close()
+        return 0
+
+    rc = 0
+    if batch:
+        print(f"[INFO] Enviando {len(batch)} items...")
+        processed, failed, error = send_and_commit(store, [known, fresh], now)
+        print(f"[RESULT] processed={processed} failed={failed}")
+        if failed:
+            print(f"[WARN] Hay {failed} items rechazados (probablemente agentes sin item creado). Corre sync_agents.sh")
+        if error:
+            print(f"[ERR] {error}")
+            rc = 2
+    else:
+        print("[INFO] Sin cambios")
+    store.close()
+
+    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Fin")
+    return rc
+
+if __name__ == "__main__":
+    sys.exit(main())
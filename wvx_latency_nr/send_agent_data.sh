@@ -0,0 +1,15 @@
+#!/usr/bin/env bash
+# Poller unificado: UNA sola consulta a real_time.php?api=latency por ciclo y de
+# esa misma respuesta salen las tres familias de métricas por agente:
+#   latencia  -> {OP}.agent.latency[CODIGO]
+#   NR        -> {OP}.agent.nr[CODIGO]
+#   estado    -> {OP}.agent.{status,platform,connection_type,version}[CODIGO]
+# Todo se envía en un único lote al trapper. Reemplaza en cron a
+# send_latency_data.sh + send_nr_data.sh + send_status_data.sh. El estado vive
+# en agent_state.sqlite (zbx_common/state_store.py); en la primera corrida se
+# importan los agent_*_state.json de esos scripts, así que pasar de un esquema
+# al otro no provoca un reenvío masivo.
+#
+# La lógica vive en send_agent_data.py; este wrapper conserva la ruta del cron
+# que instala install_zabbix.sh. Acepta --families, --dry-run y --full.
+exec python3 "$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)/send_agent_data.py" "$@"
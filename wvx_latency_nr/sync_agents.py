@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# Sync nocturno de agentes Wolkvox en UN solo proceso (lo llama sync_agents.sh).
+#
+# Antes sync_agents.sh corria en serie create_latency_items.py,
+# create_nr_items.py, create_status_items.py y bulk_grafana_agent_panels.py:
+# cuatro logins, cuatro host.get, tres curl a Wolkvox con la misma lista de
+# agentes y un item.get completo mas para el tablero. Aca:
+#   1. un login (zbx_common/zbx_api.py), un host.get, UN fetch a Wolkvox y UN
+#      item.get (paginado) de todos los items de la operacion;
+#   2. las tres familias se sincronizan en paralelo (ThreadPoolExecutor) sobre
+#      el mismo cliente, cada una con su sync() de siempre;
+#   3. los itemids resultantes (existentes + recien creados) van directo a
+#      bulk_grafana_agent_panels.main(), sin volver a leer Zabbix.
+# El tiempo total pasa a ser el del paso mas largo, no la suma.
+#
+# La salida de cada paso se junta por hilo y se imprime entera al terminar ese
+# paso, asi el log no queda intercalado. Los scripts individuales siguen
+# funcionando solos como antes.
+#
+# Uso: sync_agents.py [--skip-grafana] [--workers N] [--grafana-args "--relayout"]
+import argparse, os, shlex, sys, time
+from concurrent.futures import ThreadPoolExecutor
+
+import create_latency_items
+import create_nr_items
+import create_status_items
+import bulk_grafana_agent_panels
+
+# zbx_common/ ya quedo en sys.path al importar los create_*
+from zbx_api import ZabbixAPI
+from fleet import ThreadOutput
+
+# (nombre, modulo, prefijo de key_ que le corresponde)
+STEPS = [
+    ("latency", create_latency_items, ".agent.latency["),
+    ("nr",      create_nr_items,      ".agent.nr["),
+    ("status",  create_status_items,  tuple(f".agent.{f}[" for f, *_ in create_status_items.FIELDS)),
+]
+
+def run_step(out, name, module, auth, hostid, agents, existing):
+    out.capture()
+    t0 = time.monotonic()
+    try:
+        res, rc = module.sync(auth, hostid, agents, existing), 0
+    except Exception as e:
+        res, rc = None, 1
+        print(f"  [ERR] {type(e).__name__}: {e}")
+    return name, rc, res, time.monotonic() - t0, out.release()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--workers", type=int, default=len(STEPS), help="Hilos para los syncs de items")
+    parser.add_argument("--skip-grafana", action="store_true", help="Solo items, sin regenerar el tablero")
+    parser.add_argument("--grafana-args", default="", help="Argumentos extra para bulk_grafana_agent_panels.py")
+    args = parser.parse_args()
+
+    t_start = time.monotonic()
+    zapi = ZabbixAPI(create_latency_items.ZBX_URL, user=create_latency_items.ZBX_USER,
+                     password=create_latency_items.ZBX_PASS,
+                     token=os.environ.get("ZBX_API_TOKEN", ""),
+                     verify=False, pool_size=max(args.workers, 1) + 1)
+    # Todos los modulos hablan con Zabbix por el mismo cliente (misma sesion y pool)
+    for mod in (create_latency_items, create_nr_items, create_status_items, bulk_grafana_agent_panels):
+        mod.zapi = zapi
+
+    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] === SYNC AGENTES (orquestado) ===")
+    print("[1/4] Autenticando en Zabbix...")
+    auth = zapi.login()
+    hostid = create_latency_items.get_hostid(auth)
+    print(f"  OK - Host ID: {hostid}")
+
+    print("[2/4] Obteniendo agentes de Wolkvox e items existentes...")
+    agents = create_latency_items.fetch_agents()
+    print(f"  OK - {len(agents)} agentes encontrados")
+    op = create_latency_items.WOLKVOX_OPERATION
+    prefixes = [f"{op}.agent.{f}[" for f in bulk_grafana_agent_panels.STATUS_FIELDS]
+    output = ["itemid", "key_", "name", "type", "value_type", "units", "history", "trends", "valuemapid"]
+    existing = {it["key_"]: it for page in bulk_grafana_agent_panels.zbx_item_pages(auth, hostid, prefixes, output)
+                for it in page}
+    print(f"  OK - {len(existing)} items de la operacion")
+
+    print(f"[3/4] Sincronizando items ({len(STEPS)} pasos, {args.workers} hilos)...")
+    out = ThreadOutput(sys.stdout)
+    sys.stdout = out
+    results = {}
+    try:
+        with ThreadPoolExecutor(max_workers=max(args.workers, 1)) as pool:
+            futures = []
+            for name, module, suffix in STEPS:
+                suffixes = suffix if isinstance(suffix, tuple) else (suffix,)
+                mine = {k: it for k, it in existing.items() if any(k.startswith(op + s) for s in suffixes)}
+                futures.append(pool.submit(run_step, out, name, module, auth, hostid, agents, mine))
+            for fut in futures:
+                name, rc, res, elapsed, log = fut.result()
+                results[name] = (rc, res)
+                print(f">>> {name} ({elapsed:.1f}s, exit={rc})\n{log}", end="")
+    finally:
+        sys.stdout = out.stream
+
+    rc_grafana = "-"
+    if args.skip_grafana:
+        print("[4/4] Grafana omitido (--skip-grafana)")
+    else:
+        print("[4/4] Regenerando paneles de Grafana...")
+        # Items de la operacion tal como quedaron: los existentes + lo creado/renombrado ahora
+        items = {k: {"itemid": it["itemid"], "name": it["name"]} for k, it in existing.items()}
+        for rc, res in results.values():
+            if res:
+                items.update(res["items"])
+        grafana_agents = bulk_grafana_agent_panels.agents_from_items(
+            {"key_": k, **v} for k, v in items.items())
+        try:
+            bulk_grafana_agent_panels.main(shlex.split(args.grafana_args), agents=grafana_agents)
+            rc_grafana = 0
+        except Exception as e:
+            print(f"[ERR] Grafana: {type(e).__name__}: {e}")
+            rc_grafana = 1
+
+    summary = " ".join(f"{name}={results[name][0]}" for name, *_ in STEPS)
+    print(f"API: {zapi.summary()}")
+    print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] FIN SYNC AGENTES ({summary} grafana={rc_grafana}) "
+          f"en {time.monotonic() - t_start:.1f}s")
+    return 1 if any(rc for rc, _ in results.values()) or rc_grafana == 1 else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
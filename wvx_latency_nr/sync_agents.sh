@@ -1,5 +1,6 @@
 #!/usr/bin/env bash
-# Sincroniza items de agentes Wolkvox en Zabbix (latencia + network rejection)
+# Sincroniza items de agentes Wolkvox en Zabbix (latencia, network rejection y
+# estado) y regenera los paneles de Grafana
 # Ejecutar diariamente a las 01:00 vía cron
 
 set -uo pipefail
@@ -23,31 +24,13 @@ mkdir -p "$LOG_DIR"
   echo "========================================================"
 
   echo ""
-  echo ">>> Sincronizando items de LATENCIA..."
-  /usr/bin/python3 "${SCRIPTS_DIR}/create_latency_items.py"
-  RC1=$?
-  echo ">>> Exit code latency: $RC1"
-
-  echo ""
-  echo ">>> Sincronizando items de NETWORK REJECTION..."
-  /usr/bin/python3 "${SCRIPTS_DIR}/create_nr_items.py"
-  RC2=$?
-  echo ">>> Exit code NR: $RC2"
-
-  echo ""
-  echo ">>> Sincronizando items de STATUS/CONNECTION..."
-  /usr/bin/python3 "${SCRIPTS_DIR}/create_status_items.py"
-  RC4=$?
-  echo ">>> Exit code status: $RC4"
-
-  echo ""
-  echo ">>> Regenerando paneles de Grafana..."
-  /usr/bin/python3 "${SCRIPTS_DIR}/bulk_grafana_agent_panels.py"
-  RC3=$?
-  echo ">>> Exit code Grafana: $RC3"
-
-  echo ""
-  echo "[$(date '+%Y-%m-%d %H:%M:%S')] FIN SYNC AGENTES (latency=$RC1 nr=$RC2 status=$RC4 grafana=$RC3)"
+  # Un solo proceso: un login/fetch y los tres syncs de items en paralelo,
+  # despues Grafana con los itemids ya resueltos (ver sync_agents.py).
+  # SYNC_AGENTS_ARGS permite p. ej. --skip-grafana o --grafana-args "--relayout".
+  # shellcheck disable=SC2086
+  /usr/bin/python3 "${SCRIPTS_DIR}/sync_agents.py" ${SYNC_AGENTS_ARGS:-}
+  RC=$?
+  echo ">>> Exit code sync: $RC"
 } >> "$LOG_FILE" 2>&1
 
 # Rotación simple: si log > 5MB, lo trunca dejando últimas 1000 líneas
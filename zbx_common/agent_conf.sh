@@ -0,0 +1,141 @@
+# shellcheck shell=bash
+# Include propio del agente Zabbix para los generadores bulk_*_scripts.sh
+# (se carga con "source"; usa ZABBIX_CONF del script que lo carga).
+#
+# Antes cada generador hacia, por peer, un grep -Fq sobre TODO
+# zabbix_agentd.conf y un printf >> de su UserParameter (cuadratico con miles
+# de peers), dejaba un .bak con fecha en cada corrida y reiniciaba el agente
+# siempre. Ahora cada generador es dueño de UN archivo en zabbix_agentd.d/:
+#
+#   agent_conf_ensure_include      Include=<dir>/*.conf en zabbix_agentd.conf (una vez)
+#   agent_conf_write <nombre> <f>  rearma <dir>/<nombre> con el contenido de <f>
+#                                  (armado en memoria con el set de peers): tmp +
+#                                  mv atomico, y solo si el contenido cambio
+#   agent_conf_adopt <f>           saca de zabbix_agentd.conf las keys que ahora
+#                                  viven en <f> (las dejaron versiones anteriores;
+#                                  con keys duplicadas el agente no arranca)
+#   agent_reload                   zabbix_agentd -R userparameter_reload si solo
+#                                  cambio el include; reinicio si cambio el .conf
+#                                  principal o no hay control en caliente
+#
+# Backup (.bak con fecha) solo cuando de verdad se modifica zabbix_agentd.conf.
+
+ZABBIX_AGENTD_DIR="${ZABBIX_AGENTD_DIR:-/etc/zabbix/zabbix_agentd.d}"
+AGENT_CONF_CHANGED=0        # 1 = cambio algun include
+AGENT_CONF_MAIN_CHANGED=0   # 1 = cambio zabbix_agentd.conf (pide reinicio)
+
+# Reemplaza <destino> por <nuevo> de forma atomica, conservando dueño y permisos
+_agent_conf_replace() {
+  local dest="$1" new="$2" tmp
+  tmp="$(mktemp "${dest}.XXXXXX")"
+  cat "$new" > "$tmp"
+  if [[ -e "$dest" ]]; then
+    chmod --reference="$dest" "$tmp" 2>/dev/null || chmod 644 "$tmp"
+    chown --reference="$dest" "$tmp" 2>/dev/null || true
+  else
+    chmod 644 "$tmp"
+  fi
+  mv -f "$tmp" "$dest"
+}
+
+_agent_conf_backup() {
+  cp -a "$ZABBIX_CONF" "${ZABBIX_CONF}.bak.$(date +%Y%m%d%H%M%S)"
+}
+
+# Keys de las lineas UserParameter de un archivo, una por linea
+_agent_conf_keys() {
+  awk '/^[[:space:]]*UserParameter[[:space:]]*=/ {
+         sub(/^[[:space:]]*UserParameter[[:space:]]*=[[:space:]]*/, "")
+         sub(/[[:space:]]*,.*$/, "")
+         print
+       }' "$1" 2>/dev/null | sort -u
+}
+
+agent_conf_ensure_include() {
+  mkdir -p "$ZABBIX_AGENTD_DIR"
+  if grep -Eq "^[[:space:]]*Include[[:space:]]*=[[:space:]]*${ZABBIX_AGENTD_DIR}/?(\*\.conf)?[[:space:]]*$" "$ZABBIX_CONF"; then
+    return 0
+  fi
+  _agent_conf_backup
+  printf "\nInclude=%s/*.conf\n" "$ZABBIX_AGENTD_DIR" >> "$ZABBIX_CONF"
+  AGENT_CONF_MAIN_CHANGED=1
+  echo "Añadido Include=${ZABBIX_AGENTD_DIR}/*.conf a ${ZABBIX_CONF}"
+}
+
+agent_conf_write() {
+  local name="$1" content="$2" dest added removed
+  dest="${ZABBIX_AGENTD_DIR}/${name}"
+  if [[ -f "$dest" ]] && cmp -s "$content" "$dest"; then
+    echo "${dest}: $(_agent_conf_keys "$dest" | wc -l) UserParameters, sin cambios."
+    return 0
+  fi
+  added="$(comm -13 <(_agent_conf_keys "$dest") <(_agent_conf_keys "$content") | wc -l)"
+  removed="$(comm -23 <(_agent_conf_keys "$dest") <(_agent_conf_keys "$content") | wc -l)"
+  _agent_conf_replace "$dest" "$content"
+  AGENT_CONF_CHANGED=1
+  echo "${dest}: $(_agent_conf_keys "$dest" | wc -l) UserParameters (+${added} -${removed})."
+}
+
+agent_conf_adopt() {
+  local content="$1" keys tmp n
+  keys="$(mktemp)"; tmp="$(mktemp)"
+  _agent_conf_keys "$content" > "$keys"
+  # Una sola pasada por zabbix_agentd.conf con las keys en un hash de awk
+  awk -v removed_file="${tmp}.n" '
+    NR == FNR { own[$0] = 1; next }
+    /^[[:space:]]*UserParameter[[:space:]]*=/ {
+      k = $0
+      sub(/^[[:space:]]*UserParameter[[:space:]]*=[[:space:]]*/, "", k)
+      sub(/[[:space:]]*,.*$/, "", k)
+      if (k in own) { n++; next }
+    }
+    { print }
+    END { print n + 0 > removed_file }
+  ' "$keys" "$ZABBIX_CONF" > "$tmp"
+  n="$(cat "${tmp}.n")"
+  if [[ "$n" -gt 0 ]]; then
+    _agent_conf_backup
+    _agent_conf_replace "$ZABBIX_CONF" "$tmp"
+    AGENT_CONF_MAIN_CHANGED=1
+    echo "Movidos ${n} UserParameters de ${ZABBIX_CONF} al include."
+  fi
+  rm -f "$keys" "$tmp" "${tmp}.n"
+}
+
+agent_restart() {
+  if command -v systemctl >/dev/null 2>&1; then
+    if systemctl list-unit-files | grep -q '^zabbix-agent2\.service'; then
+      systemctl restart zabbix-agent2 || true
+    elif systemctl list-unit-files | grep -q '^zabbix-agent\.service'; then
+      systemctl restart zabbix-agent || true
+    else
+      service zabbix-agent restart || service zabbix-agent2 restart || true
+    fi
+  else
+    service zabbix-agent restart || service zabbix-agent2 restart || true
+  fi
+}
+
+agent_reload() {
+  if [[ $AGENT_CONF_MAIN_CHANGED -eq 1 ]]; then
+    echo "Reiniciando agente Zabbix (cambió ${ZABBIX_CONF})..."
+    agent_restart
+    return 0
+  fi
+  if [[ $AGENT_CONF_CHANGED -eq 0 ]]; then
+    echo "UserParameters sin cambios: no hace falta recargar el agente."
+    return 0
+  fi
+  # Recarga en caliente de los UserParameters (Zabbix >= 5.0); si no hay
+  # control en caliente (agente viejo o no corriendo), reinicio clasico
+  if command -v zabbix_agentd >/dev/null 2>&1 && \
+      zabbix_agentd -c "$ZABBIX_CONF" -R userparameter_reload >/dev/null 2>&1; then
+    echo "UserParameters recargados (zabbix_agentd -R userparameter_reload)."
+  elif command -v zabbix_agent2 >/dev/null 2>&1 && \
+      zabbix_agent2 -R userparameter_reload >/dev/null 2>&1; then
+    echo "UserParameters recargados (zabbix_agent2 -R userparameter_reload)."
+  else
+    echo "Sin recarga en caliente disponible: reiniciando agente Zabbix..."
+    agent_restart
+  fi
+}
@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""
+Lectura y parseo en streaming de las salidas de "asterisk -rx".
+
+Antes cada script hacia check_output (TODA la salida en memoria, bytes +
+texto), strip_ansi() con una regex sin compilar sobre el texto completo y
+despues re.match linea por linea, cada uno con sus propias reglas. Con
+decenas de miles de peers eso son varias copias de la salida en RAM y no se
+parsea nada hasta que el CLI termina de escribir.
+
+Aca la salida se lee del pipe linea por linea (asterisk_lines) y cada parser
+es un generador que recibe cualquier iterable de lineas (el pipe, un archivo
+abierto, text.splitlines()) y devuelve registros tipados a medida que los
+completa:
+
+    sip_peers(lines)         "sip show peers"              -> SipPeer
+    pjsip_endpoints(lines)   "pjsip show endpoints"        -> PjsipEndpoint
+                             "pjsip show endpoint <ep>"       (uno por Endpoint:)
+    channels(lines)          "core show channels concise"  -> Channel
+    channel_owners(lines)    idem, solo el owner (para contar canales por peer)
+
+Cada linea se reconoce con UNA prueba precompilada por parser (ver
+PATRONES): cabeceras, pies ("N sip peers [Monitored: ...]", "Objects found:
+N"), separadores "====" y lineas plantilla ("Endpoint:  <Endpoint/CID...>")
+se descartan en la misma pasada, sin pre-procesar el texto. Las reglas de
+nombre y RTT son las de siempre (las mismas que los scripts por peer), asi
+que los valores no cambian.
+
+Uso:
+    for peer in ast_cli.sip_peers(ast_cli.asterisk_lines("sip show peers")):
+        print(peer.name, peer.rtt)
+"""
+import re, subprocess, threading
+from collections import deque, namedtuple
+
+ASTERISK_BIN = "/usr/sbin/asterisk"
+TAIL_LINES = 5   # lineas que se guardan para el mensaje de error
+
+# ================== REGISTROS ==================
+# rtt: ms (int) si el peer esta OK/LAGGED, None si no
+SipPeer = namedtuple("SipPeer", "name username host status rtt")
+# rtt: MINIMO RTT (texto, tal cual lo imprime Asterisk) de sus Contact
+# disponibles, None si ninguno; contacts: cantidad de lineas Contact
+PjsipEndpoint = namedtuple("PjsipEndpoint", "name cid state contacts rtt")
+# owner: canal sin el sufijo "-<id>" ("SIP/Telmex_New", "PJSIP/1001", "Local/2000@ctx")
+Channel = namedtuple("Channel", "name owner context exten state application duration bridged")
+
+# ================== PATRONES ==================
+ANSI_RE = re.compile(r'\x1B\[[0-?]*[ -/]*[@-~]')
+# "sip show peers": cabecera "Name/username ...", pie "N sip peers [Monitored:
+# ...]" (sin "/" en la primera columna) y filas "nombre/usuario host ... estado"
+SIP_HEADER = "name/username"
+SIP_MS_RE = re.compile(r'\((\d+)\s*ms\)')
+SIP_STATES = ("UNREACHABLE", "UNKNOWN", "Unmonitored")   # estados sin "(N ms)"
+# "pjsip show endpoint(s)": solo importan "Endpoint:" y "Contact:"; el resto
+# (Aor, InAuth, Transport, Identify, Channel, "====", "Objects found", la
+# tabla ParameterName de un solo endpoint) no matchea y se salta con este
+# unico match. La plantilla de cabecera ("Endpoint:  <Endpoint/CID...>",
+# "Contact:  <Aor/ContactUri...>") es la que trae "<" en el primer campo.
+PJSIP_LINE_RE = re.compile(r'\s*(Endpoint|Contact):\s+(\S+)')
+RTT_RE      = re.compile(r'RTT:\s*([0-9]+(?:\.[0-9]+)?)')
+NUMBER_RE   = re.compile(r'^[0-9]+(?:\.[0-9]+)?$')
+
+# ================== LECTURA ==================
+def asterisk_lines(command, asterisk_bin=ASTERISK_BIN, prefix=(), timeout=None, check=True):
+    """
+    Lineas (sin fin de linea ni codigos ANSI) de '<prefix> asterisk -rx
+    <command>' a medida que el CLI las escribe. <prefix> sirve para sudo:
+    ("/usr/bin/sudo", "-n", "-u", "asterisk").
+
+    stderr va al mismo pipe, como en los check_output de antes. Si el
+    consumidor deja de iterar (break), el proceso se mata. Al terminar de
+    leer: subprocess.TimeoutExpired si pasaron <timeout> segundos (el proceso
+    se mata al vencer) y, con check, CalledProcessError si asterisk salio con
+    error, con las ultimas lineas en .output ("Unable to connect to remote
+    asterisk...").
+    """
+    argv = list(prefix) + [asterisk_bin, "-rx", command]
+    proc = subprocess.Popen(argv, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    tail = deque(maxlen=TAIL_LINES)
+    expired = []
+    timer = None
+    if timeout:
+        timer = threading.Timer(timeout, lambda: (expired.append(True), proc.kill()))
+        timer.start()
+    finished = False
+    try:
+        for raw in proc.stdout:
+            line = raw.decode("utf-8", errors="ignore").rstrip("\r\n")
+            if "\x1b" in line:
+                line = ANSI_RE.sub("", line)
+            tail.append(line)
+            yield line
+        finished = True
+    finally:
+        if not finished and proc.poll() is None:
+            proc.kill()
+        proc.stdout.close()
+        rc = proc.wait()
+        if timer:
+            timer.cancel()
+    if expired:
+        raise subprocess.TimeoutExpired(argv, timeout)
+    if check and rc:
+        raise subprocess.CalledProcessError(rc, argv, output="\n".join(tail))
+
+def _lines(source):
+    """Acepta texto completo o cualquier iterable de lineas."""
+    if isinstance(source, str):
+        return source.splitlines()
+    return source
+
+# ================== PARSERS ==================
+# Cada parser reconoce cada linea con UNA prueba barata y precompilada (la
+# linea de datos es el caso comun: cabeceras, pies y plantillas caen solas)
+def sip_peers(lines):
+    """
+    'sip show peers' -> SipPeer por fila. Solo filas con "nombre/usuario" en
+    la primera columna, como siempre lo exigieron los scripts.
+    """
+    ms = SIP_MS_RE.search
+    for line in _lines(lines):
+        parts = line.split(None, 2)
+        if not parts or "/" not in parts[0]:
+            continue
+        first = parts[0]
+        if first.lower() == SIP_HEADER:
+            continue
+        name, _, username = first.partition("/")
+        if not name:
+            continue
+        m = ms(line)
+        if m:
+            status, rtt = line[:m.start()].split()[-1], int(m.group(1))
+        else:
+            status, rtt = next((st for st in SIP_STATES if st in line), ""), None
+        yield SipPeer(name, username, parts[1] if len(parts) > 1 else "", status, rtt)
+
+def contact_rtt(line):
+    """RTT (texto) de una linea Contact, o None si no trae RTT utilizable."""
+    # Pruebas de substring antes de las regex: la mayoria de los Contact no traen "RTT:"
+    if "RTT:" in line:
+        m = RTT_RE.search(line)
+        if m:
+            return m.group(1)
+    if "avail" in line.lower():
+        for tok in reversed(line.split()):
+            if NUMBER_RE.match(tok):
+                return tok
+    return None
+
+def pjsip_endpoints(lines):
+    """
+    'pjsip show endpoints' / 'pjsip show endpoint <ep>' -> PjsipEndpoint por
+    bloque "Endpoint:". Un endpoint sale cuando empieza el siguiente (o al
+    final), ya con el minimo RTT de sus Contact.
+    """
+    match = PJSIP_LINE_RE.match
+    current = None
+    for line in _lines(lines):
+        m = match(line)
+        if not m or m.group(2)[0] == "<":
+            continue
+        if m.group(1) == "Endpoint":
+            if current:
+                yield PjsipEndpoint(*current)
+            name, _, cid = m.group(2).partition("/")
+            # "Not in use    0 of inf" -> estado sin el conteo de canales
+            rest = line[m.end():].rsplit(None, 3)
+            state = rest[0].strip() if len(rest) == 4 and rest[2] == "of" else " ".join(rest)
+            current = [name, cid, state, 0, None]
+        elif current is not None:
+            current[3] += 1
+            val = contact_rtt(line)
+            if val is not None and (current[4] is None or float(val) < float(current[4])):
+                current[4] = val
+    if current:
+        yield PjsipEndpoint(*current)
+
+def channel_owners(lines):
+    """
+    'core show channels concise' -> solo el owner de cada canal. Para contar
+    canales por peer alcanza y evita partir la linea entera y armar el registro.
+    """
+    for line in _lines(lines):
+        if "!" in line:
+            yield line.split("!", 1)[0].rsplit("-", 1)[0]
+
+def channels(lines):
+    """'core show channels concise' -> Channel por linea con campos "!"."""
+    for line in _lines(lines):
+        if "!" not in line:
+            continue
+        f = line.split("!")
+        if len(f) < 13:
+            f += [""] * (13 - len(f))
+        yield Channel(f[0], f[0].rsplit("-", 1)[0], f[1], f[2], f[4], f[5], f[11], f[12])
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Supresion de cambios para valores trapper: deadband + heartbeat.
+
+Decide, por familia de metrica, si un valor nuevo merece enviarse comparando
+contra el ULTIMO VALOR ENVIADO (no el ultimo leido, asi una deriva lenta
+termina saliendo igual):
+
+  abs=N        no enviar si |nuevo - enviado| <= N
+  rel=F        no enviar si |nuevo - enviado| <= F * |enviado|   (0.1 = 10%)
+               (con abs y rel juntos manda el mayor de los dos margenes)
+  heartbeat=S  enviar igual si pasaron >= S segundos desde el ultimo envio,
+               aunque el valor no haya cambiado: un valor estatico sigue
+               llegando y nodata(<S + ciclo>) distingue "sin cambios" de
+               "recolector caido"
+
+Sin abs/rel la comparacion es exacta (textos, codigos de estado). Valores no
+numericos siempre se comparan exacto.
+
+Las reglas se escriben como texto, p. ej. en el .env:
+    "latency:abs=10,rel=0.2,heartbeat=1800;nr:heartbeat=1800;*:heartbeat=3600"
+donde "*" aplica a las familias sin regla propia.
+"""
+import time
+
+SEND_NEW = "new"              # nunca enviado
+SEND_CHANGED = "changed"      # fuera del deadband
+SEND_HEARTBEAT = "heartbeat"  # dentro del deadband pero vencio el heartbeat
+
+class Rule(object):
+    """Deadband absoluto/relativo y heartbeat de una familia."""
+
+    def __init__(self, abs_=0.0, rel=0.0, heartbeat=0):
+        self.abs = float(abs_)
+        self.rel = float(rel)
+        self.heartbeat = int(heartbeat)
+
+    def __repr__(self):
+        return f"Rule(abs={self.abs:g}, rel={self.rel:g}, heartbeat={self.heartbeat})"
+
+    def within_deadband(self, value, sent):
+        if value == sent:
+            return True
+        if not (self.abs or self.rel):
+            return False
+        try:
+            v, s = float(value), float(sent)
+        except (TypeError, ValueError):
+            return False
+        return abs(v - s) <= max(self.abs, self.rel * abs(s))
+
+def parse_rules(spec):
+    """'fam:abs=1,rel=0.1,heartbeat=600;otra:heartbeat=60' -> {fam: Rule}."""
+    rules = {}
+    for part in (spec or "").split(";"):
+        part = part.strip()
+        if not part:
+            continue
+        fam, _, opts = part.partition(":")
+        kw = {}
+        for opt in opts.split(","):
+            opt = opt.strip()
+            if not opt:
+                continue
+            k, _, v = opt.partition("=")
+            k = k.strip()
+            if k not in ("abs", "rel", "heartbeat"):
+                raise ValueError(f"opcion desconocida '{k}' en la regla '{part}'")
+            kw["abs_" if k == "abs" else k] = float(v)
+        rules[fam.strip()] = Rule(**kw)
+    return rules
+
+class ChangeFilter(object):
+    """Aplica las reglas por familia y lleva la cuenta de lo enviado/suprimido."""
+
+    def __init__(self, rules=None):
+        self.rules = rules or {}
+        self.default = self.rules.get("*", Rule())
+        self.stats = {}
+
+    def rule(self, family):
+        return self.rules.get(family, self.default)
+
+    def check(self, family, value, sent=None, sent_at=None, now=None):
+        """
+        Motivo para enviar (SEND_NEW / SEND_CHANGED / SEND_HEARTBEAT) o None si
+        el valor se suprime. <sent>/<sent_at> son el ultimo valor enviado y su
+        epoch (None si nunca se envio).
+        """
+        st = self.stats.setdefault(family, {SEND_NEW: 0, SEND_CHANGED: 0, SEND_HEARTBEAT: 0, "suppressed": 0})
+        if sent is None:
+            reason = SEND_NEW
+        else:
+            r = self.rule(family)
+            if not r.within_deadband(value, sent):
+                reason = SEND_CHANGED
+            elif r.heartbeat and sent_at is not None and \
+                    (now if now is not None else time.time()) - sent_at >= r.heartbeat:
+                reason = SEND_HEARTBEAT
+            else:
+                reason = None
+        st[reason or "suppressed"] += 1
+        return reason
+
+    def select(self, family, current, last, now=None):
+        """
+        {clave: valor} actual + {clave: (valor_enviado, enviado_en)} ->
+        {clave: valor} a enviar segun las reglas de la familia.
+        """
+        now = now if now is not None else time.time()
+        out = {}
+        for k, v in current.items():
+            sent, sent_at = last.get(k, (None, None))
+            if self.check(family, v, sent, sent_at, now):
+                out[k] = v
+        return out
+
+    def summary(self, family):
+        st = self.stats.get(family)
+        if not st:
+            return f"{family}: sin datos"
+        return (f"{family}: nuevos={st[SEND_NEW]} cambios={st[SEND_CHANGED]} "
+                f"heartbeat={st[SEND_HEARTBEAT]} suprimidos={st['suppressed']}")
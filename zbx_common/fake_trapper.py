@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Trapper de Zabbix falso para probar zbx_sender.py (y zabbix_sender) sin servidor.
+
+Acepta requests "sender data", imprime cada valor recibido (o lo agrega a
+--record como JSON por linea) y responde con el mismo formato que
+zabbix_server: "processed: N; failed: N; total: N; seconds spent: S".
+Las claves que coinciden con --reject se cuentan como failed, igual que un
+item inexistente o que no es trapper.
+
+Por defecto cierra la conexion despues de cada respuesta, como zabbix_server;
+con --keepalive la deja abierta para varios lotes (como un proxy/pipeline).
+
+Uso:
+  fake_trapper.py [--port 10051] [--reject 'REGEX'] [--keepalive] [--record valores.jsonl]
+
+Ejemplo:
+  python3 fake_trapper.py --port 10151 --reject 'nr\\[' &
+  printf 'h k1 1\\nh agent.nr[5] 2\\n' | python3 zbx_sender.py -z 127.0.0.1 -p 10151 -i -
+"""
+import argparse, json, re, socketserver, struct, sys, threading, time, zlib
+
+from zbx_sender import FLAG_COMPRESSED, FLAG_LARGE, ZBX_HEADER, pack
+
+class TrapperHandler(socketserver.BaseRequestHandler):
+
+    def read_request(self):
+        head = self._recv(5)
+        if not head:
+            return None
+        if head[:4] != ZBX_HEADER:
+            raise ValueError(f"cabecera invalida: {head!r}")
+        if head[4] & FLAG_LARGE:
+            datalen, _ = struct.unpack("<QQ", self._recv(16))
+            self.size = 21 + datalen
+        else:
+            datalen, _ = struct.unpack("<II", self._recv(8))
+            self.size = 13 + datalen
+        body = self._recv(datalen)
+        if head[4] & FLAG_COMPRESSED:
+            body = zlib.decompress(body)
+        return json.loads(body.decode("utf-8"))
+
+    def _recv(self, n):
+        buf = bytearray()
+        while len(buf) < n:
+            chunk = self.request.recv(n - len(buf))
+            if not chunk:
+                if buf:
+                    raise ValueError("request truncado")
+                return b""
+            buf.extend(chunk)
+        return bytes(buf)
+
+    def handle(self):
+        srv = self.server
+        while True:
+            try:
+                req = self.read_request()
+            except (ValueError, OSError) as e:
+                print(f"[ERR] {self.client_address[0]}: {e}", flush=True)
+                return
+            if req is None:
+                return
+            t0 = time.monotonic()
+            data = req.get("data", []) if req.get("request") == "sender data" else []
+            failed = sum(1 for d in data if srv.reject and srv.reject.search(d.get("key", "")))
+            with srv.lock:
+                srv.requests += 1
+                srv.values += len(data)
+                srv.failed += failed
+                srv.bytes += self.size
+                for d in data:
+                    if srv.record:
+                        srv.record.write(json.dumps(d, ensure_ascii=False) + "\n")
+                    elif not srv.quiet:
+                        print(f"{d.get('host')} {d.get('key')} {d.get('value')} "
+                              f"{d.get('clock', '-')}.{d.get('ns', 0):09d}", flush=True)
+                if srv.record:
+                    srv.record.flush()
+            info = (f"processed: {len(data) - failed}; failed: {failed}; total: {len(data)}; "
+                    f"seconds spent: {time.monotonic() - t0:.6f}")
+            self.request.sendall(pack({"response": "success", "info": info}))
+            if not srv.keepalive:
+                return
+
+class FakeTrapper(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, reject=None, keepalive=False, record=None, quiet=False):
+        super().__init__(address, TrapperHandler)
+        self.lock = threading.Lock()
+        self.reject = re.compile(reject) if reject else None
+        self.keepalive = keepalive
+        self.record = open(record, "a", encoding="utf-8") if record else None
+        self.quiet = quiet
+        self.requests = self.values = self.failed = self.bytes = 0
+
+    def stats(self):
+        """Contadores desde el arranque (bytes = requests completos, cabecera incluida)."""
+        with self.lock:
+            return {"requests": self.requests, "values": self.values, "failed": self.failed,
+                    "accepted": self.values - self.failed, "bytes": self.bytes}
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=10051)
+    parser.add_argument("--reject", help="Regex de claves a contar como failed")
+    parser.add_argument("--keepalive", action="store_true", help="No cerrar la conexion tras cada respuesta")
+    parser.add_argument("--record", help="Archivo JSONL donde registrar los valores recibidos")
+    parser.add_argument("--quiet", action="store_true", help="No imprimir cada valor")
+    args = parser.parse_args()
+
+    server = FakeTrapper((args.host, args.port), args.reject, args.keepalive, args.record, args.quiet)
+    print(f"Trapper falso en {args.host}:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(f"requests: {server.requests} | valores: {server.values} | failed: {server.failed} "
+              f"| bytes: {server.bytes}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,535 @@
+#!/usr/bin/env python3
+"""
+API JSON-RPC de Zabbix falsa, en memoria, para probar y medir los
+provisionadores (*_serverzabbix.py, *_trigger_serverzabbix.py,
+create_*_items.py, sync_agents.py, lld_serverzabbix.py...) sin frontend.
+
+Implementa lo que usan esos scripts, con las reglas de Zabbix que les
+importan:
+
+  apiinfo.version, user.login / logout / checkAuthentication
+  host.get, hostinterface.get
+  item.get / create / update          key_ unica por host
+  discoveryrule.*, itemprototype.*    (idem, prototipos por regla: discoveryids)
+  trigger.get / create / update       la expresion tiene que apuntar a items
+  triggerprototype.*                  existentes ("last(/<host>/<key>)=0")
+  valuemap.get / create               nombre unico por host
+
+  - get: hostids / <id>s, filter (exacto), search (sin distinguir
+    mayusculas; startSearch = prefijo, searchByAny), output (lista o
+    "extend"), countOutput, limit, sortfield/sortorder, preservekeys
+  - create/update: un array es atomico (si UN objeto falla no se crea
+    ninguno), igual que Zabbix; los valores salen como texto
+  - auth: "auth" en el body o "Authorization: Bearer" (segun --version)
+  - JSON-RPC batch (lista de requests en un POST)
+
+Para medir "como si" fuera un Zabbix real:
+  --latency "item.create=20,item.get=5,*=2"   ms fijos por llamada y metodo
+  --row-latency-us 30                        + us por objeto devuelto/escrito
+  --error-rate "item.create=0.01"            error de aplicacion al azar
+  --http-error-rate 0.02                     HTTP 503 al azar (reintentos)
+
+Cuenta POSTs, llamadas por metodo, errores y tiempo de CPU del propio
+servidor (sin las esperas inyectadas): stats() / summary(), que tambien se
+imprime al cortar con Ctrl+C. Lo usa bench/bench_provisioning.py en proceso.
+
+Uso:
+  fake_zabbix_api.py [--port 8080] [--host gatewayp] [--items 100000] [--latency '*=5']
+  ZBX_URL=http://127.0.0.1:8080/api_jsonrpc.php ZBX_HOST=gatewayp python3 ast_sip/bulk_sipdevice_serverzabbix.py
+"""
+import argparse, json, random, re, socketserver, sys, threading, time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+DEFAULT_VERSION = "6.0.0"
+
+# Errores JSON-RPC tal como los devuelve Zabbix
+INVALID_PARAMS = -32602
+APPLICATION_ERROR = -32500
+NOT_AUTHORISED = "Not authorised."
+
+class APIError(Exception):
+    def __init__(self, data, code=INVALID_PARAMS, message="Invalid params."):
+        super().__init__(data)
+        self.code, self.message, self.data = code, message, data
+
+def parse_spec(spec, cast=float):
+    """'item.create=20,*=2' -> {"item.create": 20.0, "*": 2.0}."""
+    out = {}
+    for part in (spec or "").split(","):
+        if "=" in part:
+            k, _, v = part.partition("=")
+            out[k.strip()] = cast(v)
+    return out
+
+def _for(spec, method):
+    return spec.get(method, spec.get("*", 0))
+
+def expression_refs(expr):
+    """[(host, key)] de "/host/key" en una expresion (keys con [a,b] incluidas)."""
+    refs, i = [], 0
+    while True:
+        i = expr.find("(/", i)
+        if i < 0:
+            return refs
+        j = expr.find("/", i + 2)
+        if j < 0:
+            return refs
+        host, k, depth = expr[i + 2:j], j + 1, 0
+        while k < len(expr):
+            c = expr[k]
+            if c == "[":
+                depth += 1
+            elif c == "]":
+                depth -= 1
+            elif c in ",)" and depth <= 0:
+                break
+            k += 1
+        refs.append((host, expr[j + 1:k]))
+        i = k
+
+# ================== ALMACEN ==================
+# tabla -> (campo id, respuesta de create/update, tabla de las keys)
+TABLES = {
+    "item":             ("itemid", "itemids", "item"),
+    "discoveryrule":    ("itemid", "itemids", "discoveryrule"),
+    "itemprototype":    ("itemid", "itemids", "itemprototype"),
+    "trigger":          ("triggerid", "triggerids", None),
+    "triggerprototype": ("triggerid", "triggerids", None),
+    "valuemap":         ("valuemapid", "valuemapids", None),
+}
+# Lo que trae un item si el create no lo pide (lo que comparan los scripts)
+ITEM_DEFAULTS = {"type": "0", "value_type": "3", "units": "", "delay": "0", "history": "90d",
+                 "trends": "365d", "status": "0", "description": "", "interfaceid": "0", "valuemapid": "0"}
+
+class ZabbixStore(object):
+    """Hosts, interfaces y objetos de la API en memoria, con indices por host y por key_."""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._next = 10000
+        self.hosts = {}                               # hostid -> {hostid, host, name}
+        self.interfaces = {}                          # hostid -> [interfaz]
+        self.objects = {t: {} for t in TABLES}        # tabla -> {id: objeto}
+        self.by_host = {t: {} for t in TABLES}        # tabla -> {hostid: [id, ...]}
+        self.keys = {t: {} for t in TABLES}           # tabla -> {(hostid, key_): id}
+        self.unique = {t: {} for t in TABLES}         # triggers/valuemaps -> {(hostid, nombre...): id}
+
+    def next_id(self):
+        self._next += 1
+        return str(self._next)
+
+    def add_host(self, host, name=None):
+        with self.lock:
+            hostid = self.next_id()
+            self.hosts[hostid] = {"hostid": hostid, "host": host, "name": name or host}
+            self.interfaces[hostid] = [{"interfaceid": self.next_id(), "hostid": hostid, "type": "1",
+                                        "main": "1", "ip": "127.0.0.1", "dns": "", "port": "10050", "useip": "1"}]
+            return hostid
+
+    def host_by_name(self, name):
+        """Host por nombre TECNICO: es el que usan las expresiones (/host/key), no el visible."""
+        for h in self.hosts.values():
+            if h["host"] == name:
+                return h
+        return None
+
+    def seed_items(self, hostid, count, key="bench.filler[{}]", name="Filler {}"):
+        """<count> items de relleno en <hostid> (sin validar ni contar llamadas)."""
+        with self.lock:
+            for i in range(count):
+                self._insert("item", dict(ITEM_DEFAULTS, hostid=hostid, key_=key.format(i),
+                                          name=name.format(i), type="2"))
+
+    def count(self, table, hostid=None):
+        if hostid is None:
+            return len(self.objects[table])
+        return len(self.by_host[table].get(hostid, ()))
+
+    def _insert(self, table, obj):
+        idf, _, keyed = TABLES[table]
+        oid = self.next_id()
+        obj[idf] = oid
+        self.objects[table][oid] = obj
+        self.by_host[table].setdefault(obj["hostid"], []).append(oid)
+        if keyed:
+            self.keys[keyed][(obj["hostid"], obj["key_"])] = oid
+        else:
+            self.unique[table][self._unique_key(table, obj)] = oid
+        return oid
+
+    @staticmethod
+    def _unique_key(table, obj):
+        if table == "valuemap":
+            return (obj["hostid"], obj.get("name"))
+        return (obj["hostid"], obj.get("description"), obj.get("expression"))
+
+    # ---------------------------------------------------------- get
+    def get(self, table, params):
+        idf = TABLES[table][0]
+        objs = self.objects[table]
+        ids = params.get(idf + "s")
+        flt = dict(params.get("filter") or {})
+        hostids = params.get("hostids")
+        if hostids is not None and not isinstance(hostids, list):
+            hostids = [hostids]
+        if ids is not None:
+            cand = [objs[i] for i in (ids if isinstance(ids, list) else [ids]) if str(i) in objs]
+        elif TABLES[table][2] and hostids and "key_" in flt:
+            # Indice (hostid, key_): el item_exists() por peer no recorre el host
+            keys = flt.pop("key_")
+            keys = keys if isinstance(keys, list) else [keys]
+            idx = self.keys[TABLES[table][2]]
+            cand = [objs[idx[(h, k)]] for h in hostids for k in keys if (h, k) in idx]
+        elif hostids:
+            cand = [objs[i] for h in hostids for i in self.by_host[table].get(str(h), ())]
+        else:
+            cand = list(objs.values())
+        if hostids and ids is not None:
+            cand = [o for o in cand if o["hostid"] in hostids]
+        if "discoveryids" in params:
+            rules = params["discoveryids"]
+            rules = set(rules if isinstance(rules, list) else [rules])
+            cand = [o for o in cand if o.get("ruleid") in rules]
+        for field, want in flt.items():
+            want = {str(w) for w in (want if isinstance(want, list) else [want])}
+            cand = [o for o in cand if str(o.get(field, "")) in want]
+        if params.get("search"):
+            cand = [o for o in cand if self._matches(o, params)]
+        if params.get("sortfield"):
+            fields = params["sortfield"] if isinstance(params["sortfield"], list) else [params["sortfield"]]
+            cand.sort(key=lambda o: [int(o[f]) if f == idf else str(o.get(f, "")) for f in fields],
+                      reverse=str(params.get("sortorder", "ASC")).upper() == "DESC")
+        if params.get("limit"):
+            cand = cand[:int(params["limit"])]
+        if params.get("countOutput"):
+            return str(len(cand))
+        out = [self._output(o, params.get("output", "extend"), params) for o in cand]
+        if params.get("preservekeys"):
+            return {o[idf]: r for o, r in zip(cand, out)}
+        return out
+
+    @staticmethod
+    def _matches(obj, params):
+        start = bool(params.get("startSearch"))
+        tests = []
+        for field, values in params["search"].items():
+            for v in (values if isinstance(values, list) else [values]):
+                v, have = str(v).lower(), str(obj.get(field, "")).lower()
+                tests.append(have.startswith(v) if start else v in have)
+        return any(tests) if params.get("searchByAny") else all(tests)
+
+    @staticmethod
+    def _output(obj, output, params):
+        if output == "extend":
+            res = {k: v for k, v in obj.items() if not isinstance(v, (list, dict))}
+        else:
+            res = {f: obj[f] for f in output if f in obj}
+        for sel, field in (("selectTags", "tags"), ("selectMappings", "mappings")):
+            if params.get(sel) and field in obj:
+                res[field] = obj[field]
+        return {k: (v if isinstance(v, (list, dict)) else str(v)) for k, v in res.items()}
+
+    # ---------------------------------------------------------- create / update
+    def create(self, table, params):
+        objs = params if isinstance(params, list) else [params]
+        _, idsf, keyed = TABLES[table]
+        prepared, seen = [], set()
+        for raw in objs:
+            obj = {k: v for k, v in raw.items()}
+            if table in ("trigger", "triggerprototype"):
+                obj.update(self._trigger_links(table, obj))
+            else:
+                hostid = str(obj.get("hostid", ""))
+                if hostid not in self.hosts:
+                    raise APIError("No permissions to referred object or it does not exist!")
+                obj["hostid"] = hostid
+            if keyed:
+                obj = dict(ITEM_DEFAULTS, **obj)
+                if not obj.get("key_") or not obj.get("name"):
+                    raise APIError('Invalid parameter "/1": the parameter "key_" is missing.')
+                k = (obj["hostid"], obj["key_"])
+                if k in self.keys[keyed] or k in seen:
+                    raise APIError(f'Item with key "{obj["key_"]}" already exists on '
+                                   f'"{self.hosts[obj["hostid"]]["host"]}".')
+                seen.add(k)
+                if table == "itemprototype" and str(obj.get("ruleid", "")) not in self.objects["discoveryrule"]:
+                    raise APIError("No permissions to referred object or it does not exist!")
+            else:
+                k = self._unique_key(table, obj)
+                if k in seen or k in self.unique[table]:
+                    if table == "valuemap":
+                        raise APIError(f'Value map "{obj.get("name")}" already exists.')
+                    raise APIError(f'Trigger "{k[1]}" already exists on "{self.hosts[k[0]]["host"]}".')
+                seen.add(k)
+            prepared.append(obj)
+        # Todo validado: recien ahora se escribe (atomico, como Zabbix)
+        return {idsf: [self._insert(table, obj) for obj in prepared]}
+
+    def _trigger_links(self, table, obj):
+        """hostid y (prototipos) ruleid a partir de los items de la expresion."""
+        refs = expression_refs(obj.get("expression", ""))
+        if not refs:
+            raise APIError(f'Invalid parameter "/1/expression": trigger expression must contain '
+                           f'at least one /host/key reference.')
+        links = {}
+        for host, key in refs:
+            h = self.host_by_name(host)
+            tables = ("itemprototype", "item") if table == "triggerprototype" else ("item",)
+            oid = h and next((self.keys[t].get((h["hostid"], key)) for t in tables
+                              if (h["hostid"], key) in self.keys[t]), None)
+            if not oid:
+                raise APIError(f'Invalid parameter "/1/expression": incorrect item key "{key}" '
+                               f'provided for trigger expression on "{host}".')
+            links["hostid"] = h["hostid"]
+            proto = self.objects["itemprototype"].get(oid)
+            if proto:
+                links["ruleid"] = proto["ruleid"]
+        return links
+
+    def update(self, table, params):
+        objs = params if isinstance(params, list) else [params]
+        idf, idsf, keyed = TABLES[table]
+        for obj in objs:
+            if str(obj.get(idf, "")) not in self.objects[table]:
+                raise APIError("No permissions to referred object or it does not exist!")
+        for obj in objs:
+            cur = self.objects[table][str(obj[idf])]
+            if keyed and "key_" in obj and obj["key_"] != cur["key_"]:
+                del self.keys[keyed][(cur["hostid"], cur["key_"])]
+                self.keys[keyed][(cur["hostid"], obj["key_"])] = cur[idf]
+            if not keyed:
+                self.unique[table].pop(self._unique_key(table, cur), None)
+            cur.update({k: v for k, v in obj.items() if k != idf})
+            if not keyed:
+                self.unique[table][self._unique_key(table, cur)] = cur[idf]
+        return {idsf: [str(o[idf]) for o in objs]}
+
+# ================== API ==================
+class FakeZabbixAPI(object):
+    """Despacho JSON-RPC sobre un ZabbixStore, con latencia/errores inyectados y contadores."""
+
+    def __init__(self, store=None, version=DEFAULT_VERSION, latency=None, row_latency_us=0.0,
+                 error_rate=None, http_error_rate=0.0, tokens=(), seed=None):
+        self.store = store or ZabbixStore()
+        self.version = version
+        self.latency = latency or {}
+        self.row_latency_us = row_latency_us
+        self.error_rate = error_rate or {}
+        self.http_error_rate = http_error_rate
+        self.sessions = set(tokens)
+        self.rand = random.Random(seed)
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self.lock:
+            self.posts = 0
+            self.http_errors = 0
+            self.bytes_in = self.bytes_out = 0
+            self.server_s = 0.0
+            self.calls = {}     # metodo -> [llamadas, errores, objetos]
+
+    # ---------------------------------------------------------- estadisticas
+    def stats(self):
+        with self.lock:
+            return {"posts": self.posts, "http_errors": self.http_errors,
+                    "calls": sum(c[0] for c in self.calls.values()),
+                    "errors": sum(c[1] for c in self.calls.values()),
+                    "bytes_in": self.bytes_in, "bytes_out": self.bytes_out,
+                    "server_s": round(self.server_s, 3),
+                    "methods": {m: {"calls": c[0], "errors": c[1], "objects": c[2]}
+                                for m, c in sorted(self.calls.items())}}
+
+    def summary(self):
+        st = self.stats()
+        per = ", ".join(f"{m} {c['calls']}" for m, c in
+                        sorted(st["methods"].items(), key=lambda kv: -kv[1]["calls"]))
+        return (f"POSTs: {st['posts']} | llamadas: {st['calls']} ({per}) | errores: {st['errors']} "
+                f"| HTTP 503: {st['http_errors']} | CPU servidor: {st['server_s']}s")
+
+    def _count(self, method, error, objects):
+        with self.lock:
+            c = self.calls.setdefault(method, [0, 0, 0])
+            c[0] += 1
+            c[1] += int(error)
+            c[2] += objects
+
+    # ---------------------------------------------------------- HTTP
+    def handle_post(self, body, headers):
+        """(status, bytes de respuesta) de un POST a api_jsonrpc.php."""
+        with self.lock:
+            self.posts += 1
+            self.bytes_in += len(body)
+            if self.http_error_rate and self.rand.random() < self.http_error_rate:
+                self.http_errors += 1
+                return 503, b"Service Unavailable"
+        try:
+            payload = json.loads(body.decode("utf-8"))
+        except ValueError:
+            return 200, self._encode({"jsonrpc": "2.0", "id": None, "error": {
+                "code": -32700, "message": "Parse error.", "data": "Invalid JSON."}})
+        bearer = (headers.get("Authorization") or "")[len("Bearer "):] or None
+        if isinstance(payload, list):
+            res = [self.handle_request(r, bearer) for r in payload]
+        else:
+            res = self.handle_request(payload, bearer)
+        data = self._encode(res)
+        with self.lock:
+            self.bytes_out += len(data)
+        return 200, data
+
+    @staticmethod
+    def _encode(obj):
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+    def handle_request(self, req, bearer=None):
+        method, params, rid = req.get("method", ""), req.get("params", {}), req.get("id")
+        t0 = time.perf_counter()
+        objects = 0
+        try:
+            if _for(self.error_rate, method) and self.rand.random() < _for(self.error_rate, method):
+                raise APIError("Injected error (fake_zabbix_api --error-rate).",
+                               APPLICATION_ERROR, "Application error.")
+            result = self.dispatch(method, params, req.get("auth") or bearer)
+            objects = self._objects(result, params)
+            resp = {"jsonrpc": "2.0", "result": result, "id": rid}
+            error = False
+        except APIError as e:
+            resp = {"jsonrpc": "2.0", "error": {"code": e.code, "message": e.message, "data": e.data}, "id": rid}
+            error = True
+        elapsed = time.perf_counter() - t0
+        with self.lock:
+            self.server_s += elapsed
+        self._count(method, error, objects)
+        wait = _for(self.latency, method) / 1000.0 + objects * self.row_latency_us / 1e6
+        if wait > 0:
+            time.sleep(wait)
+        return resp
+
+    @staticmethod
+    def _objects(result, params):
+        """Objetos devueltos (get) o escritos (create/update) por una llamada."""
+        if isinstance(result, list):
+            return len(result)
+        if isinstance(result, dict) and len(result) == 1:
+            v = next(iter(result.values()))
+            if isinstance(v, list):
+                return len(v)
+        if isinstance(params, list):
+            return len(params)
+        return 1 if isinstance(result, dict) else 0
+
+    def dispatch(self, method, params, auth):
+        if method == "apiinfo.version":
+            return self.version
+        if method == "user.login":
+            token = "%032x" % self.rand.getrandbits(128)
+            with self.lock:
+                self.sessions.add(token)
+            return token
+        if auth not in self.sessions:
+            raise APIError(NOT_AUTHORISED)
+        if method == "user.logout":
+            with self.lock:
+                self.sessions.discard(auth)
+            return True
+        if method == "user.checkAuthentication":
+            return {"sessionid": auth}
+        obj, _, action = method.partition(".")
+        store = self.store
+        with store.lock:
+            if method == "host.get":
+                return self._host_get(params)
+            if method == "hostinterface.get":
+                hostids = params.get("hostids")
+                hostids = hostids if isinstance(hostids, list) else [hostids]
+                return [store._output(i, params.get("output", "extend"), params)
+                        for h in hostids for i in store.interfaces.get(str(h), ())]
+            if obj in TABLES and action == "get":
+                return store.get(obj, params)
+            if obj in TABLES and action == "create":
+                return store.create(obj, params)
+            if obj in TABLES and action == "update":
+                return store.update(obj, params)
+        raise APIError(f'Incorrect method "{method}".', -32601, "Method not found.")
+
+    def _host_get(self, params):
+        hosts = list(self.store.hosts.values())
+        if params.get("hostids"):
+            ids = params["hostids"] if isinstance(params["hostids"], list) else [params["hostids"]]
+            hosts = [h for h in hosts if h["hostid"] in map(str, ids)]
+        for field, want in (params.get("filter") or {}).items():
+            want = set(want if isinstance(want, list) else [want])
+            hosts = [h for h in hosts if h.get(field) in want]
+        return [self.store._output(h, params.get("output", "extend"), params) for h in hosts]
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"   # keep-alive para requests.Session
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        status, data = self.server.api.handle_post(body, self.headers)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, fmt, *args):
+        if self.server.verbose:
+            super().log_message(fmt, *args)
+
+class FakeZabbixServer(socketserver.ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, api, verbose=False):
+        super().__init__(address, Handler)
+        self.api = api
+        self.verbose = verbose
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/zabbix/api_jsonrpc.php"
+
+    def start(self):
+        """Sirve en un hilo daemon (uso en proceso, p. ej. desde un benchmark)."""
+        t = threading.Thread(target=self.serve_forever, daemon=True)
+        t.start()
+        return self
+
+def main():
+    parser = argparse.ArgumentParser(description="API JSON-RPC de Zabbix falsa, en memoria")
+    parser.add_argument("--bind", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--host", action="append", default=[], help="Host a crear (repetible)")
+    parser.add_argument("--items", type=int, default=0, help="Items de relleno en cada host")
+    parser.add_argument("--version", default=DEFAULT_VERSION, help="Lo que devuelve apiinfo.version")
+    parser.add_argument("--token", action="append", default=[], help="API token aceptado (repetible)")
+    parser.add_argument("--latency", default="", help="ms por llamada: 'item.create=20,*=2'")
+    parser.add_argument("--row-latency-us", type=float, default=0.0, help="us extra por objeto devuelto/escrito")
+    parser.add_argument("--error-rate", default="", help="Probabilidad de error por metodo: 'item.create=0.01'")
+    parser.add_argument("--http-error-rate", type=float, default=0.0, help="Probabilidad de HTTP 503 por POST")
+    parser.add_argument("--seed", type=int, help="Semilla de los errores inyectados")
+    parser.add_argument("--verbose", action="store_true", help="Loguear cada POST")
+    args = parser.parse_args()
+
+    store = ZabbixStore()
+    for name in args.host or ["Zabbix server"]:
+        store.seed_items(store.add_host(name), args.items)
+    api = FakeZabbixAPI(store, version=args.version, latency=parse_spec(args.latency),
+                        row_latency_us=args.row_latency_us, error_rate=parse_spec(args.error_rate),
+                        http_error_rate=args.http_error_rate, tokens=args.token, seed=args.seed)
+    server = FakeZabbixServer((args.bind, args.port), api, verbose=args.verbose)
+    print(f"API Zabbix falsa en {server.url} (hosts: {', '.join(args.host or ['Zabbix server'])}, "
+          f"{args.items} items c/u)", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(api.summary(), file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
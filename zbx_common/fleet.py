@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Modo flota: el mismo aprovisionamiento contra muchos hosts a la vez.
+
+Los *_serverzabbix.py apuntan a UN host (ZBX_HOST) y descubren los endpoints
+corriendo asterisk en LOCAL, asi que con decenas de PBX habia que entrar a
+cada una y correrlos en serie. Con esto:
+
+  1. en cada PBX se exporta lo descubierto a un JSON (sin tocar Zabbix):
+         bulk_pjsipdevice_serverzabbix.py --export /tmp/pbx-01.json
+  2. se juntan los JSON en un directorio (el inventario) y desde UN equipo:
+         bulk_pjsipdevice_serverzabbix.py --inventory inventario/ --with-triggers
+
+Formato del inventario (un archivo por host, una lista, o {"hosts": [...]}):
+    {"host": "pbx-01", "tech": "pjsip", "endpoints": ["101", "102"]}
+"tech" es opcional: sin el, la entrada vale para cualquier script; con el,
+cada script solo toma las de su tecnologia (pjsip / sip).
+
+run_fleet() corre una tarea por host en un ThreadPoolExecutor acotado,
+sobre un solo cliente de zbx_api.py. Un host que falla (no existe en Zabbix,
+sin interfaz, error de API) queda marcado con su error y el resto sigue. La
+salida de cada host se junta y se imprime entera al terminar ese host.
+"""
+import io, json, os, sys, threading, time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+RC_OK = 0
+RC_ERROR = 2      # el host no se pudo procesar (excepcion)
+RC_PARTIAL = 3    # se proceso, pero algun objeto fallo (contador "*failed" > 0)
+
+class ThreadOutput(object):
+    """sys.stdout que junta en un buffer lo que imprime cada hilo de trabajo."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.local = threading.local()
+
+    def capture(self):
+        self.local.buf = io.StringIO()
+        return self.local.buf
+
+    def release(self):
+        buf, self.local.buf = getattr(self.local, "buf", None), None
+        return buf.getvalue() if buf else ""
+
+    def write(self, text):
+        buf = getattr(self.local, "buf", None)
+        return (buf or self.stream).write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+def _entries(data, source):
+    if isinstance(data, dict) and "hosts" in data:
+        data = data["hosts"]
+    if isinstance(data, dict):
+        data = [data]
+    if not isinstance(data, list):
+        raise ValueError(f"{source}: se esperaba un objeto, una lista o {{\"hosts\": [...]}}")
+    for n, e in enumerate(data, 1):
+        if not isinstance(e, dict) or not str(e.get("host") or "").strip():
+            raise ValueError(f"{source}: la entrada {n} no tiene 'host'")
+        eps = e.get("endpoints", [])
+        if not isinstance(eps, list):
+            raise ValueError(f"{source}: 'endpoints' de {e['host']} debe ser una lista")
+        yield {
+            "host": str(e["host"]).strip(),
+            "tech": str(e.get("tech") or "").lower(),
+            "endpoints": sorted({str(x).strip() for x in eps if str(x).strip()}),
+            "source": source,
+        }
+
+def load_inventory(paths, tech=None):
+    """
+    Lee el inventario desde archivos JSON y/o directorios (todos sus *.json).
+    Devuelve [{host, tech, endpoints, source}] en orden de lectura, filtrado
+    por <tech> si se indica. Un host repetido o un JSON invalido es error
+    (ValueError) antes de tocar Zabbix.
+    """
+    files = []
+    for p in paths:
+        if os.path.isdir(p):
+            files.extend(os.path.join(p, f) for f in sorted(os.listdir(p)) if f.endswith(".json"))
+        else:
+            files.append(p)
+    hosts, seen = [], {}
+    for path in files:
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            raise ValueError(f"{path}: {e}")
+        for e in _entries(data, path):
+            if tech and e["tech"] and e["tech"] != tech:
+                continue
+            if e["host"] in seen:
+                raise ValueError(f"host '{e['host']}' repetido en {seen[e['host']]} y {path}")
+            seen[e["host"]] = path
+            hosts.append(e)
+    return hosts
+
+def export_entry(path, host, tech, endpoints):
+    """Escribe el JSON de inventario de un host (path "-" = stdout)."""
+    data = {"host": host, "tech": tech, "endpoints": sorted(endpoints),
+            "exported_at": time.strftime("%Y-%m-%dT%H:%M:%S")}
+    text = json.dumps(data, indent=2, ensure_ascii=False) + "\n"
+    if path == "-":
+        sys.stdout.write(text)
+        return
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+def _host_rc(counts):
+    return RC_PARTIAL if any(v for k, v in counts.items() if k.endswith("failed")) else RC_OK
+
+def run_fleet(hosts, task, workers=4):
+    """
+    Ejecuta task(entry) -> {contador: n} para cada host con <workers> hilos.
+    Devuelve [{host, rc, counts, error, elapsed}] en el orden del inventario.
+    """
+    out = ThreadOutput(sys.stdout)
+    results = [None] * len(hosts)
+
+    def one(i, entry):
+        out.capture()
+        t0 = time.monotonic()
+        try:
+            counts = task(entry) or {}
+            res = {"host": entry["host"], "rc": _host_rc(counts), "counts": counts, "error": None}
+        except Exception as e:
+            print(f"  [ERR] {type(e).__name__}: {e}")
+            res = {"host": entry["host"], "rc": RC_ERROR, "counts": {}, "error": f"{type(e).__name__}: {e}"}
+        res["elapsed"] = time.monotonic() - t0
+        return i, res, out.release()
+
+    sys.stdout = out
+    try:
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+            futures = [pool.submit(one, i, e) for i, e in enumerate(hosts)]
+            for done, fut in enumerate(as_completed(futures), 1):
+                i, res, log = fut.result()
+                results[i] = res
+                print(f">>> [{done}/{len(hosts)}] {res['host']} ({res['elapsed']:.1f}s, exit={res['rc']})\n{log}", end="")
+    finally:
+        sys.stdout = out.stream
+    return results
+
+def print_summary(results, columns):
+    """Tabla host x <columns> (claves de counts) con totales y la lista de hosts con error."""
+    width = max([len(r["host"]) for r in results] + [4])
+    print(f"\n{'host':<{width}}  rc  " + "  ".join(f"{c:>9}" for c in columns) + "  segundos")
+    totals = dict.fromkeys(columns, 0)
+    for r in results:
+        cells = []
+        for c in columns:
+            v = r["counts"].get(c)
+            totals[c] += v or 0
+            cells.append(f"{'-' if v is None else v:>9}")
+        print(f"{r['host']:<{width}}  {r['rc']:>2}  " + "  ".join(cells) + f"  {r['elapsed']:8.1f}")
+    print(f"{'TOTAL':<{width}}      " + "  ".join(f"{totals[c]:>9}" for c in columns))
+    ok = sum(1 for r in results if r["rc"] == RC_OK)
+    partial = [r["host"] for r in results if r["rc"] == RC_PARTIAL]
+    errors = [r for r in results if r["rc"] == RC_ERROR]
+    print(f"\nHosts: {len(results)} | OK: {ok} | con fallidos: {len(partial)} | con error: {len(errors)}")
+    if partial:
+        print(f"  Con objetos fallidos: {', '.join(partial)}")
+    for r in errors:
+        print(f"  [ERR] {r['host']}: {r['error']}")
+
+def exit_code(results):
+    """El peor rc de la flota (0 si todo salio bien)."""
+    return max([r["rc"] for r in results] + [RC_OK])
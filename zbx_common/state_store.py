@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Estado "ultimo valor enviado" de los pollers trapper, en SQLite (modo WAL).
+
+Reemplaza los agent_*_state.json que se cargaban con jq y se reescribian con
+echo en cada ciclo: la escritura no era atomica (un corte a mitad dejaba el
+JSON roto) y el estado avanzaba aunque el trapper hubiera rechazado el lote,
+con lo que el valor no se reenviaba nunca. Aca:
+
+  - una tabla (familia, clave) -> (valor, enviado_en), con PRIMARY KEY, asi
+    que load() es una sola consulta y cada lookup posterior es un dict;
+  - commit() escribe todos los valores ACEPTADOS en una sola transaccion
+    (todo o nada) y solo se llama despues de un envio exitoso;
+  - journal WAL + synchronous=NORMAL: los lectores no bloquean al escritor y
+    un crash nunca deja el archivo a medias.
+
+Uso:
+    with StateStore("/ruta/agent_state.sqlite") as st:
+        st.import_json("latency", "/ruta/agent_latency_state.json")  # migracion, una vez
+        last = st.load("latency")                                     # {clave: valor}
+        ... enviar ...
+        st.commit("latency", {"101": "35"}, clock=time.time())
+"""
+import json, os, sqlite3, time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS state (
+    family  TEXT NOT NULL,
+    key     TEXT NOT NULL,
+    value   TEXT NOT NULL,
+    sent_at INTEGER NOT NULL,
+    PRIMARY KEY (family, key)
+)
+"""
+
+class StateStore(object):
+    """Ultimo valor enviado por (familia, clave), con commit transaccional."""
+
+    def __init__(self, path, timeout=10.0):
+        self.path = path
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    def load(self, family):
+        """{clave: valor} de una familia, en una sola consulta."""
+        cur = self.db.execute("SELECT key, value FROM state WHERE family = ?", (family,))
+        return dict(cur.fetchall())
+
+    def load_with_clock(self, family):
+        """{clave: (valor, enviado_en)} de una familia."""
+        cur = self.db.execute("SELECT key, value, sent_at FROM state WHERE family = ?", (family,))
+        return {k: (v, t) for k, v, t in cur.fetchall()}
+
+    def count(self, family):
+        return self.db.execute("SELECT COUNT(*) FROM state WHERE family = ?", (family,)).fetchone()[0]
+
+    def commit(self, family, values, clock=None):
+        """
+        Guarda {clave: valor} como enviados en <clock> (epoch; por defecto ahora)
+        en UNA transaccion: o quedan todos o ninguno.
+        """
+        if not values:
+            return 0
+        sent_at = int(clock if clock is not None else time.time())
+        rows = [(family, str(k), str(v), sent_at) for k, v in values.items()]
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO state (family, key, value, sent_at) VALUES (?, ?, ?, ?)", rows)
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+        return len(rows)
+
+    def forget(self, family, keys=None):
+        """Borra el estado de una familia (o solo <keys>) para forzar el reenvio."""
+        self.db.execute("BEGIN IMMEDIATE")
+        if keys is None:
+            self.db.execute("DELETE FROM state WHERE family = ?", (family,))
+        else:
+            self.db.executemany("DELETE FROM state WHERE family = ? AND key = ?",
+                                [(family, str(k)) for k in keys])
+        self.db.execute("COMMIT")
+
+    def import_json(self, family, path):
+        """
+        Migra un agent_*_state.json heredado si la familia todavia esta vacia.
+        Devuelve cuantas claves importo (0 si no habia nada que migrar).
+        """
+        if self.count(family) or not os.path.isfile(path):
+            return 0
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        if not isinstance(data, dict):
+            return 0
+        return self.commit(family, data, clock=os.path.getmtime(path))
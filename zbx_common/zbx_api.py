@@ -0,0 +1,365 @@
+#!/usr/bin/env python3
+"""
+Cliente JSON-RPC de la API de Zabbix compartido por los provisionadores
+(ast_*/bulk_*.py, asterisk.fail2ban.bulk.py, wvx_latency_nr/create_*_items.py,
+bulk_grafana_agent_panels.py, ...). Reemplaza las copias de api()/login() de
+cada script:
+
+  - UNA conexion HTTP keep-alive por proceso (requests.Session con pool; si
+    requests no esta instalado se usa urllib, sin pool);
+  - auth con API token (ZBX_API_TOKEN) o user.login con "username" (>= 5.4)
+    / "user" (anteriores), segun apiinfo.version. Desde 6.4 la sesion/token
+    va en el header "Authorization: Bearer" (7.2 ya no acepta "auth" en el
+    body); antes, en "auth";
+  - la sesion de user.login se guarda en ZBX_SESSION_CACHE y la reutilizan
+    todas las corridas del cron nocturno (un login por noche, no uno por
+    script). Si Zabbix la expiro se vuelve a loguear y se reintenta una vez;
+  - batch(): varias llamadas en un solo POST (JSON-RPC batch);
+  - call_chunked(): item/trigger.create|update masivos en chunks, aislando
+    por biseccion los objetos que Zabbix rechaza;
+  - item_pages(): item.get paginado por prefijo de key_ en hosts compartidos;
+  - reintentos con backoff exponencial ante 429/5xx/errores de red, pasando
+    por el limitador adaptativo de zbx_ratelimit.py;
+  - latencia por metodo: stats() / summary().
+
+Uso:
+    zapi = ZabbixAPI.from_env()
+    hostid = zapi.call("host.get", {"filter": {"host": ["Zabbix server"]}})[0]["hostid"]
+    hosts, items = zapi.batch([("host.get", {...}), ("item.get", {...})])
+    print(zapi.summary())
+"""
+import hashlib, json, os, re, ssl, threading, time
+import urllib.error, urllib.request
+
+try:
+    import requests
+    from requests.adapters import HTTPAdapter
+except ImportError:  # hosts Asterisk sin python3-requests
+    requests = None
+
+from zbx_ratelimit import MAX_RETRIES, AdaptiveRateLimiter
+
+# Metodos que NO llevan auth (apiinfo.version la rechaza si se manda)
+NO_AUTH_METHODS = ("apiinfo.version", "user.login", "user.checkAuthentication")
+# Mensajes de sesion vencida/invalida segun version ("Session terminated,
+# re-login, please." / "Not authorised." / "Not authorized.")
+SESSION_EXPIRED = re.compile(r"re-login|not authori[sz]ed", re.I)
+
+SESSION_CACHE = os.environ.get("ZBX_SESSION_CACHE", os.path.expanduser("~/.cache/zbx_api"))
+
+class ZabbixAPIError(RuntimeError):
+    """Error devuelto por la API (o HTTP/red despues de agotar los reintentos)."""
+
+    def __init__(self, error, method=None):
+        super().__init__(error)
+        self.error = error
+        self.method = method
+        self.data = error.get("data", "") if isinstance(error, dict) else str(error)
+
+    @property
+    def session_expired(self):
+        return bool(SESSION_EXPIRED.search(str(self.data)))
+
+def parse_version(text):
+    return tuple(int(x) for x in re.findall(r"\d+", str(text))[:2]) or (0, 0)
+
+class ZabbixAPI(object):
+    """Cliente con conexion persistente, sesion reutilizable, batch y reintentos."""
+
+    def __init__(self, url, user=None, password=None, token=None, verify=True, timeout=30,
+                 limiter=None, pool_size=10, session_cache=SESSION_CACHE, max_retries=MAX_RETRIES):
+        self.url = url
+        self.user = user
+        self.password = password
+        self.token = token or None
+        self.verify = verify
+        self.timeout = timeout
+        self.limiter = limiter if limiter is not None else AdaptiveRateLimiter()
+        self.max_retries = max_retries
+        self.version = None
+        self.auth = self.token
+        self._logged_in = False
+        self._ids = 0
+        self._lock = threading.Lock()
+        self._login_lock = threading.RLock()
+        self._stats = {}
+        self.cache_path = None
+        if session_cache and not self.token and session_cache.lower() not in ("off", "false", "0"):
+            h = hashlib.sha1(f"{url}|{user}".encode("utf-8")).hexdigest()[:16]
+            self.cache_path = os.path.join(session_cache, f"{h}.json")
+        if requests is not None:
+            self.http = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            self.http.mount("http://", adapter)
+            self.http.mount("https://", adapter)
+        else:
+            self.http = None
+            self._ssl = None if verify else ssl._create_unverified_context()
+
+    @classmethod
+    def from_env(cls, **kwargs):
+        """Cliente configurado con ZBX_URL/ZBX_USER/ZBX_PASS/ZBX_API_TOKEN/ZBX_VERIFY_TLS."""
+        kwargs.setdefault("url", os.environ.get("ZBX_URL", "http://localhost/zabbix/api_jsonrpc.php"))
+        kwargs.setdefault("user", os.environ.get("ZBX_USER", "Admin"))
+        kwargs.setdefault("password", os.environ.get("ZBX_PASS", "CHANGE_ME"))
+        kwargs.setdefault("token", os.environ.get("ZBX_API_TOKEN", ""))
+        kwargs.setdefault("verify", os.environ.get("ZBX_VERIFY_TLS", "false").lower() == "true")
+        return cls(**kwargs)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------------------------------------------------------- transporte
+    def _next_id(self):
+        with self._lock:
+            self._ids += 1
+            return self._ids
+
+    def _http_post(self, body, headers):
+        """POST crudo -> (status, headers, bytes). Lanza OSError/RequestException en fallas de red."""
+        if self.http is not None:
+            r = self.http.post(self.url, data=body, headers=headers, verify=self.verify, timeout=self.timeout)
+            return r.status_code, r.headers, r.content
+        req = urllib.request.Request(self.url, data=body, headers=headers)
+        try:
+            with urllib.request.urlopen(req, timeout=self.timeout, context=self._ssl) as resp:
+                return resp.status, resp.headers, resp.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers, e.read()
+
+    def _transient_errors(self):
+        errs = (OSError,)
+        if requests is not None:
+            errs += (requests.ConnectionError, requests.Timeout)
+        return errs
+
+    def _post(self, payload, use_auth):
+        """Envia el payload (dict o lista batch) con reintentos; devuelve el JSON decodificado."""
+        headers = {"Content-Type": "application/json-rpc"}
+        if use_auth and self.auth and self.version >= (6, 4):
+            headers["Authorization"] = f"Bearer {self.auth}"
+        body = json.dumps(payload).encode("utf-8")
+        delay = 1.0
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire()
+            t0 = time.monotonic()
+            try:
+                status, resp_headers, data = self._http_post(body, headers)
+            except self._transient_errors() as e:
+                self.limiter.backoff()
+                if attempt == self.max_retries:
+                    raise ZabbixAPIError({"code": None, "message": "Error de red", "data": str(e)})
+            else:
+                retry = self.limiter.feedback(status, time.monotonic() - t0)
+                if not retry or attempt == self.max_retries:
+                    if status >= 400:
+                        raise ZabbixAPIError({"code": status, "message": f"HTTP {status}",
+                                              "data": data[:300].decode("utf-8", "replace")})
+                    return json.loads(data.decode("utf-8"))
+                retry_after = (resp_headers.get("Retry-After") or "").strip()
+                if retry_after.isdigit():
+                    delay = max(delay, float(retry_after))
+            self.limiter.slept_s += delay
+            time.sleep(delay)
+            delay = min(delay * 2, 30.0)
+
+    def _request(self, method, params, use_auth=True):
+        req = {"jsonrpc": "2.0", "method": method, "params": params, "id": self._next_id()}
+        if use_auth and self.auth and self.version < (6, 4):
+            req["auth"] = self.auth
+        return req
+
+    def _record(self, method, elapsed, error=False):
+        with self._lock:
+            st = self._stats.setdefault(method, [0, 0.0, 0.0, 0])
+            st[0] += 1
+            st[1] += elapsed
+            st[2] = max(st[2], elapsed)
+            st[3] += int(error)
+
+    # ---------------------------------------------------------- sesion
+    def api_version(self):
+        if self.version is None:
+            t0 = time.monotonic()
+            res = self._post(self._request("apiinfo.version", {}, use_auth=False), use_auth=False)
+            self._record("apiinfo.version", time.monotonic() - t0)
+            if "error" in res:
+                raise ZabbixAPIError(res["error"], "apiinfo.version")
+            self.version = parse_version(res["result"])
+        return self.version
+
+    def _load_cached_session(self):
+        if not self.cache_path:
+            return False
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                cached = json.load(f)
+            self.version = tuple(cached["version"])
+            self.auth = cached["auth"]
+            return True
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+
+    def _save_cached_session(self):
+        if not self.cache_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), mode=0o700, exist_ok=True)
+            tmp = f"{self.cache_path}.{os.getpid()}.tmp"
+            fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"version": list(self.version), "auth": self.auth}, f)
+            os.replace(tmp, self.cache_path)
+        except OSError:
+            pass  # sin cache se loguea en cada corrida, como antes
+
+    def login(self, force=False):
+        """
+        Deja lista la autenticacion y devuelve el token/sesion. Con API token
+        no hay login; sin token se reutiliza la sesion cacheada (salvo force).
+        """
+        with self._login_lock:
+            if not force:
+                if self.auth:
+                    self.api_version()
+                    return self.auth
+                if self._load_cached_session():
+                    return self.auth
+            field = "username" if self.api_version() >= (5, 4) else "user"
+            self.auth = None
+            self.auth = self.call("user.login", {field: self.user, "password": self.password})
+            self._logged_in = True
+            self._save_cached_session()
+            return self.auth
+
+    def logout(self):
+        """Cierra la sesion propia (no la cacheada ni un API token)."""
+        if self._logged_in and not self.cache_path:
+            try:
+                self.call("user.logout", [])
+            except ZabbixAPIError:
+                pass
+        self._logged_in = False
+
+    def close(self):
+        self.logout()
+        if self.http is not None:
+            self.http.close()
+
+    # ---------------------------------------------------------- llamadas
+    def call(self, method, params=None):
+        """Una llamada; devuelve "result" o lanza ZabbixAPIError."""
+        params = {} if params is None else params
+        use_auth = method not in NO_AUTH_METHODS
+        if use_auth:
+            self.login()
+        for attempt in (0, 1):
+            t0 = time.monotonic()
+            try:
+                res = self._post(self._request(method, params, use_auth), use_auth)
+            except ZabbixAPIError:
+                self._record(method, time.monotonic() - t0, error=True)
+                raise
+            self._record(method, time.monotonic() - t0, error="error" in res)
+            if "error" not in res:
+                return res["result"]
+            err = ZabbixAPIError(res["error"], method)
+            if use_auth and attempt == 0 and err.session_expired and not self.token:
+                self.login(force=True)
+                continue
+            raise err
+
+    def batch(self, calls, raise_errors=True):
+        """
+        [(metodo, params), ...] en UN solo POST (JSON-RPC batch). Devuelve los
+        resultados en el mismo orden; con raise_errors=False los errores vienen
+        como ZabbixAPIError dentro de la lista en vez de lanzarse.
+        """
+        calls = list(calls)
+        if not calls:
+            return []
+        if any(m not in NO_AUTH_METHODS for m, _ in calls):
+            self.login()
+        for attempt in (0, 1):
+            reqs = [self._request(m, p, m not in NO_AUTH_METHODS) for m, p in calls]
+            t0 = time.monotonic()
+            res = self._post(reqs, use_auth=True)
+            elapsed = (time.monotonic() - t0) / len(calls)
+            if isinstance(res, dict):  # error global (p. ej. request invalido)
+                raise ZabbixAPIError(res.get("error", res), "batch")
+            by_id = {r.get("id"): r for r in res}
+            out = []
+            for (method, _), req in zip(calls, reqs):
+                r = by_id.get(req["id"], {"error": {"code": None, "message": "Sin respuesta", "data": ""}})
+                self._record(method, elapsed, error="error" in r)
+                out.append(ZabbixAPIError(r["error"], method) if "error" in r else r["result"])
+            errors = [r for r in out if isinstance(r, ZabbixAPIError)]
+            # Si TODAS fallaron por sesion vencida no se ejecuto nada: re-login y de nuevo
+            if errors and attempt == 0 and not self.token and len(errors) == len(out) \
+                    and all(e.session_expired for e in errors):
+                self.login(force=True)
+                continue
+            if errors and raise_errors:
+                raise errors[0]
+            return out
+
+    # ---------------------------------------------------------- estadisticas
+    def stats(self):
+        """{metodo: {"calls", "total_s", "avg_ms", "max_ms", "errors"}}"""
+        with self._lock:
+            return {m: {"calls": n, "total_s": round(tot, 3), "avg_ms": round(tot / n * 1000, 1),
+                        "max_ms": round(mx * 1000, 1), "errors": err}
+                    for m, (n, tot, mx, err) in self._stats.items()}
+
+    def summary(self):
+        st = self.stats()
+        calls = sum(s["calls"] for s in st.values())
+        per = ", ".join(f"{m} {s['calls']}x{s['avg_ms']:.0f}ms" for m, s in
+                        sorted(st.items(), key=lambda kv: -kv[1]["total_s"])[:5])
+        return f"{calls} llamadas ({per}) | {self.limiter.summary()}"
+
+# ------------------------------------------------------------ create/update masivo
+def call_chunked(call, method, objs, result_key, chunk_size=500):
+    """
+    <call>(method, params) con arrays de hasta <chunk_size> objetos. Zabbix
+    rechaza el array completo si UNO falla, asi que un chunk con error se
+    parte en dos hasta aislar el/los objetos culpables; el resto sigue.
+    <result_key> es donde vienen los ids ("itemids", "triggerids"...), en el
+    mismo orden que el array. Devuelve ([(objeto, id), ...], [(objeto, error), ...]).
+    """
+    ok, failed = [], []
+
+    def run(batch):
+        try:
+            res = call(method, batch)
+            ok.extend(zip(batch, res.get(result_key, [])))
+        except ZabbixAPIError as e:  # API, HTTP o red
+            if len(batch) == 1:
+                failed.append((batch[0], e))
+                return
+            mid = len(batch) // 2
+            run(batch[:mid])
+            run(batch[mid:])
+
+    for i in range(0, len(objs), chunk_size):
+        run(objs[i:i + chunk_size])
+    return ok, failed
+
+def item_pages(call, hostid, key_prefixes, output, page_size=1000):
+    """
+    Genera paginas (listas) de items de <hostid> cuya key_ empieza con alguno
+    de <key_prefixes>, via <call>(method, params). El host suele ser compartido
+    por varias operaciones: se filtra en el servidor por prefijo, primero se
+    piden solo los itemids (ordenados) y despues el detalle (<output>) de a
+    <page_size>, asi la respuesta y la memoria escalan con los items pedidos y
+    no con los del host completo.
+    """
+    ids = call("item.get", {"hostids": hostid, "output": ["itemid"],
+                            "search": {"key_": list(key_prefixes)}, "searchByAny": True,
+                            "startSearch": True, "sortfield": "itemid"})
+    for i in range(0, len(ids), page_size):
+        page = [it["itemid"] for it in ids[i:i + page_size]]
+        yield call("item.get", {"itemids": page, "output": output})
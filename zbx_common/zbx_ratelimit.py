@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# Limitador de tasa adaptativo (token bucket) para la API de Zabbix, compartido
+# por todos los scripts via zbx_api.py (antes solo los create_*_items.py).
+#
+# Reemplaza el time.sleep(0.3) fijo despues de cada request: mientras el
+# frontend responde rapido se envia a la tasa maxima (ZBX_MAX_RPS), y solo se
+# frena cuando Zabbix empuja de vuelta (HTTP 429/5xx, errores de conexion o
+# respuestas mas lentas que ZBX_SLOW_S). La tasa se recupera de a poco cuando
+# las respuestas vuelven a ser normales (AIMD: baja a la mitad, sube +10%).
+# Los reintentos con backoff exponencial los hace ZabbixAPI._post (zbx_api.py)
+# segun lo que devuelve feedback().
+import os, threading, time
+
+ZBX_MAX_RPS = float(os.environ.get("ZBX_MAX_RPS", "10"))   # requests/seg como maximo
+ZBX_SLOW_S  = float(os.environ.get("ZBX_SLOW_S",  "2.0"))  # respuesta "lenta" = frontend saturado
+MAX_RETRIES = 4
+RETRY_STATUS = (429, 500, 502, 503, 504)
+
+class AdaptiveRateLimiter:
+    """Token bucket cuya tasa baja ante presion del servidor y se recupera sola."""
+
+    def __init__(self, max_rate=ZBX_MAX_RPS, min_rate=0.5, slow_s=ZBX_SLOW_S):
+        self.max_rate = max(max_rate, min_rate)
+        self.min_rate = min_rate
+        self.slow_s = slow_s
+        self.rate = self.max_rate
+        self.burst = max(1.0, self.max_rate)
+        self.tokens = self.burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+        self.throttled = 0        # veces que se bajo la tasa
+        self.slept_s = 0.0        # tiempo total esperando tokens
+
+    def acquire(self):
+        """Bloquea hasta que haya un token disponible."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            self.slept_s += wait
+            time.sleep(wait)
+
+    def backoff(self):
+        with self.lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+            self.throttled += 1
+
+    def recover(self):
+        with self.lock:
+            self.rate = min(self.max_rate, self.rate * 1.1)
+
+    def feedback(self, status_code, elapsed):
+        """Ajusta la tasa segun la respuesta. Devuelve True si conviene reintentar."""
+        if status_code in RETRY_STATUS:
+            self.backoff()
+            return True
+        if elapsed > self.slow_s:
+            self.backoff()
+        else:
+            self.recover()
+        return False
+
+    def summary(self):
+        return (f"tasa final {self.rate:.1f} req/s (max {self.max_rate:.1f}) | "
+                f"frenadas: {self.throttled} | espera total: {self.slept_s:.1f}s")
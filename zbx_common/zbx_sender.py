@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+"""
+Cliente nativo del protocolo Zabbix sender (trapper), sin lanzar zabbix_sender.
+
+Habla directamente con el puerto trapper (10051): cabecera "ZBXD" + JSON
+{"request": "sender data", "data": [...]}, en lotes de hasta CHUNK_SIZE
+valores por request, con clock/ns por valor y la respuesta
+"processed: N; failed: N; total: N; seconds spent: S" parseada a numeros.
+Mantiene la conexion TCP abierta entre lotes si el servidor la deja abierta
+(proxies/stubs); zabbix_server la cierra despues de cada respuesta, y en ese
+caso se reconecta solo antes del lote siguiente.
+
+Uso como modulo (los scripts lo encuentran buscando zbx_common/ hacia arriba):
+    from zbx_sender import ZabbixSender
+    with ZabbixSender("127.0.0.1", 10051) as zs:
+        res = zs.send([("host", "key", 1), ("host", "key2", 2.5, 1700000000, 0)])
+    print(res.processed, res.failed)
+
+Uso por linea de comandos (reemplazo de "zabbix_sender -i"):
+    zbx_sender.py -z 127.0.0.1 -p 10051 -i lote.txt      # "host key value" por linea
+    zbx_sender.py -z 127.0.0.1 -T -i -                   # "host key clock value" desde stdin
+
+Sale con 0 si todo se proceso, 2 si hubo rechazos parciales (igual que
+zabbix_sender) y 1 si no se pudo entregar nada.
+"""
+import argparse, json, re, select, shlex, socket, struct, sys, time, zlib
+
+ZBX_HEADER = b"ZBXD"
+FLAG_ZABBIX = 0x01
+FLAG_COMPRESSED = 0x02
+FLAG_LARGE = 0x04
+CHUNK_SIZE = 250          # mismo tope que usa zabbix_sender por request
+MAX_RESPONSE = 16 * 1024 * 1024
+
+INFO_RE = re.compile(r'processed:\s*(\d+);\s*failed:\s*(\d+);\s*total:\s*(\d+);\s*seconds spent:\s*([0-9.]+)')
+
+class SenderError(Exception):
+    """No se pudo entregar un lote (conexion, protocolo o respuesta 'failed')."""
+
+class SenderResult(object):
+    """Totales de uno o mas lotes enviados."""
+
+    def __init__(self, processed=0, failed=0, total=0, seconds=0.0, chunks=0):
+        self.processed = processed
+        self.failed = failed
+        self.total = total
+        self.seconds = seconds
+        self.chunks = chunks
+        self.infos = []       # linea "info" cruda de cada lote
+
+    def add_info(self, info):
+        m = INFO_RE.search(info or "")
+        if not m:
+            raise SenderError(f"Respuesta del trapper sin totales: {info!r}")
+        self.processed += int(m.group(1))
+        self.failed += int(m.group(2))
+        self.total += int(m.group(3))
+        self.seconds += float(m.group(4))
+        self.chunks += 1
+        self.infos.append(info)
+
+    def __iadd__(self, other):
+        self.processed += other.processed
+        self.failed += other.failed
+        self.total += other.total
+        self.seconds += other.seconds
+        self.chunks += other.chunks
+        self.infos.extend(other.infos)
+        return self
+
+    def __repr__(self):
+        return (f"processed: {self.processed}; failed: {self.failed}; total: {self.total}; "
+                f"seconds spent: {self.seconds:.6f}; chunks: {self.chunks}")
+
+def pack(obj):
+    """Serializa un request con la cabecera ZBXD v1 (flags 0x01, largo en 4+4 bytes)."""
+    body = json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return ZBX_HEADER + struct.pack("<BII", FLAG_ZABBIX, len(body), 0) + body
+
+def _recv_exact(sock, n):
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise EOFError("conexion cerrada por el servidor")
+        buf.extend(chunk)
+    return bytes(buf)
+
+def unpack_response(sock):
+    """Lee una respuesta ZBXD completa (soporta compresion y paquetes 'large')."""
+    head = _recv_exact(sock, 5)
+    if head[:4] != ZBX_HEADER:
+        raise SenderError(f"Cabecera invalida en la respuesta: {head!r}")
+    flags = head[4]
+    if flags & FLAG_LARGE:
+        datalen, reserved = struct.unpack("<QQ", _recv_exact(sock, 16))
+    else:
+        datalen, reserved = struct.unpack("<II", _recv_exact(sock, 8))
+    if datalen > MAX_RESPONSE:
+        raise SenderError(f"Respuesta demasiado grande: {datalen} bytes")
+    body = _recv_exact(sock, datalen)
+    if flags & FLAG_COMPRESSED:
+        body = zlib.decompress(body)
+    return json.loads(body.decode("utf-8", errors="replace"))
+
+def _metric(m, default_clock):
+    """(host, key, value[, clock[, ns]]) -> dict del protocolo."""
+    host, key, value = m[0], m[1], m[2]
+    d = {"host": str(host), "key": str(key), "value": str(value)}
+    clock = m[3] if len(m) > 3 and m[3] is not None else default_clock
+    if clock is not None:
+        d["clock"] = int(clock)
+        d["ns"] = int(m[4]) if len(m) > 4 and m[4] is not None else 0
+    return d
+
+class ZabbixSender(object):
+    """Conexion al trapper de Zabbix que envia valores en lotes."""
+
+    def __init__(self, server="127.0.0.1", port=10051, timeout=10.0, chunk_size=CHUNK_SIZE):
+        self.server = server
+        self.port = int(port)
+        self.timeout = timeout
+        self.chunk_size = max(1, int(chunk_size))
+        self.sock = None
+        self.connects = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def _peer_closed(self):
+        """True si el servidor ya cerro la conexion (lectura lista con 0 bytes)."""
+        try:
+            readable, _, _ = select.select([self.sock], [], [], 0)
+            return bool(readable) and self.sock.recv(1, socket.MSG_PEEK) == b""
+        except OSError:
+            return True
+
+    def _connection(self):
+        if self.sock is not None and self._peer_closed():
+            self.close()
+        if self.sock is None:
+            self.sock = socket.create_connection((self.server, self.port), timeout=self.timeout)
+            self.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            self.connects += 1
+        return self.sock
+
+    def _request(self, payload):
+        """Envia un request y devuelve la respuesta; reintenta una vez si la conexion reutilizada murio."""
+        for attempt in (1, 2):
+            fresh = self.sock is None
+            sock = self._connection()
+            try:
+                sock.sendall(payload)
+                return unpack_response(sock)
+            except (EOFError, ConnectionError) as e:
+                self.close()
+                # Solo se reintenta sobre una conexion reutilizada: el trapper cierra
+                # despues de responder y el lote nunca llego a procesarse.
+                if fresh or attempt == 2:
+                    raise SenderError(f"Sin respuesta de {self.server}:{self.port}: {e}")
+            except (OSError, ValueError) as e:
+                self.close()
+                raise SenderError(f"Error enviando a {self.server}:{self.port}: {e}")
+
+    def send_chunk(self, metrics, clock=None):
+        """Envia UN lote; devuelve SenderResult con sus totales."""
+        now = time.time()
+        req = {"request": "sender data",
+               "data": [_metric(m, clock) for m in metrics],
+               "clock": int(now), "ns": int((now % 1) * 1e9)}
+        resp = self._request(pack(req))
+        if resp.get("response") != "success":
+            raise SenderError(f"El trapper rechazo el lote: {resp}")
+        res = SenderResult()
+        res.add_info(resp.get("info", ""))
+        return res
+
+    def send(self, metrics, clock=None):
+        """
+        Envia todos los valores en lotes de chunk_size. <metrics> es un iterable de
+        tuplas (host, key, value[, clock[, ns]]); <clock> aplica a las que no traen
+        el suyo. Devuelve el SenderResult acumulado.
+        """
+        total = SenderResult()
+        batch = []
+        for m in metrics:
+            batch.append(m)
+            if len(batch) >= self.chunk_size:
+                total += self.send_chunk(batch, clock)
+                batch = []
+        if batch:
+            total += self.send_chunk(batch, clock)
+        return total
+
+def parse_sender_line(line, with_timestamps=False, with_ns=False):
+    """Linea del formato de "zabbix_sender -i" -> tupla, o None si esta vacia."""
+    parts = shlex.split(line, comments=False, posix=True)
+    if not parts:
+        return None
+    want = 3 + int(with_timestamps) + int(with_ns)
+    if len(parts) != want:
+        raise ValueError(f"se esperaban {want} campos: {line.strip()!r}")
+    if with_ns:
+        return (parts[0], parts[1], parts[4], int(parts[2]), int(parts[3]))
+    if with_timestamps:
+        return (parts[0], parts[1], parts[3], int(parts[2]))
+    return (parts[0], parts[1], parts[2])
+
+def main():
+    parser = argparse.ArgumentParser(description="Envia valores al trapper de Zabbix (protocolo nativo)")
+    parser.add_argument("-z", "--zabbix-server", default="127.0.0.1")
+    parser.add_argument("-p", "--port", type=int, default=10051)
+    parser.add_argument("-i", "--input-file", required=True, help="Archivo de valores ('-' = stdin)")
+    parser.add_argument("-s", "--host", help="Host por defecto para lineas que usan '-' como host")
+    parser.add_argument("-T", "--with-timestamps", action="store_true")
+    parser.add_argument("-N", "--with-ns", action="store_true")
+    parser.add_argument("-t", "--timeout", type=float, default=10.0)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    args = parser.parse_args()
+
+    src = sys.stdin if args.input_file == "-" else open(args.input_file, encoding="utf-8")
+    metrics = []
+    for n, line in enumerate(src, 1):
+        try:
+            m = parse_sender_line(line, args.with_timestamps or args.with_ns, args.with_ns)
+        except ValueError as e:
+            print(f"[line {n}] {e}", file=sys.stderr)
+            continue
+        if m is None:
+            continue
+        if m[0] == "-" and args.host:
+            m = (args.host,) + m[1:]
+        metrics.append(m)
+
+    t0 = time.monotonic()
+    try:
+        with ZabbixSender(args.zabbix_server, args.port, args.timeout, args.chunk_size) as zs:
+            res = zs.send(metrics)
+    except SenderError as e:
+        print(f"ERROR: {e}")
+        return 1
+    print(f'info from server: "processed: {res.processed}; failed: {res.failed}; '
+          f'total: {res.total}; seconds spent: {res.seconds:.6f}"')
+    print(f"sent: {len(metrics)}; skipped: 0; total: {len(metrics)}; "
+          f"chunks: {res.chunks}; elapsed: {time.monotonic() - t0:.3f}s")
+    return 2 if res.failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())